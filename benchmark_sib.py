@@ -0,0 +1,329 @@
+# SIB - Benchmarks de desempenho
+# Uso: python benchmark_sib.py                     (comparações com as implementações antigas)
+#      python benchmark_sib.py --suite [--tamanhos 1000 10000 100000 1000000] [--saida resultados.json] [--comparar anterior.json]
+import argparse
+import json
+import platform
+import subprocess
+import time
+import tracemalloc
+from collections import defaultdict
+import numpy as np
+import pandas as pd
+from datetime import datetime
+
+from db_connection import _serializar_registros
+from ranking_logic import (
+    calcular_ranking, pontuar_backlog, EstoqueFatores, IndiceGeneros, multiplicadores_catchup, ordenar_ranking,
+    calcular_afinidade_genero, NOTAS_POR_FATOR,
+)
+from referencia_ranking import (
+    gerar_backlog_sintetico, gerar_backlog_series, alterar_item_aleatorio, calcular_ranking_sib_web, calcular_ranking_ranking_logic,
+    TIPOS, STATUS, GENEROS, UNIDADES, CONFIG_BENCH, FATORES_BENCH, CONFIG_RANKING_LOGIC, FATORES_RANKING_LOGIC,
+)
+from sib_web import avaliar_pesos, aplicar_esquema, analisar_backlog_para_acoes, verificar_conquistas, obter_config_padrao, ESQUEMA_BACKLOG, COLUNAS_ESPERADAS_BACKLOG, FATORES_PADRAO
+
+def cronometrar(funcao, repeticoes=5):
+    """Retorna o melhor tempo (s) entre as repetições."""
+    tempos = []
+    for _ in range(repeticoes):
+        inicio = time.perf_counter()
+        funcao()
+        tempos.append(time.perf_counter() - inicio)
+    return min(tempos)
+
+def _serializar_registros_legado(user_id, df):
+    # Implementação original de salvar_dados_db (laço célula a célula), mantida só como referência
+    items = df.to_dict(orient='records')
+    for item in items:
+        item['user_id'] = user_id
+        for k, v in list(item.items()):
+            if pd.isna(v): item[k] = None
+            elif isinstance(v, (pd.Timestamp, datetime)): item[k] = v.isoformat()
+            if k != 'user_id':
+                new_key = k.lower()
+                item[new_key] = item.pop(k)
+    return items
+
+def bench_serializacao(n_itens=10_000):
+    df = gerar_backlog_sintetico(n_itens)
+    assert _serializar_registros("u", df) == _serializar_registros_legado("u", df)
+    t_legado = cronometrar(lambda: _serializar_registros_legado("u", df))
+    t_novo = cronometrar(lambda: _serializar_registros("u", df))
+    print(f"Serialização ({n_itens} itens): legado {t_legado * 1000:.1f} ms | colunar {t_novo * 1000:.1f} ms | {t_legado / t_novo:.1f}x")
+
+def bench_motor_ranking(n_itens=50_000):
+    df = aplicar_esquema(gerar_backlog_sintetico(n_itens), ESQUEMA_BACKLOG)
+    df.loc[df.sample(frac=0.02, random_state=1).index, ["Genero", "Data_Adicao", "Unidade_Duracao"]] = None
+    tempos = {
+        "legado sib_web": cronometrar(lambda: calcular_ranking_sib_web(df, CONFIG_BENCH, FATORES_BENCH), repeticoes=3),
+        "legado ranking_logic": cronometrar(lambda: calcular_ranking_ranking_logic(df, CONFIG_BENCH, FATORES_RANKING_LOGIC)),
+        "motor (todos os fatores)": cronometrar(lambda: calcular_ranking(df, CONFIG_BENCH, FATORES_BENCH)),
+        "motor (variantes do ranking_logic)": cronometrar(lambda: calcular_ranking(df, CONFIG_RANKING_LOGIC, FATORES_RANKING_LOGIC)),
+    }
+    estoque = EstoqueFatores(df)
+    tempos["motor, estoque pronto (todos)"] = cronometrar(lambda: estoque.pontuar(CONFIG_BENCH, FATORES_BENCH))
+    tempos["motor, estoque pronto (2 fatores)"] = cronometrar(lambda: estoque.pontuar(CONFIG_BENCH, {"Meu_Hype": True, "Nota_Externa": True}))
+    print(f"Motor de ranking ({n_itens} itens): " + " | ".join(f"{rotulo} {t * 1000:.1f} ms" for rotulo, t in tempos.items()))
+
+def bench_ranking(n_itens=50_000):
+    df = gerar_backlog_sintetico(n_itens)
+    for rotulo, dados in (("sem esquema", df), ("com esquema", aplicar_esquema(df.copy(), ESQUEMA_BACKLOG))):
+        t_legado = cronometrar(lambda: calcular_ranking_sib_web(dados, CONFIG_BENCH, FATORES_BENCH), repeticoes=3)
+        t_novo = cronometrar(lambda: calcular_ranking(dados, CONFIG_BENCH, FATORES_BENCH))
+        print(f"Ranking ({n_itens} itens, {rotulo}): legado {t_legado * 1000:.1f} ms | colunar {t_novo * 1000:.1f} ms | {t_legado / t_novo:.1f}x")
+
+def bench_top_k(n_itens=50_000, k=50):
+    df_pontuado = pontuar_backlog(aplicar_esquema(gerar_backlog_sintetico(n_itens), ESQUEMA_BACKLOG), CONFIG_BENCH, FATORES_BENCH)
+    completo = ordenar_ranking(df_pontuado)
+    assert ordenar_ranking(df_pontuado, k)["ID"].tolist() == completo["ID"].head(k).tolist()
+    t_completo = cronometrar(lambda: ordenar_ranking(df_pontuado))
+    t_top_k = cronometrar(lambda: ordenar_ranking(df_pontuado, k))
+    print(f"Ordenação ({len(df_pontuado)} itens): completa {t_completo * 1000:.1f} ms | top {k} {t_top_k * 1000:.1f} ms | {t_completo / t_top_k:.1f}x")
+
+def bench_simulacao_pesos(n_itens=50_000, n_cenarios=500):
+    df_pontuado = pontuar_backlog(aplicar_esquema(gerar_backlog_sintetico(n_itens), ESQUEMA_BACKLOG), CONFIG_BENCH, FATORES_BENCH)
+    rng = np.random.default_rng(0)
+    cenarios = [dict(zip(NOTAS_POR_FATOR, pesos)) for pesos in rng.random((n_cenarios, len(NOTAS_POR_FATOR)))]
+    pontuacoes = avaliar_pesos(df_pontuado, [CONFIG_BENCH["pesos"]], FATORES_BENCH)[:, 0]
+    assert np.allclose(pontuacoes, df_pontuado["Pontuacao_Final"].to_numpy(dtype=float), atol=1e-4)
+    t_matriz = cronometrar(lambda: avaliar_pesos(df_pontuado, cenarios, FATORES_BENCH), repeticoes=3)
+    print(f"Simulação de pesos ({len(df_pontuado)} itens x {n_cenarios} cenários): {t_matriz * 1000:.1f} ms")
+
+def _multiplicadores_catchup_legado(df_calculo, series_finalizadas, valor_bonus):
+    """Uma máscara sobre todos os itens por série finalizada, como antes da junção por série."""
+    multiplicador = np.ones(len(df_calculo))
+    for serie, max_ordem in series_finalizadas.items():
+        idx_bonus = ((df_calculo['Nome_Serie'] == serie) & (df_calculo['Ordem_Serie'] < max_ordem)).to_numpy(dtype=bool)
+        multiplicador[idx_bonus] = valor_bonus
+    return multiplicador
+
+def bench_catchup(n_series=3_000, volumes_por_serie=20):
+    df = aplicar_esquema(gerar_backlog_series(n_series, volumes_por_serie), ESQUEMA_BACKLOG)
+    estoque = EstoqueFatores(df)
+    df_calculo, series_finalizadas = estoque.df, estoque.series_finalizadas()
+    legado = _multiplicadores_catchup_legado(df_calculo, series_finalizadas, 1.5)
+    juncao = multiplicadores_catchup(df_calculo['Nome_Serie'], df_calculo['Ordem_Serie'], series_finalizadas, 1.5)
+    assert np.array_equal(legado, juncao) and (juncao > 1).any()
+    t_legado = cronometrar(lambda: _multiplicadores_catchup_legado(df_calculo, series_finalizadas, 1.5), repeticoes=1)
+    t_juncao = cronometrar(lambda: multiplicadores_catchup(df_calculo['Nome_Serie'], df_calculo['Ordem_Serie'], series_finalizadas, 1.5))
+    print(f"Bônus catch-up ({len(series_finalizadas)} séries, {len(df_calculo)} itens abertos): loop por série {t_legado * 1000:.1f} ms | junção {t_juncao * 1000:.1f} ms | {t_legado / t_juncao:.0f}x")
+
+def bench_indice_generos(n_itens=50_000, n_consultas=20):
+    """Contagens por Tipo e filtro por gênero: parsing do texto a cada consulta vs. o índice construído uma vez."""
+    df = aplicar_esquema(gerar_backlog_sintetico(n_itens), ESQUEMA_BACKLOG)
+    df.loc[df.sample(frac=0.05, random_state=0).index, "Genero"] = None
+
+    def consultas_texto():
+        for tipo in TIPOS:
+            df.loc[df["Tipo"] == tipo, "Genero"].dropna().str.split(",").explode().str.strip().value_counts()
+        for genero in GENEROS[:n_consultas // 2]:
+            df["Genero"].str.split(",").apply(lambda lista: genero in [g.strip() for g in lista] if isinstance(lista, list) else False)
+
+    def consultas_indice(indice):
+        for tipo in TIPOS:
+            indice.contagem(df.index[df["Tipo"] == tipo])
+        for genero in GENEROS[:n_consultas // 2]:
+            indice.contem(genero)
+
+    indice = IndiceGeneros(df["Genero"])
+    for tipo in TIPOS:
+        referencia = df.loc[df["Tipo"] == tipo, "Genero"].dropna().str.split(",").explode().str.strip().value_counts()
+        assert indice.contagem(df.index[df["Tipo"] == tipo]).to_dict() == referencia.to_dict()
+    for genero in GENEROS:
+        referencia = df["Genero"].str.split(",").apply(lambda lista: genero in [g.strip() for g in lista] if isinstance(lista, list) else False)
+        assert np.array_equal(indice.contem(genero), referencia.to_numpy(dtype=bool))
+    t_texto = cronometrar(consultas_texto, repeticoes=3)
+    t_construcao = cronometrar(lambda: IndiceGeneros(df["Genero"]))
+    t_indice = cronometrar(lambda: consultas_indice(indice))
+    print(f"Gêneros ({n_itens} itens, {len(TIPOS)} contagens + {n_consultas // 2} filtros): parsing {t_texto * 1000:.1f} ms | índice {t_indice * 1000:.1f} ms + construção {t_construcao * 1000:.1f} ms")
+
+def bench_estoque_fatores(n_itens=50_000, n_alteracoes=200):
+    df = aplicar_esquema(gerar_backlog_sintetico(n_itens), ESQUEMA_BACKLOG)
+    estoque = EstoqueFatores(df)
+    rng = np.random.default_rng(1)
+    t_atualizacao = t_incremental = t_completo = 0.0
+    for _ in range(n_alteracoes):
+        df, item_id = alterar_item_aleatorio(df, rng)
+        inicio = time.perf_counter()
+        estoque.atualizar_itens(df, [item_id])
+        t_atualizacao += time.perf_counter() - inicio
+        estoque.pontuar(CONFIG_BENCH, FATORES_BENCH)
+        t_incremental += time.perf_counter() - inicio
+        inicio = time.perf_counter()
+        pontuar_backlog(df, CONFIG_BENCH, FATORES_BENCH)
+        t_completo += time.perf_counter() - inicio
+    print(f"Estoque de fatores ({n_itens} itens, {n_alteracoes} alterações): recálculo completo {t_completo / n_alteracoes * 1000:.1f} ms | atualização {t_atualizacao / n_alteracoes * 1000:.1f} ms ({t_completo / t_atualizacao:.1f}x) | atualização + pontuação {t_incremental / n_alteracoes * 1000:.1f} ms ({t_completo / t_incremental:.1f}x)")
+
+# --- Suíte de escala: 1k a 1M itens, com tempo, pico de memória e resultado em JSON ---
+TAMANHOS_SUITE = [1_000, 10_000, 100_000, 1_000_000]
+PLATAFORMAS = {"Jogo": ["PC", "PS5", "Switch", "Xbox"], "Livro": ["Kindle", "Físico"], "Série": ["Netflix", "Max", "Prime Video"],
+               "Filme": ["Netflix", "Cinema", "Disney+"], "Anime": ["Crunchyroll", "Netflix"], "Mangá": ["Físico", "Digital"]}
+DURACAO_MAXIMA = {"Jogo": 120, "Livro": 900, "Série": 80, "Filme": 200, "Anime": 100, "Mangá": 30}
+
+def gerar_backlog_realista(n_itens, seed=42, fracao_series=0.25):
+    """
+    Backlog com as colunas de COLUNAS_ESPERADAS_BACKLOG, gerado sem laços por item para chegar a 1M de linhas:
+    gêneros em combinações de 1 a 3 (com vazios e nulos), séries com volumes finalizados em ordem, datas de
+    adição e finalização coerentes e status mais frequentes em "No Backlog" e "Finalizado".
+    """
+    rng = np.random.default_rng(seed)
+    tipos = rng.choice(TIPOS, n_itens, p=[0.3, 0.2, 0.15, 0.15, 0.1, 0.1])
+    status = rng.choice(STATUS, n_itens, p=[0.35, 0.08, 0.4, 0.12, 0.05])
+
+    # Um conjunto fixo de combinações de gêneros, sorteadas com frequências desiguais como num backlog real
+    combinacoes = [", ".join(rng.choice(GENEROS, rng.integers(1, 4), replace=False)) for _ in range(300)] + ["", None]
+    pesos_combinacoes = rng.pareto(1.5, len(combinacoes)) + 0.01
+    generos = np.array(combinacoes, dtype=object)[rng.choice(len(combinacoes), n_itens, p=pesos_combinacoes / pesos_combinacoes.sum())]
+
+    # Séries: blocos contíguos de 2 a 30 volumes; volumes iniciais finalizados, alguns pulados (catch-up)
+    nome_serie = np.full(n_itens, "", dtype=object)
+    ordem_serie = np.ones(n_itens, dtype=int)
+    total_serie = np.ones(n_itens, dtype=int)
+    n_series_itens = int(n_itens * fracao_series)
+    tamanhos = rng.integers(2, 31, max(1, n_series_itens // 8))
+    tamanhos = tamanhos[np.cumsum(tamanhos) <= n_series_itens]
+    if len(tamanhos):
+        fim = int(tamanhos.sum())
+        serie_de = np.repeat(np.arange(len(tamanhos)), tamanhos)
+        inicio_serie = np.repeat(np.cumsum(tamanhos) - tamanhos, tamanhos)
+        nome_serie[:fim] = np.char.add("Série ", serie_de.astype(str)).astype(object)
+        ordem_serie[:fim] = np.arange(fim) - inicio_serie + 1
+        total_serie[:fim] = np.repeat(tamanhos, tamanhos)
+        lidos = ordem_serie[:fim] <= np.repeat(rng.integers(0, tamanhos + 1), tamanhos)
+        status[:fim] = np.where(lidos & (rng.random(fim) > 0.1), "Finalizado", np.where(lidos, "No Backlog", status[:fim]))
+        tipos[:fim] = np.repeat(rng.choice(["Mangá", "Livro", "Anime", "Série"], len(tamanhos)), tamanhos)
+
+    hoje = np.datetime64("2026-01-01")
+    data_adicao = hoje - rng.integers(0, 2000, n_itens).astype("timedelta64[D]")
+    finalizado = status == "Finalizado"
+    data_finalizacao = np.where(finalizado, data_adicao + rng.integers(1, 400, n_itens).astype("timedelta64[D]"), np.datetime64("NaT"))
+    duracao_maxima = pd.Series(tipos).map(DURACAO_MAXIMA).to_numpy()
+    duracao = np.round(rng.random(n_itens) * duracao_maxima, 1)
+    progresso_total = np.where(rng.random(n_itens) < 0.8, rng.integers(1, 200, n_itens), 0)
+    em_andamento = status == "Em Andamento"
+    progresso_atual = np.where(finalizado, progresso_total, np.where(em_andamento, (rng.random(n_itens) * (progresso_total + 1)).astype(int), 0))
+    plataformas = np.array([rng.choice(PLATAFORMAS[t]) for t in TIPOS], dtype=object)
+    ids = np.arange(1, n_itens + 1)
+    df = pd.DataFrame({
+        "ID": ids,
+        "Titulo": np.char.add("Item ", ids.astype(str)).astype(object),
+        "Tipo": tipos,
+        "Plataforma": plataformas[pd.Series(tipos).map({t: i for i, t in enumerate(TIPOS)}).to_numpy()],
+        "Autor": np.char.add("Autor ", rng.integers(0, max(10, n_itens // 50), n_itens).astype(str)).astype(object),
+        "Genero": generos,
+        "Status": status,
+        "Meu_Hype": rng.integers(0, 11, n_itens),
+        "Nota_Externa": np.where(rng.random(n_itens) < 0.85, rng.integers(40, 100, n_itens), 0),
+        "Duracao": np.where(rng.random(n_itens) < 0.9, duracao, 0.0),
+        "Unidade_Duracao": pd.Series(tipos).map(UNIDADES).to_numpy(),
+        "Nome_Serie": nome_serie,
+        "Ordem_Serie": ordem_serie,
+        "Total_Serie": total_serie,
+        "Data_Adicao": pd.to_datetime(data_adicao),
+        "Progresso_Atual": progresso_atual,
+        "Progresso_Total": progresso_total,
+        "Minha_Nota": np.where(finalizado & (rng.random(n_itens) < 0.9), rng.integers(1, 11, n_itens), 0),
+        "Cover_URL": np.where(rng.random(n_itens) < 0.95, np.char.add("https://images.example.com/", ids.astype(str)).astype(object), ""),
+        "Data_Finalizacao": pd.to_datetime(data_finalizacao),
+        "Tempo_Final": 0,
+        "Origem": rng.choice(["Pago", "Grátis"], n_itens, p=[0.6, 0.4]),
+    })
+    return aplicar_esquema(df[COLUNAS_ESPERADAS_BACKLOG], ESQUEMA_BACKLOG)
+
+def _config_suite():
+    config = obter_config_padrao()
+    # Conquistas já desbloqueadas: mede só as verificações, sem o salvar_config e a pausa das comemorações
+    config["conquistas"] = defaultdict(lambda: {"desbloqueada": True, "data": None, "nome": "Benchmark"})
+    return config
+
+# Nome no relatório -> função que recebe o backlog
+FUNCOES_SUITE = {
+    "calcular_ranking": lambda df: calcular_ranking(df, obter_config_padrao(), FATORES_PADRAO),
+    "calcular_afinidade_genero": calcular_afinidade_genero,
+    "analisar_backlog_para_acoes": analisar_backlog_para_acoes,
+    "verificar_conquistas": lambda df: verificar_conquistas(df, _config_suite(), item_id=int(df["ID"].iloc[-1])),
+}
+
+def medir_pico_memoria(funcao):
+    """Pico (MB) de memória alocada pelo Python e pelo NumPy durante a chamada. Buffers do Arrow não entram na conta."""
+    tracemalloc.start()
+    try:
+        funcao()
+        return tracemalloc.get_traced_memory()[1] / 2**20
+    finally:
+        tracemalloc.stop()
+
+def commit_atual():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def executar_suite(tamanhos=TAMANHOS_SUITE, funcoes=None):
+    """Mede cada função em cada tamanho. O tempo é o melhor de até 5 repetições (menos nos tamanhos grandes)."""
+    funcoes = funcoes or list(FUNCOES_SUITE)
+    resultados = []
+    for n_itens in tamanhos:
+        inicio = time.perf_counter()
+        df = gerar_backlog_realista(n_itens)
+        print(f"{n_itens} itens gerados em {time.perf_counter() - inicio:.1f}s")
+        repeticoes = max(1, min(5, 100_000 // n_itens))
+        for nome in funcoes:
+            funcao = FUNCOES_SUITE[nome]
+            tempo = cronometrar(lambda: funcao(df), repeticoes=repeticoes)
+            pico = medir_pico_memoria(lambda: funcao(df))
+            resultados.append({"funcao": nome, "itens": n_itens, "tempo_s": tempo, "pico_memoria_mb": pico, "repeticoes": repeticoes})
+            print(f"  {nome}: {tempo * 1000:.1f} ms | pico {pico:.1f} MB")
+    return {
+        "commit": commit_atual(),
+        "data": datetime.now().isoformat(timespec="seconds"),
+        "ambiente": {"python": platform.python_version(), "pandas": pd.__version__, "numpy": np.__version__, "maquina": platform.platform()},
+        "resultados": resultados,
+    }
+
+def comparar_resultados(atual, anterior, tolerancia=1.2):
+    """Imprime a razão de tempo atual/anterior por função e tamanho e retorna as medições acima da tolerância."""
+    anteriores = {(r["funcao"], r["itens"]): r for r in anterior["resultados"]}
+    regressoes = []
+    print(f"Comparação com {anterior.get('commit') or 'resultado anterior'} ({anterior.get('data')}):")
+    for r in atual["resultados"]:
+        base = anteriores.get((r["funcao"], r["itens"]))
+        if base is None:
+            continue
+        razao = r["tempo_s"] / base["tempo_s"]
+        marca = " <- regressão" if razao > tolerancia else ""
+        print(f"  {r['funcao']} ({r['itens']}): {razao:.2f}x tempo | {r['pico_memoria_mb'] - base['pico_memoria_mb']:+.1f} MB{marca}")
+        if razao > tolerancia:
+            regressoes.append(r)
+    return regressoes
+
+def executar_benchmarks():
+    bench_serializacao()
+    bench_ranking()
+    bench_top_k()
+    bench_simulacao_pesos()
+    bench_estoque_fatores()
+    bench_catchup()
+    bench_indice_generos()
+    bench_motor_ranking()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmarks de desempenho do SIB.")
+    parser.add_argument("--suite", action="store_true", help="Executa a suíte de escala em vez das comparações com as implementações antigas.")
+    parser.add_argument("--tamanhos", type=int, nargs="+", default=TAMANHOS_SUITE, help="Quantidades de itens da suíte.")
+    parser.add_argument("--funcoes", nargs="+", choices=list(FUNCOES_SUITE), default=None, help="Funções medidas pela suíte (padrão: todas).")
+    parser.add_argument("--saida", help="Arquivo JSON onde gravar os resultados da suíte.")
+    parser.add_argument("--comparar", help="JSON de uma execução anterior da suíte para comparar.")
+    args = parser.parse_args()
+
+    if not args.suite:
+        executar_benchmarks()
+    else:
+        resultado = executar_suite(args.tamanhos, args.funcoes)
+        if args.saida:
+            with open(args.saida, "w", encoding="utf-8") as arquivo:
+                json.dump(resultado, arquivo, ensure_ascii=False, indent=2)
+        if args.comparar:
+            with open(args.comparar, encoding="utf-8") as arquivo:
+                comparar_resultados(resultado, json.load(arquivo))
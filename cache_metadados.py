@@ -0,0 +1,148 @@
+# SIB - Cache persistente das buscas de metadados online
+# Guarda em SQLite o resultado de buscar_dados_online_geral por (título normalizado, tipo, provedor),
+# compartilhado por todas as sessões do processo e mantido entre reinícios. Resultados "não encontrado"
+# também entram no cache, com validade menor. Erros de rede ou de chave de API nunca são guardados.
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+import streamlit as st
+
+CACHE_METADADOS_PATH = os.environ.get("SIB_CACHE_METADADOS_PATH", "sib_cache_metadados.db")
+
+# Provedor consultado por tipo de mídia (o IGDB inclui a duração do HowLongToBeat)
+PROVEDOR_POR_TIPO = {"Jogo": "igdb", "Filme": "tmdb", "Série": "tmdb", "Anime": "tmdb", "Livro": "google_books"}
+# Validade (segundos) de um resultado encontrado, por provedor
+TTL_POR_PROVEDOR = {"igdb": 30 * 86400, "tmdb": 7 * 86400, "google_books": 30 * 86400}
+TTL_PADRAO = 7 * 86400
+# Validade de um "não encontrado": o título pode ser cadastrado no provedor ou corrigido pelo usuário
+TTL_NEGATIVO = 86400
+# Validade de um resultado com "incompleto" = True (ex: a duração do HLTB falhou e ficou 0)
+TTL_INCOMPLETO = 3600
+# Acima deste número de entradas, as menos usadas recentemente são removidas
+MAX_ENTRADAS = 20000
+# A limpeza (expirados e excedentes) não roda a cada gravação: só depois deste intervalo (segundos) ou quando
+# as gravações desde a última limpeza passam de 10% de max_entradas, o que limita o excesso a esses 10%
+INTERVALO_LIMPEZA = 600
+
+_ESPACOS = re.compile(r"\s+")
+
+def normalizar_titulo(titulo):
+    """Forma canônica do título usada na chave: Unicode NFKC, sem diferença de caixa e espaços."""
+    return _ESPACOS.sub(" ", unicodedata.normalize("NFKC", str(titulo)).casefold()).strip()
+
+class CacheMetadados:
+    """Cache compartilhado pelo processo; cada thread usa a própria conexão (modo WAL)."""
+
+    def __init__(self, caminho, max_entradas=MAX_ENTRADAS):
+        self.caminho = caminho
+        self.max_entradas = max_entradas
+        self.local = threading.local()
+        self.lock = threading.Lock()
+        self.gravacoes_desde_limpeza = 0
+        self.proxima_limpeza = time.time() + INTERVALO_LIMPEZA
+        with self.conexao() as conexao:
+            conexao.execute(
+                "CREATE TABLE IF NOT EXISTS metadados ("
+                "titulo TEXT NOT NULL, tipo TEXT NOT NULL, provedor TEXT NOT NULL, "
+                "resultado TEXT NOT NULL, encontrado INTEGER NOT NULL, "
+                "expira_em REAL NOT NULL, ultimo_acesso REAL NOT NULL, "
+                "PRIMARY KEY (titulo, tipo, provedor))"
+            )
+            conexao.execute("CREATE INDEX IF NOT EXISTS idx_metadados_acesso ON metadados (ultimo_acesso)")
+            conexao.execute("CREATE INDEX IF NOT EXISTS idx_metadados_expira ON metadados (expira_em)")
+
+    def conexao(self):
+        conexao = getattr(self.local, "conexao", None)
+        if conexao is None:
+            conexao = sqlite3.connect(self.caminho, timeout=30)
+            conexao.execute("PRAGMA journal_mode=WAL")
+            conexao.execute("PRAGMA synchronous=NORMAL")
+            self.local.conexao = conexao
+        return conexao
+
+    def obter(self, titulo, tipo, provedor):
+        """Retorna (encontrado_no_cache, resultado). O resultado é [] para um "não encontrado" em cache."""
+        chave = (normalizar_titulo(titulo), tipo, provedor)
+        conexao = self.conexao()
+        linha = conexao.execute(
+            "SELECT resultado, encontrado, expira_em FROM metadados WHERE titulo = ? AND tipo = ? AND provedor = ?", chave
+        ).fetchone()
+        agora = time.time()
+        if linha is None or linha[2] <= agora:
+            return False, None
+        with conexao:
+            conexao.execute("UPDATE metadados SET ultimo_acesso = ? WHERE titulo = ? AND tipo = ? AND provedor = ?", (agora, *chave))
+        return True, json.loads(linha[0])
+
+    def gravar(self, titulo, tipo, provedor, resultado):
+        """
+        Guarda uma lista de resultados; lista vazia é um "não encontrado" e usa TTL_NEGATIVO.
+        Se algum resultado vier marcado com "incompleto", a entrada usa TTL_INCOMPLETO.
+        """
+        encontrado = bool(resultado)
+        if not encontrado:
+            ttl = TTL_NEGATIVO
+        elif any(item.get("incompleto") for item in resultado):
+            ttl = TTL_INCOMPLETO
+        else:
+            ttl = TTL_POR_PROVEDOR.get(provedor, TTL_PADRAO)
+        agora = time.time()
+        conexao = self.conexao()
+        with conexao:
+            conexao.execute(
+                "INSERT OR REPLACE INTO metadados VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (normalizar_titulo(titulo), tipo, provedor, json.dumps(resultado or [], ensure_ascii=False), int(encontrado), agora + ttl, agora),
+            )
+        if self._limpeza_devida(agora):
+            with conexao:
+                self._remover_excedentes(conexao, agora)
+
+    def _limpeza_devida(self, agora):
+        with self.lock:
+            self.gravacoes_desde_limpeza += 1
+            if agora < self.proxima_limpeza and self.gravacoes_desde_limpeza <= self.max_entradas // 10:
+                return False
+            self.gravacoes_desde_limpeza = 0
+            self.proxima_limpeza = agora + INTERVALO_LIMPEZA
+            return True
+
+    def _remover_excedentes(self, conexao, agora):
+        # Expirados saem primeiro; se ainda passar do limite, saem os menos acessados
+        conexao.execute("DELETE FROM metadados WHERE expira_em <= ?", (agora,))
+        excesso = conexao.execute("SELECT COUNT(*) FROM metadados").fetchone()[0] - self.max_entradas
+        if excesso > 0:
+            conexao.execute(
+                "DELETE FROM metadados WHERE rowid IN (SELECT rowid FROM metadados ORDER BY ultimo_acesso LIMIT ?)", (excesso,)
+            )
+
+@st.cache_resource(show_spinner=False)
+def get_cache_metadados(caminho=CACHE_METADADOS_PATH):
+    return CacheMetadados(caminho)
+
+def buscar_com_cache(titulo, tipo, buscar, avisos=None):
+    """
+    Consulta o cache antes de chamar buscar() (a busca online real). buscar() deve retornar uma lista de
+    resultados, [] quando o provedor não encontrou o título, ou None em caso de erro (não é guardado).
+    Fora da thread do script o aviso de "não encontrado" vai para a lista avisos em vez da tela.
+    """
+    provedor = PROVEDOR_POR_TIPO.get(tipo)
+    if provedor is None:
+        return buscar()
+    cache = get_cache_metadados()
+    em_cache, resultado = cache.obter(titulo, tipo, provedor)
+    if em_cache:
+        if not resultado:
+            mensagem = f"Nenhum resultado para '{titulo}' (busca recente sem resultados)."
+            if avisos is None:
+                st.warning(mensagem)
+            else:
+                avisos.append(("warning", mensagem, {}))
+        return resultado
+    resultado = buscar()
+    if resultado is not None:
+        cache.gravar(titulo, tipo, provedor, resultado)
+    return resultado
@@ -1,18 +1,96 @@
 import streamlit as st
-from supabase import create_client, Client
+from supabase import create_client, Client, ClientOptions
 import pandas as pd
+import httpx
 import json
+import os
+import sqlite3
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 
+from sqlite_backend import ClienteSQLite
+
+def _ler_config(nome, padrao=""):
+    # Secrets do Streamlit primeiro; variáveis de ambiente servem para rodar sem secrets.toml
+    try:
+        valor = st.secrets.get(nome)
+    except Exception:
+        valor = None
+    return valor if valor is not None else os.environ.get(nome, padrao)
+
 # Configurações do Supabase (Secrets do Streamlit)
-SUPABASE_URL = st.secrets.get("SUPABASE_URL", "")
-SUPABASE_KEY = st.secrets.get("SUPABASE_KEY", "")
+SUPABASE_URL = _ler_config("SUPABASE_URL")
+SUPABASE_KEY = _ler_config("SUPABASE_KEY")
+# Chave service_role, usada apenas por jobs sem usuário logado (ex: ranking_lote.py) para ler todas as contas
+SUPABASE_SERVICE_KEY = _ler_config("SUPABASE_SERVICE_KEY")
+
+# Backend de armazenamento: "supabase" (padrão) ou "sqlite" (arquivo local, sem dependência de rede)
+BACKEND_DADOS = _ler_config("SIB_BACKEND", "supabase").lower()
+SQLITE_PATH = _ler_config("SIB_SQLITE_PATH", "sib_local.db")
+
+# Pool HTTP compartilhado por todo o processo (conexões keep-alive reaproveitadas entre reruns)
+POOL_MAX_CONEXOES = 20
+POOL_MAX_KEEPALIVE = 10
+POOL_KEEPALIVE_EXPIRY = 60.0
+POOL_TIMEOUT = httpx.Timeout(30.0, connect=5.0)
+
+# Chave do cliente Supabase na sessão: cada usuário tem o seu, com o próprio estado de autenticação
+CHAVE_CLIENTE_SESSAO = "_supabase_client"
+
+@st.cache_resource(show_spinner=False)
+def _get_pool():
+    """httpx.Client thread-safe compartilhado pelos clientes Supabase de todas as sessões."""
+    return httpx.Client(
+        limits=httpx.Limits(
+            max_connections=POOL_MAX_CONEXOES,
+            max_keepalive_connections=POOL_MAX_KEEPALIVE,
+            keepalive_expiry=POOL_KEEPALIVE_EXPIRY,
+        ),
+        timeout=POOL_TIMEOUT,
+        follow_redirects=True,
+    )
+
+def _criar_cliente(pool):
+    # O httpx.Client é compartilhado; os headers de autenticação continuam por cliente.
+    opcoes = ClientOptions(httpx_client=pool)
+    return create_client(SUPABASE_URL, SUPABASE_KEY, options=opcoes)
+
+@st.cache_resource(show_spinner=False)
+def _get_cliente_sqlite(caminho):
+    return ClienteSQLite(caminho)
 
 def get_supabase_client() -> Client:
+    """
+    Retorna o cliente de dados da sessão. Com SIB_BACKEND = "sqlite" é um ClienteSQLite
+    compartilhado pelo processo, com a mesma interface usada aqui para o Supabase (sem pool HTTP).
+    """
+    if BACKEND_DADOS == "sqlite":
+        return _get_cliente_sqlite(SQLITE_PATH)
     if not SUPABASE_URL or not SUPABASE_KEY:
         st.error("Erro: Credenciais do Supabase não configuradas nos Secrets.")
         st.stop()
-    return create_client(SUPABASE_URL, SUPABASE_KEY)
+    cliente = st.session_state.get(CHAVE_CLIENTE_SESSAO)
+    if cliente is None:
+        cliente = _criar_cliente(_get_pool())
+        st.session_state[CHAVE_CLIENTE_SESSAO] = cliente
+    return cliente
+
+def criar_cliente_servico():
+    """
+    Cliente para jobs fora do Streamlit, sem sessão nem usuário logado. No Supabase usa a chave
+    service_role (as políticas de RLS limitariam a leitura a um único usuário).
+    """
+    if BACKEND_DADOS == "sqlite":
+        return ClienteSQLite(SQLITE_PATH)
+    if not SUPABASE_URL or not SUPABASE_SERVICE_KEY:
+        raise RuntimeError("Defina SUPABASE_URL e SUPABASE_SERVICE_KEY para executar jobs em lote.")
+    return create_client(SUPABASE_URL, SUPABASE_SERVICE_KEY)
+
+def descartar_supabase_client():
+    """Remove o cliente da sessão (ex: no logout). O pool HTTP do processo continua aberto."""
+    st.session_state.pop(CHAVE_CLIENTE_SESSAO, None)
 
 def carregar_config_db(user_id, config_padrao):
     supabase = get_supabase_client()
@@ -34,80 +112,473 @@ def carregar_config_db(user_id, config_padrao):
         # Se der qualquer erro, usamos o padrão para o app não travar
         return config_padrao
 
+def executar_escrita_config_db(supabase, user_id, config):
+    data = {"user_id": user_id, "config_data": config}
+    supabase.table("user_configs").upsert(data, on_conflict="user_id").execute()
+
 def salvar_config_db(user_id, config):
     supabase = get_supabase_client()
     try:
-        data = {"user_id": user_id, "config_data": config}
-        supabase.table("user_configs").upsert(data, on_conflict="user_id").execute()
+        executar_escrita_config_db(supabase, user_id, config)
     except Exception as e:
         st.error(f"Erro ao salvar configurações: {e}")
 
-def carregar_dados_db(user_id, table_name):
+# Coluna que identifica cada linha no app, por tabela (no banco ela vira a mesma chave em minúsculo)
+CHAVES_TABELAS = {
+    "backlog_items": "ID",
+    "sessoes": "ID_Sessao",
+}
+
+# Colunas que não entram no hash das linhas: o ID_BANCO é atribuído pelo banco (e fica nulo nas linhas
+# ainda não gravadas), o que mudaria o tipo da coluna e o hash de todas as outras linhas
+COLUNAS_FORA_DO_HASH = {'user_id', 'ID_BANCO'}
+
+class RastreadorAlteracoes:
+    """
+    Guarda o hash de cada linha já persistida, indexado pela chave da tabela,
+    para que a próxima escrita envie apenas as linhas inseridas, alteradas ou removidas.
+    A fila de escrita em segundo plano confirma linhas de outra thread; o lock protege os hashes.
+    """
+
+    def __init__(self, coluna_chave):
+        self.coluna_chave = coluna_chave
+        self.hashes = None
+        self.colunas = []  # colunas que entraram no hash do último registro
+        self.lock = threading.Lock()
+
+    @property
+    def inicializado(self):
+        return self.hashes is not None
+
+    @staticmethod
+    def _colunas_hash(df):
+        # Colunas ordenadas: o hash não depende da ordem em que as colunas aparecem no DataFrame
+        return sorted(c for c in df.columns if c not in COLUNAS_FORA_DO_HASH)
+
+    @staticmethod
+    def _valores_estaveis(df):
+        """
+        Colunas num tipo que não muda quando linhas novas entram por pd.concat: números (inteiros compactos,
+        anuláveis ou com nulos recém-chegados) como float64 e datas sempre em nanossegundos. Categorias já
+        têm o mesmo hash do texto equivalente.
+        """
+        colunas = {}
+        for coluna in df.columns:
+            serie = df[coluna]
+            if pd.api.types.is_bool_dtype(serie) or pd.api.types.is_numeric_dtype(serie):
+                colunas[coluna] = serie.astype('float64')
+            elif pd.api.types.is_datetime64_any_dtype(serie):
+                colunas[coluna] = serie.astype('datetime64[ns]')
+            else:
+                colunas[coluna] = serie
+        return pd.DataFrame(colunas, index=df.index)
+
+    def _hash_linhas(self, df):
+        if df.empty or self.coluna_chave not in df.columns:
+            return pd.Series(dtype='uint64')
+        colunas = self._colunas_hash(df)
+        hashes = pd.util.hash_pandas_object(self._valores_estaveis(df[colunas]), index=False)
+        hashes.index = pd.Index(df[self.coluna_chave].values)
+        return hashes
+
+    def registrar(self, df):
+        hashes = self._hash_linhas(df)
+        hashes = hashes[hashes.index.notna()]
+        with self.lock:
+            self.hashes = hashes[~hashes.index.duplicated(keep='last')]
+            self.colunas = self._colunas_hash(df)
+
+    def hashes_linhas(self, df):
+        """{chave: hash} das linhas de df, para confirmar depois só as que forem gravadas."""
+        hashes = self._hash_linhas(df)
+        return {_valor_json(chave): int(h) for chave, h in hashes.items() if pd.notna(chave)}
+
+    def confirmar(self, hashes, chaves_removidas):
+        """Marca como persistidas as linhas gravadas ({chave: hash}) e as remoções feitas."""
+        with self.lock:
+            anteriores = self.hashes if self.hashes is not None else pd.Series(dtype='uint64')
+            restantes = anteriores[~anteriores.index.isin(list(hashes) + list(chaves_removidas))]
+            gravados = pd.Series(list(hashes.values()), index=list(hashes), dtype='uint64')
+            self.hashes = pd.concat([restantes, gravados]) if len(restantes) else gravados
+
+    def reverter(self, chaves, hashes_anteriores):
+        """
+        Volta as chaves ao estado anterior à escrita (usado quando parte dela falhou),
+        para que reapareçam no próximo delta.
+        """
+        if not chaves:
+            return
+        chaves = pd.Index(chaves)
+        with self.lock:
+            restantes = self.hashes[~self.hashes.index.isin(chaves)]
+            restaurados = hashes_anteriores[hashes_anteriores.index.isin(chaves)]
+            self.hashes = pd.concat([restantes, restaurados])
+
+    def calcular_delta(self, df):
+        """
+        Compara o DataFrame atual com o último estado persistido.
+        Retorna (df_inseridos, df_atualizados, chaves_removidas).
+        """
+        atuais = self._hash_linhas(df)
+        with self.lock:
+            persistidos = self.hashes
+        if atuais.empty:
+            return df.iloc[0:0], df.iloc[0:0], list(persistidos.index)
+
+        ja_persistida = atuais.index.isin(persistidos.index)
+        hash_anterior = persistidos.reindex(atuais.index, fill_value=0).to_numpy()
+        alterada = ja_persistida & (atuais.to_numpy() != hash_anterior)
+
+        removidas = persistidos.index.difference(atuais.index)
+        return df[~ja_persistida], df[alterada], list(removidas)
+
+def _get_rastreador(table_name):
+    if table_name not in CHAVES_TABELAS:
+        return None
+    chave_sessao = f"_rastreador_{table_name}"
+    if chave_sessao not in st.session_state:
+        st.session_state[chave_sessao] = RastreadorAlteracoes(CHAVES_TABELAS[table_name])
+    return st.session_state[chave_sessao]
+
+def registrar_estado_persistido(table_name, df):
+    """Marca o DataFrame como idêntico ao que está no banco (após carregar ou salvar)."""
+    rastreador = _get_rastreador(table_name)
+    if rastreador is not None:
+        rastreador.registrar(df)
+
+# Mapeamento para garantir compatibilidade com o app original (Maiúsculas)
+MAPEAMENTO_COLUNAS = {
+    'id': 'ID_BANCO',
+    'original_id': 'ID',
+    'titulo': 'Titulo',
+    'tipo': 'Tipo',
+    'plataforma': 'Plataforma',
+    'autor': 'Autor',
+    'genero': 'Genero',
+    'status': 'Status',
+    'meu_hype': 'Meu_Hype',
+    'nota_externa': 'Nota_Externa',
+    'duracao': 'Duracao',
+    'unidade_duracao': 'Unidade_Duracao',
+    'nome_serie': 'Nome_Serie',
+    'ordem_serie': 'Ordem_Serie',
+    'total_serie': 'Total_Serie',
+    'data_adicao': 'Data_Adicao',
+    'progresso_atual': 'Progresso_Atual',
+    'progresso_total': 'Progresso_Total',
+    'minha_nota': 'Minha_Nota',
+    'cover_url': 'Cover_URL',
+    'data_finalizacao': 'Data_Finalizacao',
+    'tempo_final': 'Tempo_Final',
+    'origem': 'Origem'
+}
+
+# O PostgREST limita o número de linhas por resposta; a leitura é feita em páginas desse tamanho
+TAMANHO_PAGINA_LEITURA = 1000
+
+def _renomear_colunas(df):
+    df = df.rename(columns=MAPEAMENTO_COLUNAS)
+    # Garante que a coluna 'ID' exista (sem 'original_id', o ID do app é o próprio 'id' do banco).
+    # Uma projeção pode trazer 'original_id' vazio em todas as linhas: vale a mesma regra.
+    if 'ID_BANCO' in df.columns and ('ID' not in df.columns or df['ID'].isna().all()):
+        df['ID'] = df['ID_BANCO']
+    return df
+
+_MAPEAMENTO_INVERSO = {v: k for k, v in MAPEAMENTO_COLUNAS.items()}
+
+def _colunas_select(colunas):
+    """Converte nomes de colunas do app para o 'select' do PostgREST (None = todas)."""
+    if colunas is None:
+        return "*"
+    # 'id' (ID_BANCO) sempre vem junto: é a chave usada para completar colunas carregadas depois
+    nomes = ['id'] + [_MAPEAMENTO_INVERSO.get(c, c.lower()) for c in colunas]
+    return ",".join(dict.fromkeys(nomes))
+
+def _iterar_paginas(supabase, table_name, selecao, user_id=None, ordem=None, tamanho_pagina=TAMANHO_PAGINA_LEITURA):
+    """Lê a tabela em páginas (via range), opcionalmente só de um usuário. Entrega as linhas cruas de cada página."""
+    inicio, total = 0, None
+    while total is None or inicio < total:
+        consulta = supabase.table(table_name).select(selecao, count="exact" if total is None else None)
+        if user_id is not None:
+            consulta = consulta.eq("user_id", user_id)
+        if ordem:
+            # Ordem estável entre as páginas
+            consulta = consulta.order(ordem)
+        response = consulta.range(inicio, inicio + tamanho_pagina - 1).execute()
+        dados = response.data
+        if not dados:
+            break
+        if total is None:
+            total = response.count if response.count is not None else float('inf')
+        # Avança pelo que veio, não pelo que foi pedido: o servidor pode devolver menos linhas que a página
+        inicio += len(dados)
+        yield dados
+
+def iterar_dados_db(user_id, table_name, colunas=None, tamanho_pagina=TAMANHO_PAGINA_LEITURA):
+    """
+    Gerador que lê a tabela do usuário em páginas (via range) e entrega um DataFrame
+    por página, já com as colunas no padrão do app. 'colunas' limita a leitura a um subconjunto.
+    """
     supabase = get_supabase_client()
+    ordem = CHAVES_TABELAS[table_name].lower() if table_name in CHAVES_TABELAS else None
+    for dados in _iterar_paginas(supabase, table_name, _colunas_select(colunas), user_id=user_id, ordem=ordem, tamanho_pagina=tamanho_pagina):
+        yield _renomear_colunas(pd.DataFrame(dados))
+
+def iterar_tabela_completa_db(supabase, table_name, tamanho_pagina=TAMANHO_PAGINA_LEITURA):
+    """
+    Lê a tabela de todos os usuários (jobs em lote, com criar_cliente_servico). Cada página vem como
+    DataFrame no padrão do app, mantendo a coluna user_id.
+    """
+    ordem = CHAVES_TABELAS[table_name].lower() if table_name in CHAVES_TABELAS else "user_id"
+    for dados in _iterar_paginas(supabase, table_name, "*", ordem=ordem, tamanho_pagina=tamanho_pagina):
+        yield _renomear_colunas(pd.DataFrame(dados))
+
+def carregar_dados_db(user_id, table_name, colunas=None):
     try:
-        response = supabase.table(table_name).select("*").eq("user_id", user_id).execute()
-        dados = response.data
-        if dados:
-            df = pd.DataFrame(dados)
-            
-            # Mapeamento para garantir compatibilidade com o app original (Maiúsculas)
-            mapeamento = {
-                'id': 'ID_BANCO',
-                'original_id': 'ID',
-                'titulo': 'Titulo',
-                'tipo': 'Tipo',
-                'plataforma': 'Plataforma',
-                'autor': 'Autor',
-                'genero': 'Genero',
-                'status': 'Status',
-                'meu_hype': 'Meu_Hype',
-                'nota_externa': 'Nota_Externa',
-                'duracao': 'Duracao',
-                'unidade_duracao': 'Unidade_Duracao',
-                'nome_serie': 'Nome_Serie',
-                'ordem_serie': 'Ordem_Serie',
-                'total_serie': 'Total_Serie',
-                'data_adicao': 'Data_Adicao',
-                'progresso_atual': 'Progresso_Atual',
-                'progresso_total': 'Progresso_Total',
-                'minha_nota': 'Minha_Nota',
-                'cover_url': 'Cover_URL',
-                'data_finalizacao': 'Data_Finalizacao',
-                'tempo_final': 'Tempo_Final',
-                'origem': 'Origem'
-            }
-            df = df.rename(columns=mapeamento)
-            
-            # Garante que a coluna 'ID' exista
-            if 'ID' not in df.columns and 'id' in df.columns:
-                df['ID'] = df['id']
-                
+        paginas = list(iterar_dados_db(user_id, table_name, colunas=colunas))
+        if paginas:
+            df = pd.concat(paginas, ignore_index=True) if len(paginas) > 1 else paginas[0]
+            registrar_estado_persistido(table_name, df)
             return df
         else:
+            registrar_estado_persistido(table_name, pd.DataFrame())
             return pd.DataFrame()
     except Exception as e:
         return pd.DataFrame()
 
+def carregar_colunas_adicionais_db(user_id, table_name, df, colunas):
+    """
+    Busca no banco colunas que ficaram de fora da carga inicial e as adiciona ao DataFrame,
+    casando as linhas pelo ID_BANCO. Valores já preenchidos na sessão são mantidos.
+    """
+    try:
+        paginas = list(iterar_dados_db(user_id, table_name, colunas=colunas))
+    except Exception as e:
+        st.error(f"Erro ao carregar dados: {e}")
+        return df
+
+    rastreador = _get_rastreador(table_name)
+    pendentes = []
+    if rastreador is not None and rastreador.inicializado:
+        # Linhas ainda não persistidas continuam pendentes depois da mescla. O delta é calculado só com as
+        # colunas do último registro: uma coluna nova na sessão (ex: Cover_URL de um item recém-adicionado)
+        # mudaria o hash de todas as linhas; os valores dela são conferidos abaixo, linha a linha.
+        hashes_anteriores = rastreador.hashes
+        colunas_rastreadas = [c for c in df.columns if c in rastreador.colunas or c == rastreador.coluna_chave]
+        df_inseridos, df_atualizados, chaves_removidas = rastreador.calcular_delta(df[colunas_rastreadas])
+        pendentes = list(df_inseridos[rastreador.coluna_chave]) + list(df_atualizados[rastreador.coluna_chave]) + chaves_removidas
+
+    df = df.copy()
+    valores = pd.concat(paginas, ignore_index=True) if paginas else pd.DataFrame(columns=['ID_BANCO'] + colunas)
+    valores = valores.drop_duplicates('ID_BANCO').set_index('ID_BANCO')
+    chaves_banco = df['ID_BANCO'] if 'ID_BANCO' in df.columns else pd.Series(index=df.index, dtype='object')
+    alterados_na_sessao = pd.Series(False, index=df.index)
+    for coluna in colunas:
+        carregados = chaves_banco.map(valores[coluna]) if coluna in valores.columns else pd.Series(index=df.index, dtype='object')
+        if coluna in df.columns:
+            preenchidos = df[coluna].notna()
+            alterados_na_sessao |= preenchidos & (df[coluna].astype(object) != carregados.astype(object))
+            df[coluna] = df[coluna].where(preenchidos, carregados)
+        else:
+            df[coluna] = carregados
+    if rastreador is not None and rastreador.inicializado and rastreador.coluna_chave in df.columns:
+        pendentes += list(df.loc[alterados_na_sessao, rastreador.coluna_chave])
+
+    if rastreador is not None and rastreador.inicializado:
+        rastreador.registrar(df)
+        rastreador.reverter(pendentes, hashes_anteriores)
+    return df
+
+# Escrita em lotes: limita o tamanho de cada requisição ao PostgREST e repete lotes que falharem
+TAMANHO_LOTE_UPSERT = 500
+LIMITE_BYTES_LOTE = 1_000_000
+TAMANHO_LOTE_DELETE = 200
+MAX_LOTES_PARALELOS = 4
+MAX_TENTATIVAS_LOTE = 3
+ESPERA_BASE_RETRY = 0.5
+
+# Códigos de erro do PostgREST/Postgres que passam numa nova tentativa: banco fora do ar ou sem conexão livre
+# (PGRST000-003), conflito de concorrência (40001, 40P01), consulta cancelada por timeout ou servidor
+# reiniciando (57xxx), falha de conexão (classe 08) e falta de recursos (classe 53)
+CODIGOS_ERRO_TRANSITORIO = {"PGRST000", "PGRST001", "PGRST002", "PGRST003", "40001", "40P01", "57014", "57P01", "57P03"}
+CLASSES_ERRO_TRANSITORIO = ("08", "53")
+
+def _erro_transitorio(erro):
+    """
+    Se vale repetir a operação que falhou com 'erro': falhas de rede, HTTP 429 ou 5xx e erros passageiros
+    do banco. Erros do cliente (4xx, violação de restrição, coluna inexistente) falhariam de novo.
+    """
+    if isinstance(erro, httpx.TransportError):
+        return True
+    if isinstance(erro, sqlite3.OperationalError):
+        # Backend local: só o banco ocupado por outra conexão é passageiro
+        return "locked" in str(erro) or "busy" in str(erro)
+    codigo = getattr(erro, "code", None)
+    if isinstance(codigo, int):
+        # Resposta sem corpo JSON do PostgREST (ex: gateway): o código é o status HTTP
+        return codigo == 429 or codigo >= 500
+    if isinstance(codigo, str):
+        return codigo in CODIGOS_ERRO_TRANSITORIO or codigo.startswith(CLASSES_ERRO_TRANSITORIO)
+    return False
+
+def _executar_com_retry(operacao, max_tentativas=MAX_TENTATIVAS_LOTE, espera_base=ESPERA_BASE_RETRY):
+    for tentativa in range(max_tentativas):
+        try:
+            return operacao()
+        except Exception as e:
+            if tentativa == max_tentativas - 1 or not _erro_transitorio(e):
+                raise
+            time.sleep(espera_base * (2 ** tentativa))
+
+def _dividir_em_lotes(registros, tamanho_lote, limite_bytes):
+    """Agrupa registros respeitando o número máximo de linhas e o tamanho aproximado do JSON."""
+    lotes, lote_atual, bytes_atual = [], [], 0
+    for registro in registros:
+        tamanho = len(json.dumps(registro, default=str))
+        if lote_atual and (len(lote_atual) >= tamanho_lote or bytes_atual + tamanho > limite_bytes):
+            lotes.append(lote_atual)
+            lote_atual, bytes_atual = [], 0
+        lote_atual.append(registro)
+        bytes_atual += tamanho
+    if lote_atual:
+        lotes.append(lote_atual)
+    return lotes
+
+def _executar_lotes(lotes, operacao_lote, max_paralelos):
+    """Executa os lotes em paralelo (limitado) e retorna [(lote, erro)] dos que falharam."""
+    def executar(lote):
+        try:
+            _executar_com_retry(lambda: operacao_lote(lote))
+            return None
+        except Exception as e:
+            return (lote, e)
+
+    if len(lotes) <= 1 or max_paralelos <= 1:
+        resultados = [executar(lote) for lote in lotes]
+    else:
+        with ThreadPoolExecutor(max_workers=min(max_paralelos, len(lotes))) as executor:
+            resultados = list(executor.map(executar, lotes))
+    return [r for r in resultados if r is not None]
+
+def upsert_em_lotes(supabase, table_name, registros, coluna_chave=None, tamanho_lote=TAMANHO_LOTE_UPSERT,
+                    limite_bytes=LIMITE_BYTES_LOTE, max_paralelos=MAX_LOTES_PARALELOS):
+    """
+    Faz o upsert dos registros em lotes, com retry exponencial por lote.
+    Retorna {'enviados': int, 'falhas': [{'chave', 'erro'}]}.
+    """
+    lotes = _dividir_em_lotes(registros, tamanho_lote, limite_bytes)
+    falhas_lotes = _executar_lotes(lotes, lambda lote: supabase.table(table_name).upsert(lote).execute(), max_paralelos)
+
+    falhas = [
+        {"chave": registro.get(coluna_chave) if coluna_chave else None, "erro": str(erro)}
+        for lote, erro in falhas_lotes for registro in lote
+    ]
+    return {"enviados": len(registros) - len(falhas), "falhas": falhas}
+
+def deletar_em_lotes(supabase, table_name, user_id, coluna_chave, chaves, tamanho_lote=TAMANHO_LOTE_DELETE,
+                     max_paralelos=MAX_LOTES_PARALELOS):
+    """Remove as chaves informadas em lotes. Retorna {'removidos': int, 'falhas': [{'chave', 'erro'}]}."""
+    lotes = [chaves[i:i + tamanho_lote] for i in range(0, len(chaves), tamanho_lote)]
+    falhas_lotes = _executar_lotes(
+        lotes,
+        lambda lote: supabase.table(table_name).delete().eq("user_id", user_id).in_(coluna_chave, lote).execute(),
+        max_paralelos,
+    )
+    falhas = [{"chave": chave, "erro": str(erro)} for lote, erro in falhas_lotes for chave in lote]
+    return {"removidos": len(chaves) - len(falhas), "falhas": falhas}
+
+def _serializar_coluna(serie):
+    """Converte uma coluna inteira para valores aceitos pelo JSON (None, str ISO, tipos Python)."""
+    nulos = serie.isna().to_numpy()
+    if pd.api.types.is_datetime64_any_dtype(serie):
+        valores = serie.map(lambda v: v.isoformat(), na_action='ignore').to_numpy(dtype=object)
+    elif serie.dtype == object and pd.api.types.infer_dtype(serie, skipna=True) not in ('string', 'integer', 'floating', 'boolean', 'empty'):
+        # Coluna mista: só aqui é preciso olhar valor a valor em busca de datas
+        valores = serie.map(lambda v: v.isoformat() if isinstance(v, (pd.Timestamp, datetime)) else v).to_numpy(dtype=object)
+    else:
+        valores = serie.to_numpy(dtype=object)
+    if nulos.any():
+        valores = valores.copy()
+        valores[nulos] = None
+    return valores
+
+def _serializar_registros(user_id, df):
+    # Conversão feita uma vez por coluna; as linhas só são montadas no final
+    nomes = [str(c).lower() for c in df.columns]
+    colunas = [_serializar_coluna(df.iloc[:, i]) for i in range(df.shape[1])]
+    registros = []
+    for linha in zip(*colunas):
+        registro = dict(zip(nomes, linha))
+        registro['user_id'] = user_id
+        registros.append(registro)
+    return registros
+
+def _valor_json(valor):
+    # Chaves vindas do índice do pandas são tipos numpy (np.int64), que o JSON não aceita
+    return valor.item() if hasattr(valor, 'item') else valor
+
+def _calcular_delta(rastreador, df):
+    if rastreador is not None and rastreador.inicializado:
+        return rastreador.calcular_delta(df)
+    return df, df.iloc[0:0], []
+
+def executar_escrita_db(supabase, user_id, table_name, coluna_chave, registros, chaves_removidas):
+    """Envia remoções e upserts já serializados. Retorna a lista de falhas [{'chave', 'erro'}]."""
+    falhas = []
+    if chaves_removidas:
+        falhas += deletar_em_lotes(supabase, table_name, user_id, coluna_chave, chaves_removidas)["falhas"]
+    if registros:
+        falhas += upsert_em_lotes(supabase, table_name, registros, coluna_chave=coluna_chave)["falhas"]
+    return falhas
+
+def preparar_escrita_db(user_id, table_name, df):
+    """
+    Calcula e serializa o delta do DataFrame sem enviá-lo. Usado pela escrita em segundo plano: as linhas
+    só passam a contar como persistidas quando ela chama rastreador.confirmar com as que foram gravadas
+    (até lá, cada save volta a incluí-las no delta).
+    Retorna (rastreador, coluna_chave, registros, hashes {chave: hash}, chaves_removidas).
+    """
+    rastreador = _get_rastreador(table_name)
+    coluna_chave = rastreador.coluna_chave.lower() if rastreador is not None else None
+    df_inseridos, df_atualizados, chaves_removidas = _calcular_delta(rastreador, df)
+    df_alterados = pd.concat([df_inseridos, df_atualizados])
+    registros = _serializar_registros(user_id, df_alterados) if not df_alterados.empty else []
+    hashes = rastreador.hashes_linhas(df_alterados) if rastreador is not None else {}
+    return rastreador, coluna_chave, registros, hashes, [_valor_json(c) for c in chaves_removidas]
+
 def salvar_dados_db(user_id, table_name, df):
+    """
+    Persiste o DataFrame da tabela. Quando a tabela tem rastreamento de alterações,
+    envia apenas as linhas inseridas/alteradas e remove as que saíram do DataFrame.
+    A escrita é feita em lotes com retry; linhas que falharem voltam a ser enviadas na próxima chamada.
+    Retorna um resumo {'inseridos', 'atualizados', 'removidos', 'falhas'} ou None em caso de erro.
+    """
     supabase = get_supabase_client()
+    rastreador = _get_rastreador(table_name)
+    coluna_chave = rastreador.coluna_chave.lower() if rastreador is not None else None
     try:
-        if df.empty: return
-        
-        items = df.to_dict(orient='records')
-        for item in items:
-            item['user_id'] = user_id
-            for k, v in list(item.items()):
-                if pd.isna(v): item[k] = None
-                elif isinstance(v, (pd.Timestamp, datetime)): item[k] = v.isoformat()
-                
-                # Converte chaves para minúsculo para o Supabase
-                if k != 'user_id':
-                    new_key = k.lower()
-                    item[new_key] = item.pop(k)
-        
-        supabase.table(table_name).upsert(items).execute()
+        if (rastreador is None or not rastreador.inicializado) and df.empty:
+            return {"inseridos": 0, "atualizados": 0, "removidos": 0, "falhas": []}
+        df_inseridos, df_atualizados, chaves_removidas = _calcular_delta(rastreador, df)
+
+        df_alterados = pd.concat([df_inseridos, df_atualizados])
+        registros = _serializar_registros(user_id, df_alterados) if not df_alterados.empty else []
+        falhas = executar_escrita_db(supabase, user_id, table_name, coluna_chave, registros, [_valor_json(c) for c in chaves_removidas])
+
+        if rastreador is not None:
+            hashes_anteriores = rastreador.hashes if rastreador.inicializado else pd.Series(dtype='uint64')
+            rastreador.registrar(df)
+            rastreador.reverter([f["chave"] for f in falhas if f["chave"] is not None], hashes_anteriores)
+
+        if falhas:
+            st.error(f"Erro ao salvar {len(falhas)} linha(s) em '{table_name}': {falhas[0]['erro']}")
+        return {
+            "inseridos": len(df_inseridos), "atualizados": len(df_atualizados),
+            "removidos": len(chaves_removidas), "falhas": falhas
+        }
     except Exception as e:
         st.error(f"Erro ao salvar dados: {e}")
+        return None
 
 def deletar_item_db(user_id, table_name, item_id):
     supabase = get_supabase_client()
@@ -115,3 +586,21 @@ def deletar_item_db(user_id, table_name, item_id):
         supabase.table(table_name).delete().eq("user_id", user_id).eq("id", item_id).execute()
     except Exception as e:
         st.error(f"Erro ao deletar item: {e}")
+
+# Top N de cada usuário calculado por ranking_lote.py (uma linha por usuário).
+# Colunas: user_id (chave), assinatura, total_itens, itens (JSON), calculado_em.
+TABELA_RANKINGS_PRECALCULADOS = "rankings_precalculados"
+
+def carregar_ranking_precalculado_db(user_id):
+    """Retorna o ranking pré-calculado do usuário (dict) ou None se não houver ou a leitura falhar."""
+    supabase = get_supabase_client()
+    try:
+        response = supabase.table(TABELA_RANKINGS_PRECALCULADOS).select("*").eq("user_id", user_id).execute()
+        return response.data[0] if response.data else None
+    except Exception:
+        # Tabela ausente ou sem permissão: o app calcula o ranking normalmente
+        return None
+
+def salvar_rankings_precalculados_db(supabase, registros):
+    """Grava os rankings de vários usuários de uma vez. Retorna o resultado de upsert_em_lotes."""
+    return upsert_em_lotes(supabase, TABELA_RANKINGS_PRECALCULADOS, registros, coluna_chave="user_id")
@@ -0,0 +1,220 @@
+# SIB - Escrita em segundo plano (write-behind)
+# Os saves entram numa fila por usuário e uma thread os agrupa e envia ao banco,
+# para que o rerun do Streamlit não espere pela rede.
+import atexit
+import copy
+import threading
+import time
+import streamlit as st
+
+from db_connection import get_supabase_client, preparar_escrita_db, executar_escrita_db, executar_escrita_config_db
+
+# Janela para agrupar várias escritas seguidas em um único envio
+INTERVALO_AGRUPAMENTO = 1.0
+# Espera entre novas tentativas quando o envio falha
+ESPERA_APOS_FALHA = 5.0
+TIMEOUT_DESCARGA = 30.0
+
+class FilaEscrita:
+    """
+    Escritas pendentes de um usuário, já agrupadas: por tabela guarda a versão mais recente
+    de cada linha e as chaves a remover; da configuração guarda só a última.
+    Cada linha só é confirmada no rastreador de alterações da sessão depois de gravada.
+    """
+
+    def __init__(self, user_id):
+        self.user_id = user_id
+        self.condicao = threading.Condition()
+        self.supabase = None
+        self.upserts = {}   # tabela -> {chave: (registro, hash da linha)}
+        self.remocoes = {}  # tabela -> set de chaves
+        self.colunas_chave = {}
+        self.rastreadores = {}
+        self.config = None
+        self.enviando = 0
+        self.ultimo_erro = None
+        self.encerrada = False
+        self.thread = threading.Thread(target=self._executar, name=f"fila-escrita-{user_id}", daemon=True)
+        self.thread.start()
+
+    def enfileirar_dados(self, supabase, table_name, rastreador, coluna_chave, registros, hashes, chaves_removidas):
+        with self.condicao:
+            self.supabase = supabase
+            self.colunas_chave[table_name] = coluna_chave
+            self.rastreadores[table_name] = rastreador
+            upserts = self.upserts.setdefault(table_name, {})
+            remocoes = self.remocoes.setdefault(table_name, set())
+            for chave in chaves_removidas:
+                upserts.pop(chave, None)
+                remocoes.add(chave)
+            for registro in registros:
+                chave = registro.get(coluna_chave) if coluna_chave else None
+                # Linhas sem chave não podem ser agrupadas: cada uma fica com uma entrada própria
+                chave = chave if chave is not None else ("__sem_chave__", id(registro))
+                remocoes.discard(chave)
+                upserts[chave] = (registro, hashes.get(chave))
+            self.condicao.notify()
+
+    def enfileirar_config(self, supabase, config):
+        with self.condicao:
+            self.supabase = supabase
+            self.config = copy.deepcopy(config)
+            self.condicao.notify()
+
+    def pendentes(self):
+        with self.condicao:
+            total = sum(len(u) for u in self.upserts.values()) + sum(len(r) for r in self.remocoes.values())
+            return total + (1 if self.config is not None else 0) + self.enviando
+
+    def descarregar(self, timeout=TIMEOUT_DESCARGA):
+        """Bloqueia até a fila esvaziar (ou o timeout). Retorna True se tudo foi enviado."""
+        limite = time.monotonic() + timeout
+        with self.condicao:
+            self.condicao.notify()
+            while self._tem_trabalho() or self.enviando:
+                restante = limite - time.monotonic()
+                if restante <= 0:
+                    return False
+                self.condicao.wait(restante)
+        return True
+
+    def encerrar(self):
+        """Para a thread descartando o que ainda estiver pendente (ex: logout)."""
+        with self.condicao:
+            self.encerrada = True
+            self.upserts, self.remocoes, self.config = {}, {}, None
+            self.condicao.notify_all()
+
+    def _tem_trabalho(self):
+        return self.config is not None or any(self.upserts.values()) or any(self.remocoes.values())
+
+    def _retirar_lote(self):
+        upserts, remocoes, config = self.upserts, self.remocoes, self.config
+        self.upserts, self.remocoes, self.config = {}, {}, None
+        self.enviando = sum(len(u) for u in upserts.values()) + sum(len(r) for r in remocoes.values()) + (1 if config is not None else 0)
+        return upserts, remocoes, config
+
+    def _devolver_lote(self, upserts, remocoes, config):
+        # Só devolve o que não foi substituído por uma escrita mais nova enquanto o lote era enviado
+        for tabela, registros in upserts.items():
+            atuais = self.upserts.setdefault(tabela, {})
+            for chave, registro in registros.items():
+                if chave not in atuais and chave not in self.remocoes.get(tabela, set()):
+                    atuais[chave] = registro
+        for tabela, chaves in remocoes.items():
+            for chave in chaves:
+                if chave not in self.upserts.get(tabela, {}):
+                    self.remocoes.setdefault(tabela, set()).add(chave)
+        if config is not None and self.config is None:
+            self.config = config
+
+    def _enviar(self, supabase, upserts, remocoes, config):
+        """Envia o lote. Retorna as partes que falharam (upserts, remocoes, config)."""
+        falhas_upserts, falhas_remocoes, falha_config = {}, {}, None
+        for tabela in set(upserts) | set(remocoes):
+            coluna_chave = self.colunas_chave.get(tabela)
+            registros = upserts.get(tabela, {})
+            chaves = list(remocoes.get(tabela, set()))
+            falhas = executar_escrita_db(supabase, self.user_id, tabela, coluna_chave, [r for r, _ in registros.values()], chaves)
+            chaves_falhas = {f["chave"] for f in falhas}
+            if falhas:
+                self.ultimo_erro = falhas[0]["erro"]
+                if coluna_chave is None:
+                    falhas_upserts[tabela] = registros
+                else:
+                    falhas_upserts[tabela] = {c: par for c, par in registros.items() if c in chaves_falhas}
+                falhas_remocoes[tabela] = {c for c in chaves if c in chaves_falhas}
+            rastreador = self.rastreadores.get(tabela)
+            if rastreador is not None and coluna_chave is not None:
+                gravados = {c: h for c, (_, h) in registros.items() if c not in chaves_falhas and h is not None}
+                rastreador.confirmar(gravados, [c for c in chaves if c not in chaves_falhas])
+        if config is not None:
+            try:
+                executar_escrita_config_db(supabase, self.user_id, config)
+            except Exception as e:
+                self.ultimo_erro = str(e)
+                falha_config = config
+        return falhas_upserts, falhas_remocoes, falha_config
+
+    def _executar(self):
+        while True:
+            with self.condicao:
+                while not self._tem_trabalho() and not self.encerrada:
+                    self.condicao.wait()
+                if self.encerrada:
+                    return
+            # Dá tempo para escritas seguidas se acumularem antes do envio
+            time.sleep(INTERVALO_AGRUPAMENTO)
+            with self.condicao:
+                if self.encerrada:
+                    return
+                supabase = self.supabase
+                upserts, remocoes, config = self._retirar_lote()
+            try:
+                falhas = self._enviar(supabase, upserts, remocoes, config)
+            except Exception as e:
+                self.ultimo_erro = str(e)
+                falhas = (upserts, remocoes, config)
+            houve_falha = any(falhas[0].values()) or any(falhas[1].values()) or falhas[2] is not None
+            with self.condicao:
+                if houve_falha:
+                    self._devolver_lote(*falhas)
+                else:
+                    self.ultimo_erro = None
+                self.enviando = 0
+                self.condicao.notify_all()
+            if houve_falha:
+                time.sleep(ESPERA_APOS_FALHA)
+
+@st.cache_resource(show_spinner=False)
+def _registro_filas():
+    filas = {}
+    lock = threading.Lock()
+
+    def descarregar_todas():
+        for fila in list(filas.values()):
+            fila.descarregar()
+
+    # Garante que nada fique na fila quando o servidor é encerrado
+    atexit.register(descarregar_todas)
+    return filas, lock
+
+def obter_fila(user_id):
+    filas, lock = _registro_filas()
+    with lock:
+        if user_id not in filas:
+            filas[user_id] = FilaEscrita(user_id)
+        return filas[user_id]
+
+def enfileirar_dados(user_id, table_name, df):
+    """Versão em segundo plano de salvar_dados_db: calcula o delta agora e o envia depois."""
+    rastreador, coluna_chave, registros, hashes, chaves_removidas = preparar_escrita_db(user_id, table_name, df)
+    if registros or chaves_removidas:
+        obter_fila(user_id).enfileirar_dados(get_supabase_client(), table_name, rastreador, coluna_chave, registros, hashes, chaves_removidas)
+
+def enfileirar_config(user_id, config):
+    obter_fila(user_id).enfileirar_config(get_supabase_client(), config)
+
+def escritas_pendentes(user_id):
+    """Retorna (quantidade de escritas pendentes, último erro de envio ou None)."""
+    filas, lock = _registro_filas()
+    with lock:
+        fila = filas.get(user_id)
+    if fila is None:
+        return 0, None
+    return fila.pendentes(), fila.ultimo_erro
+
+def descarregar_fila(user_id, timeout=TIMEOUT_DESCARGA):
+    """Envia tudo o que estiver pendente para o usuário (ex: antes do logout)."""
+    filas, lock = _registro_filas()
+    with lock:
+        fila = filas.get(user_id)
+    return fila.descarregar(timeout) if fila is not None else True
+
+def encerrar_fila(user_id):
+    """Para a fila do usuário e a retira do registro; o que não foi enviado é descartado."""
+    filas, lock = _registro_filas()
+    with lock:
+        fila = filas.pop(user_id, None)
+    if fila is not None:
+        fila.encerrar()
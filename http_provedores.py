@@ -0,0 +1,69 @@
+# SIB - Camada HTTP das APIs externas (Twitch/IGDB, TMDb, Google Books, RetroAchievements)
+# Uma requests.Session por provedor, compartilhada pelo processo: conexões keep-alive reaproveitadas
+# por host, timeouts de conexão e leitura em toda chamada e novas tentativas com espera exponencial
+# e aleatória em 429/5xx.
+import threading
+import requests
+import streamlit as st
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+TIMEOUT_CONEXAO = 5.0
+TIMEOUT_LEITURA = 20.0
+# Conexões mantidas abertas por host (várias sessões do Streamlit e o modo "Em Lote" buscam ao mesmo tempo)
+POOL_MAX_CONEXOES_HOST = 10
+MAX_TENTATIVAS = 3
+ESPERA_BASE_RETRY = 0.5
+JITTER_RETRY = 0.5
+STATUS_RETRY = (429, 500, 502, 503, 504)
+# Teto para o Retry-After do servidor: sem ele, um 429 com "Retry-After: 3600" prenderia a thread por uma hora
+ESPERA_MAXIMA_RETRY_AFTER = 5.0
+# Métodos repetidos após 429/5xx ou timeout de leitura: por padrão só os idempotentes do urllib3. As buscas do
+# IGDB são POST só de leitura e entram; o POST do token da Twitch não, pois repeti-lo emite outro token.
+# Falhas de conexão (a requisição nem saiu) são repetidas para qualquer método.
+METODOS_RETRY_POR_PROVEDOR = {"igdb": Retry.DEFAULT_ALLOWED_METHODS | {"POST"}}
+
+class RetryLimitado(Retry):
+    """Retry do urllib3 que respeita o Retry-After só até ESPERA_MAXIMA_RETRY_AFTER."""
+
+    def get_retry_after(self, response):
+        espera = super().get_retry_after(response)
+        return None if espera is None else min(espera, ESPERA_MAXIMA_RETRY_AFTER)
+
+def _criar_sessao(provedor):
+    # Timeout de leitura é tentado de novo só uma vez, para um provedor lento não prender o rerun por minutos.
+    retry = RetryLimitado(
+        total=MAX_TENTATIVAS, read=1, backoff_factor=ESPERA_BASE_RETRY, backoff_jitter=JITTER_RETRY,
+        status_forcelist=STATUS_RETRY, allowed_methods=METODOS_RETRY_POR_PROVEDOR.get(provedor, Retry.DEFAULT_ALLOWED_METHODS),
+        respect_retry_after_header=True, raise_on_status=False,
+    )
+    adaptador = HTTPAdapter(pool_maxsize=POOL_MAX_CONEXOES_HOST, max_retries=retry)
+    sessao = requests.Session()
+    sessao.mount("https://", adaptador)
+    sessao.mount("http://", adaptador)
+    return sessao
+
+class SessoesProvedores:
+    """Sessões HTTP por provedor, compartilhadas pelo processo."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.sessoes = {}
+
+    def sessao(self, provedor):
+        with self.lock:
+            if provedor not in self.sessoes:
+                self.sessoes[provedor] = _criar_sessao(provedor)
+            return self.sessoes[provedor]
+
+@st.cache_resource(show_spinner=False)
+def get_sessoes_provedores():
+    return SessoesProvedores()
+
+def requisitar(provedor, metodo, url, **kwargs):
+    """
+    Faz a requisição pela sessão do provedor, com timeout padrão (TIMEOUT_CONEXAO, TIMEOUT_LEITURA).
+    Como requests.request: retorna a resposta sem checar o status e propaga RequestException.
+    """
+    kwargs.setdefault("timeout", (TIMEOUT_CONEXAO, TIMEOUT_LEITURA))
+    return get_sessoes_provedores().sessao(provedor).request(metodo, url, **kwargs)
@@ -1,12 +1,18 @@
 import streamlit as st
 from db_connection import get_supabase_client
 import pandas as pd
+import threading
+import time
 
-def verificar_plano_usuario(user_id):
-    """
-    Verifica qual plano o usuário tem (Gratuito ou Premium).
-    Retorna: 'Gratuito' ou 'Premium'
-    """
+# Tempo (segundos) que o plano consultado fica em cache antes de ser lido de novo do banco
+TTL_CACHE_PLANO = 300
+
+@st.cache_resource(show_spinner=False)
+def _cache_planos():
+    """Cache do processo: user_id -> (plano, instante de expiração)."""
+    return {}, threading.Lock()
+
+def _consultar_plano_usuario(user_id):
     supabase = get_supabase_client()
     try:
         response = supabase.table("user_profiles").select("plano").eq("user_id", user_id).execute()
@@ -17,7 +23,33 @@ def verificar_plano_usuario(user_id):
             criar_perfil_usuario(user_id)
             return "Gratuito"
     except Exception as e:
+        return None
+
+def verificar_plano_usuario(user_id):
+    """
+    Verifica qual plano o usuário tem (Gratuito ou Premium).
+    O resultado fica em cache por TTL_CACHE_PLANO segundos; use invalidar_cache_plano após upgrades.
+    Retorna: 'Gratuito' ou 'Premium'
+    """
+    cache, lock = _cache_planos()
+    with lock:
+        entrada = cache.get(user_id)
+    if entrada and entrada[1] > time.monotonic():
+        return entrada[0]
+
+    plano = _consultar_plano_usuario(user_id)
+    if plano is None:
+        # Falha na consulta: não guarda em cache, para não prender o usuário no plano Gratuito
         return "Gratuito"
+    with lock:
+        cache[user_id] = (plano, time.monotonic() + TTL_CACHE_PLANO)
+    return plano
+
+def invalidar_cache_plano(user_id):
+    """Descarta o plano em cache do usuário (chamar sempre que o plano mudar)."""
+    cache, lock = _cache_planos()
+    with lock:
+        cache.pop(user_id, None)
 
 def criar_perfil_usuario(user_id):
     """
@@ -121,6 +153,7 @@ def simular_upgrade_premium():
             "data_upgrade": pd.Timestamp.now().isoformat()
         }
         supabase.table("user_profiles").upsert(data).execute()
+        invalidar_cache_plano(user_id)
         st.success("✅ Você foi promovido para Premium (TESTE)!")
         st.rerun()
     except Exception as e:
@@ -1,55 +1,778 @@
-import pandas as pd
-import numpy as np
+# SIB - Motor de ranking
+# Pontuação do backlog a partir de um registro de fatores (ver registrar_fator), com os agregados
+# mantidos por EstoqueFatores e a ordenação parcial para o Top K. Não depende do Streamlit, para ser
+# usado pelo app, pelo ranking em lote e pelos benchmarks.
+from collections import Counter
 from datetime import datetime
+from functools import lru_cache
+
+import numpy as np
+import pandas as pd
+
+def como_data(serie):
+    """
+    Retorna a série como datetime64, convertendo apenas se ainda não estiver no tipo certo.
+    Cada texto distinto é convertido uma única vez (as datas do backlog se repetem muito).
+    """
+    if pd.api.types.is_datetime64_any_dtype(serie):
+        return serie
+    codigos, textos = pd.factorize(serie)
+    datas = pd.to_datetime(textos, errors='coerce')
+    return pd.Series(datas.take(codigos, allow_fill=True, fill_value=pd.NaT), index=serie.index, name=serie.name)
+
+def _numerico(serie):
+    # Uma coluna de como_numerico
+    if not pd.api.types.is_numeric_dtype(serie):
+        serie = pd.to_numeric(serie, errors='coerce')
+    return serie.fillna(0) if serie.hasnans else serie
+
+def como_numerico(df, colunas):
+    """Garante colunas numéricas sem nulos; colunas que já seguem o esquema não são convertidas de novo."""
+    for col in colunas:
+        original = df[col]
+        convertida = _numerico(original)
+        if convertida is not original:
+            df[col] = convertida
+    return df
+
+def mascara_valores(serie, valores):
+    """
+    serie.isin(valores) como array booleano. Categorias comparam só os códigos e colunas NumPy (texto object,
+    IDs inteiros) usam o == do NumPy, bem mais barato que o isin e que a comparação do pandas 2.x sobre texto.
+    """
+    if isinstance(serie.dtype, pd.CategoricalDtype):
+        # Nulos têm código -1 e caem no False acrescentado ao fim
+        return np.append(serie.cat.categories.isin(valores), False)[serie.array.codes]
+    if isinstance(serie.dtype, np.dtype):
+        textos = serie.to_numpy()
+        mascara = np.zeros(len(textos), dtype=bool)
+        for valor in valores:
+            mascara |= textos == valor
+        return mascara
+    return serie.isin(valores).to_numpy(dtype=bool)
+
+# Fatores usados quando o chamador não informa quais estão ativos
+FATORES_PADRAO = {
+    "Meu_Hype": True, "Nota_Externa": True, "Afinidade_Genero": True,
+    "Fator_Continuidade": True, "Progresso": True, "Antiguidade": True, "Duracao": True,
+    "Bonus_Catchup": True
+}
+# Dias no backlog -> nota de antiguidade. O primeiro valor (NaN) cobre datas mais de um dia no futuro.
+FAIXAS_ANTIGUIDADE_DIAS = np.array([-1, 180, 365, 730, np.inf])
+NOTAS_ANTIGUIDADE = np.array([np.nan, 0, 2.5, 5, 10])
+
+def separar_generos(texto):
+    """'Ação, RPG' -> ['Ação', 'RPG'], sem repetidos. Valores nulos ou que não são texto não têm gêneros."""
+    if not isinstance(texto, str):
+        return []
+    return list(dict.fromkeys(g for g in (g.strip() for g in texto.split(',')) if g))
+
+@lru_cache(maxsize=8192)
+def _generos_do_texto(texto):
+    # Os mesmos textos de 'Genero' voltam a cada rerun; o parsing de cada um é feito uma única vez
+    return tuple(separar_generos(texto))
+
+class IndiceGeneros:
+    """
+    Gêneros de cada item sem repetir o parsing do texto 'Genero': vocabulário ordenado e uma matriz
+    booleana textos distintos x gêneros. Cada item aponta para a linha do seu texto ('codigos'), o que
+    equivale a uma matriz esparsa itens x gêneros. A última linha da matriz (toda False) é a dos nulos.
+    Os métodos aceitam em 'selecao' uma máscara booleana sobre os itens indexados ou um subconjunto dos
+    rótulos ('rotulos') do DataFrame de origem, como o de backlog_df[backlog_df['Tipo'] == 'Jogo'].
+    Os textos distintos ficam em 'textos', com seus gêneros em 'generos_por_texto'.
+    """
+
+    def __init__(self, generos):
+        self.rotulos = generos.index
+        self.codigos, textos = pd.factorize(generos)
+        self.textos = textos.tolist()
+        self.generos_por_texto = generos_por_texto = [_generos_do_texto(texto) if isinstance(texto, str) else () for texto in self.textos]
+        self.vocabulario = sorted({g for lista in generos_por_texto for g in lista})
+        posicao = {g: i for i, g in enumerate(self.vocabulario)}
+        self.matriz = np.zeros((len(textos) + 1, len(self.vocabulario)), dtype=bool)
+        linhas = [linha for linha, lista in enumerate(generos_por_texto) for _ in lista]
+        self.matriz[linhas, [posicao[g] for lista in generos_por_texto for g in lista]] = True
+
+    def __len__(self):
+        return len(self.codigos)
+
+    def _codigos(self, selecao=None):
+        if selecao is None:
+            return self.codigos
+        if isinstance(selecao, np.ndarray) and selecao.dtype == bool:
+            return self.codigos[selecao]
+        posicoes = self.rotulos.get_indexer(selecao)
+        return np.where(posicoes >= 0, self.codigos[posicoes], -1)
+
+    def contem(self, genero, selecao=None):
+        """Máscara dos itens que têm 'genero'."""
+        codigos = self._codigos(selecao)
+        if genero not in self.vocabulario:
+            return np.zeros(len(codigos), dtype=bool)
+        return self.matriz[codigos, self.vocabulario.index(genero)]
+
+    def somar(self, valores=None, selecao=None):
+        """Soma de 'valores' (ou contagem de itens, se None) por gênero, como array alinhado ao vocabulário."""
+        codigos = self._codigos(selecao)
+        validos = codigos >= 0
+        pesos = None if valores is None else np.asarray(valores, dtype=float)[validos]
+        por_texto = np.bincount(codigos[validos], weights=pesos, minlength=len(self.matriz) - 1)
+        return por_texto @ self.matriz[:-1]
+
+    def contagem(self, selecao=None):
+        """Quantidade de itens por gênero, da maior para a menor (empates em ordem alfabética)."""
+        contagem = pd.Series(self.somar(selecao=selecao), index=self.vocabulario, dtype=int)
+        return contagem[contagem > 0].sort_values(ascending=False, kind='stable')
+
+    def maximo(self, valores_por_genero, selecao=None):
+        """Maior valor entre os gêneros de cada item; 0 para itens sem gênero com valor."""
+        valores = np.array([valores_por_genero.get(g, 0) for g in self.vocabulario], dtype=float)
+        maximos_texto = np.where(self.matriz, valores, 0).max(axis=1, initial=0)
+        return maximos_texto[self._codigos(selecao)]
+
+COLUNAS_NUMERICAS_RANKING = ['Duracao', 'Nota_Externa', 'Meu_Hype', 'Ordem_Serie', 'Total_Serie', 'Minha_Nota', 'Progresso_Atual', 'Progresso_Total']
+STATUS_FORA_DO_RANKING = ['Finalizado', 'Arquivado']
+
+# --- Registro de fatores ---
+# Cada fator de peso registra a coluna da sua nota (0-10) e uma ou mais variantes: funções
+# funcao(df_calculo, estoque) -> array que declaram as colunas de EstoqueFatores.df que leem.
+# Variantes 'por_item' dão a nota de cada item só a partir das suas próprias colunas: o estoque as guarda
+# por item e só as recalcula para os itens alterados. As demais dependem do conjunto (máximos, extremos
+# por Tipo, a data de hoje) e são calculadas a cada pontuação.
+# config['variantes_fatores'] escolhe a variante de cada fator ({"Antiguidade": "linear"}); sem escolha vale a padrão.
+FATORES = {}
+VARIANTE_PADRAO = "padrao"
+
+def registrar_fator(nome, coluna, entradas, variante=VARIANTE_PADRAO, por_item=False):
+    """Decorador que registra 'funcao' como a variante 'variante' do fator 'nome'."""
+    def registrar(funcao):
+        fator = FATORES.setdefault(nome, {"coluna": coluna, "variantes": {}})
+        fator["variantes"][variante] = {"funcao": funcao, "entradas": entradas, "por_item": por_item}
+        return funcao
+    return registrar
+
+@registrar_fator("Meu_Hype", "Nota_Hype", ["Meu_Hype"], por_item=True)
+def nota_hype(df, estoque):
+    return df['Meu_Hype'].to_numpy(dtype=float)
+
+@registrar_fator("Nota_Externa", "Nota_Critica", ["Nota_Externa"], por_item=True)
+def nota_critica(df, estoque):
+    return (df['Nota_Externa'] / 10).to_numpy(dtype=float)
+
+@registrar_fator("Afinidade_Genero", "Nota_Afinidade", ["Afinidade_Bruta"])
+def nota_afinidade_genero(df, estoque):
+    nota_afinidade = df['Afinidade_Bruta'].to_numpy(dtype=float)
+    max_afinidade_geral = nota_afinidade.max()
+    return (nota_afinidade / max_afinidade_geral) * 10 if max_afinidade_geral > 0 else nota_afinidade
+
+@registrar_fator("Fator_Continuidade", "Nota_Continuidade", ["Ordem_Serie", "Total_Serie"], por_item=True)
+def nota_continuidade(df, estoque):
+    ordem, total = df['Ordem_Serie'].to_numpy(dtype=float), df['Total_Serie'].to_numpy(dtype=float)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        nota = np.where(total > 1, (ordem - 1) / (total - 1), 0.0)
+    return np.nan_to_num(nota) * 10
+
+@registrar_fator("Progresso", "Nota_Progresso", ["Progresso_Perc"], por_item=True)
+def nota_progresso(df, estoque):
+    return (df['Progresso_Perc'] * 10).to_numpy(dtype=float)
+
+def dias_desde_adicao(datas):
+    """Dias completos (como Timedelta.days) desde cada Data_Adicao até agora; datas nulas valem 0."""
+    datas = datas.to_numpy()
+    with np.errstate(invalid='ignore'):
+        dias = (np.datetime64(datetime.now()) - datas) // np.timedelta64(1, 'D')
+    return np.where(np.isnat(datas), 0, dias).astype(float)
+
+@registrar_fator("Antiguidade", "Nota_Antiguidade", ["Data_Adicao"])
+def nota_antiguidade(df, estoque):
+    dias_no_backlog = dias_desde_adicao(df['Data_Adicao'])
+    # Mesmas faixas de pd.cut(right=True): (-1, 180] -> 0, (180, 365] -> 2.5, ...; abaixo de -1 fica sem nota
+    return NOTAS_ANTIGUIDADE[np.searchsorted(FAIXAS_ANTIGUIDADE_DIAS, dias_no_backlog, side='left')]
+
+@registrar_fator("Antiguidade", "Nota_Antiguidade", ["Data_Adicao"], variante="linear")
+def nota_antiguidade_linear(df, estoque):
+    """Dias na fila proporcionais ao item mais antigo (normalização do antigo ranking_logic)."""
+    dias_na_fila = dias_desde_adicao(df['Data_Adicao'])
+    max_dias = dias_na_fila.max() if dias_na_fila.max() > 0 else 1
+    return (dias_na_fila / max_dias) * 10
+
+@registrar_fator("Duracao", "Nota_Duracao", ["Tipo", "Duracao"])
+def nota_duracao(df, estoque):
+    """Mais curto = maior nota, comparado aos itens do mesmo Tipo; 5 quando o Tipo não tem variação."""
+    duracao = df['Duracao'].to_numpy(dtype=float)
+    duracao_max, duracao_min = estoque.extremos_por_tipo() if df is estoque.df else estoque.extremos_por_tipo(df['Tipo'])
+    with np.errstate(divide='ignore', invalid='ignore'):
+        nota = np.where(duracao_max > duracao_min, (duracao_max - duracao) / (duracao_max - duracao_min) * 10, 5.0)
+    return np.where(np.isnan(nota), 5.0, nota)
+
+@registrar_fator("Duracao", "Nota_Duracao", ["Duracao"], variante="linear")
+def nota_duracao_linear(df, estoque):
+    """Mais curto = maior nota, comparado ao item mais longo de todos (normalização do antigo ranking_logic)."""
+    duracao = df['Duracao'].to_numpy(dtype=float)
+    max_duracao = duracao.max() if duracao.max() > 0 else 1
+    return (1 - (duracao / max_duracao)) * 10
+
+@registrar_fator("Origem", "Nota_Origem", ["Origem"], por_item=True)
+def nota_origem(df, estoque):
+    return mascara_valores(df['Origem'], ['Pago']).astype(float) * 10
+
+# Fator de peso -> coluna com a nota (0-10) do fator, na ordem em que entram na pontuação final
+NOTAS_POR_FATOR = {nome: fator["coluna"] for nome, fator in FATORES.items()}
+
+def calcular_notas(estoque, fatores_ativos, variantes=None):
+    """
+    Notas dos fatores ativos sobre estoque.df, cada uma pela variante escolhida em 'variantes'; as das
+    variantes por item vêm prontas do estoque. Fatores inativos não são calculados; um fator cujas entradas
+    faltam no backlog vale 0.
+    """
+    variantes = variantes or {}
+    df_calculo = estoque.df
+    notas = {}
+    for nome, fator in FATORES.items():
+        if not fatores_ativos.get(nome):
+            continue
+        variante = variantes.get(nome) if variantes.get(nome) in fator["variantes"] else VARIANTE_PADRAO
+        implementacao = fator["variantes"][variante]
+        if all(coluna in df_calculo.columns for coluna in implementacao["entradas"]):
+            if implementacao["por_item"]:
+                notas[fator["coluna"]] = estoque.notas_guardadas(nome, variante)
+            else:
+                notas[fator["coluna"]] = implementacao["funcao"](df_calculo, estoque)
+        else:
+            notas[fator["coluna"]] = np.zeros(len(df_calculo))
+    return notas
+
+def multiplicadores_catchup(nome_serie, ordem_serie, max_ordem_por_serie, valor_bonus):
+    """
+    Multiplicador do bônus de catch-up de cada item: 'valor_bonus' para volumes anteriores ao maior volume
+    finalizado da série (max_ordem_por_serie, indexada pelo nome), 1.0 para os demais.
+    Cada item encontra sua série num único get_indexer, em vez de uma máscara por série.
+    """
+    if max_ordem_por_serie.empty:
+        return np.ones(len(nome_serie))
+    posicoes = max_ordem_por_serie.index.get_indexer(nome_serie)
+    # Posição -1 (série sem volume finalizado) cai no NaN acrescentado ao final e nunca recebe o bônus
+    max_ordem = np.append(max_ordem_por_serie.to_numpy(dtype=float), np.nan)[posicoes]
+    return np.where(np.asarray(ordem_serie, dtype=float) < max_ordem, valor_bonus, 1.0)
+
+def _valores(serie):
+    # Colunas NumPy saem como ndarray: o NumpyExtensionArray de .array refaz o isna das colunas de texto
+    # ao montar o DataFrame (pandas 2.x)
+    return serie.to_numpy() if isinstance(serie.dtype, np.dtype) else serie.array
+
+def _tomar(serie, posicoes):
+    return _valores(serie).take(posicoes)
+
+def valores_numericos(serie):
+    """Coluna como array float; nulos e textos que não são números viram NaN."""
+    return pd.to_numeric(serie, errors='coerce').to_numpy(dtype=float)
+
+def _ampliar(valores, tamanho):
+    ampliado = np.zeros(tamanho, dtype=valores.dtype)
+    ampliado[:len(valores)] = valores
+    return ampliado
+
+def _contar(contadores, chave, valor, sinal):
+    # Contadores {chave: Counter(valor -> quantidade)} sem entradas zeradas, para que max() e min() valham
+    contagem = contadores.setdefault(chave, Counter())
+    contagem[valor] += sinal
+    if contagem[valor] <= 0:
+        del contagem[valor]
+    if not contagem:
+        del contadores[chave]
 
-def calcular_ranking(backlog_df, config, fatores_ativos):
-    """
-    Algoritmo principal do SIB. Calcula a pontuação de cada item.
-    """
-    if backlog_df.empty:
-        return backlog_df
-
-    df = backlog_df.copy()
-    pesos = config.get('pesos', {})
-    
-    # Normalização e cálculos de base
-    df['Data_Adicao'] = pd.to_datetime(df['Data_Adicao'], errors='coerce')
-    hoje = datetime.now()
-    
-    # 1. Antiguidade (Normalizada 0-10)
-    df['Dias_Fila'] = (hoje - df['Data_Adicao']).dt.days.fillna(0)
-    max_dias = df['Dias_Fila'].max() if df['Dias_Fila'].max() > 0 else 1
-    df['Score_Antiguidade'] = (df['Dias_Fila'] / max_dias) * 10
-    
-    # 2. Progresso (Normalizado 0-10)
-    df['Progresso_Total'] = pd.to_numeric(df['Progresso_Total'], errors='coerce').fillna(1)
-    df['Progresso_Atual'] = pd.to_numeric(df['Progresso_Atual'], errors='coerce').fillna(0)
-    df['Progresso_Perc'] = (df['Progresso_Atual'] / df['Progresso_Total']).clip(0, 1)
-    df['Score_Progresso'] = df['Progresso_Perc'] * 10
-    
-    # 3. Duração (Inverso: mais curto = maior pontuação, normalizado 0-10)
-    df['Duracao'] = pd.to_numeric(df['Duracao'], errors='coerce').fillna(0)
-    max_duracao = df['Duracao'].max() if df['Duracao'].max() > 0 else 1
-    df['Score_Duracao'] = (1 - (df['Duracao'] / max_duracao)) * 10
-    
-    # Cálculo da Pontuação Final Ponderada
-    df['Pontuacao_Final'] = 0.0
-    
-    if fatores_ativos.get("Meu_Hype", True):
-        df['Pontuacao_Final'] += df['Meu_Hype'].fillna(0) * pesos.get('Meu_Hype', 0.25)
-    
-    if fatores_ativos.get("Nota_Externa", True):
-        # Nota externa costuma ser 0-100, normalizamos para 0-10
-        df['Pontuacao_Final'] += (df['Nota_Externa'].fillna(0) / 10) * pesos.get('Nota_Externa', 0.15)
+# Colunas de texto guardadas no estoque como códigos por item (-1 para nulos e, em Nome_Serie, para o texto vazio)
+COLUNAS_CODIFICADAS = ['Tipo', 'Nome_Serie', 'Unidade_Duracao', 'Genero']
+
+class EstoqueFatores:
+    """
+    Estado de cada item do backlog e os agregados de que as notas dependem (afinidade por gênero, durações
+    por Tipo, volumes finalizados por série). Cada item ocupa uma posição dos arrays de 'itens', na ordem do
+    backlog (inclusões entram no fim); atualizar_itens só reescreve as posições dos itens alterados e os
+    grupos a que eles pertencem. As notas das variantes por item (ver registrar_fator) ficam guardadas por
+    posição, e pontuar() as combina com as demais num único produto pela lista de pesos.
+    Os contadores de durações e de volumes e o mapa de IDs só são montados na primeira atualização: um
+    estoque usado uma única vez (pontuar_backlog) calcula os extremos direto dos arrays.
+    """
+
+    def __init__(self, backlog_df, versao=None, indice=None, colunas=None):
+        """'colunas' limita self.df às colunas de backlog_df que serão lidas (ver colunas_pontuacao)."""
+        self.versao = versao
+        self.backlog_df = backlog_df
+        self.colunas = colunas
+        # Verificados só quando a atualização item a item é pedida (ver incremental)
+        self._ids = backlog_df['ID'] if 'ID' in backlog_df.columns else None
+        self._incremental = None
+        if indice is None:
+            indice = IndiceGeneros(backlog_df['Genero'])
+        estado = self._estado(backlog_df)
+        self.somas_genero, self.contagens_genero = somar_notas_por_genero(backlog_df, indice, estado['finalizado'])
+        self.afinidades = afinidades_por_genero(self.somas_genero, self.contagens_genero)
+
+        self.n = len(backlog_df)
+        self.itens = {'vivo': np.ones(self.n, dtype=bool), **estado}
+        if self._ids is not None:
+            self.itens['ID'] = self._ids.to_numpy(copy=True)
+        self.valores = {}
+        # Genero já vem codificado pelo índice de gêneros
+        for coluna in (c for c in COLUNAS_CODIFICADAS if c != 'Genero'):
+            codigos, valores = pd.factorize(backlog_df[coluna])
+            self.itens[coluna], self.valores[coluna] = codigos, list(valores)
+        if '' in self.valores['Nome_Serie']:
+            vazio = self.itens['Nome_Serie'] == self.valores['Nome_Serie'].index('')
+            self.itens['Nome_Serie'][vazio] = -1
+        self.itens['Genero'], self.valores['Genero'] = indice.codigos.copy(), list(indice.textos)
+        self.generos_texto = list(indice.generos_por_texto)
+        self.itens['Afinidade_Bruta'] = indice.maximo(self.afinidades)
+        self.notas_item = {}
+
+        abertos = np.flatnonzero(self.itens['aberto'])
+        # Posições no estoque e em backlog_df dos itens de self.df (as mesmas até a primeira atualização)
+        self._ordem = (abertos, abertos)
+        self._df = self._preparar(backlog_df, abertos, self.itens['Afinidade_Bruta'][abertos], self._colunas_df())
+        self.duracoes_tipo = self.ordens_series = self._posicao_id = self._codigos = None
+        self._extremos_tipo = self._maximos_serie = None
+        self._tipos_alterados, self._series_alteradas = set(), set()
+
+    @staticmethod
+    def _estado(df, posicoes=None):
+        """Arrays por item das linhas 'posicoes' de df (padrão: todas) com as colunas lidas pelos agregados e pelo custo em PL."""
+        def coluna(nome):
+            return df[nome] if posicoes is None else pd.Series(_tomar(df[nome], posicoes), copy=False)
+        status = coluna('Status')
+        finalizado = mascara_valores(status, ['Finalizado'])
+        duracao = valores_numericos(coluna('Duracao'))
+        return {
+            'finalizado': finalizado,
+            'aberto': ~(finalizado | mascara_valores(status, [st for st in STATUS_FORA_DO_RANKING if st != 'Finalizado'])),
+            'desejo': mascara_valores(status, ['Desejo']),
+            # Duração nula vale 0, como em como_numerico; volume e nota nulos ficam fora dos agregados
+            'Duracao': np.where(np.isnan(duracao), 0.0, duracao),
+            'Ordem_Serie': valores_numericos(coluna('Ordem_Serie')),
+            'Minha_Nota': valores_numericos(coluna('Minha_Nota')),
+        }
+
+    @property
+    def incremental(self):
+        """A atualização item a item localiza os itens pelo ID; com IDs repetidos o estoque é reconstruído."""
+        if self._incremental is None:
+            self._incremental = self._ids is not None and self._ids.is_unique
+            self._ids = None
+        return self._incremental
+
+    def _colunas_df(self):
+        colunas = self.backlog_df.columns
+        return colunas if self.colunas is None else [c for c in colunas if c in self.colunas]
+
+    def _ordem_itens(self):
+        """(posições no estoque, posições em backlog_df) dos itens não concluídos, na ordem do backlog."""
+        if self._ordem is None:
+            ids_backlog = self.backlog_df['ID'].to_numpy()
+            if len(ids_backlog) == self.n and (self.itens['ID'][:self.n] == ids_backlog).all():
+                # Nenhum item excluído e a ordem do backlog mantida (o caso comum)
+                abertos = np.flatnonzero(self.itens['aberto'][:self.n])
+                self._ordem = (abertos, abertos)
+                return self._ordem
+            vivos = np.flatnonzero(self.itens['vivo'][:self.n])
+            ids = self.itens['ID'][vivos]
+            if len(ids) == len(ids_backlog) and (ids == ids_backlog).all():
+                posicoes = np.arange(len(vivos))
+            else:
+                # Backlog reordenado: cada item é localizado pelo ID
+                posicoes = pd.Index(ids_backlog).get_indexer(ids)
+                ordem = np.argsort(posicoes, kind='stable')
+                vivos, posicoes = vivos[ordem], posicoes[ordem]
+            abertos = self.itens['aberto'][vivos]
+            self._ordem = (vivos[abertos], posicoes[abertos])
+        return self._ordem
+
+    @property
+    def posicoes_origem(self):
+        """Posição em backlog_df de cada linha de self.df."""
+        return self._ordem_itens()[1]
+
+    @property
+    def df(self):
+        """Itens não concluídos já convertidos, com os rótulos de backlog_df; remontado após cada atualização."""
+        if self._df is None:
+            slots, posicoes = self._ordem_itens()
+            self._df = self._preparar(self.backlog_df, posicoes, self.itens['Afinidade_Bruta'][slots], self._colunas_df())
+        return self._df
+
+    @staticmethod
+    def _preparar(df, posicoes, afinidade_bruta, colunas=None):
+        """
+        DataFrame novo com as linhas 'posicoes' de df (e só as 'colunas', se informadas), as colunas numéricas e
+        Data_Adicao convertidas e Progresso_Perc e Afinidade_Bruta acrescentadas, montado de uma só vez.
+        """
+        colunas = {c: _tomar(df[c], posicoes) for c in (df.columns if colunas is None else colunas)}
+        for c in COLUNAS_NUMERICAS_RANKING:
+            colunas[c] = _valores(_numerico(pd.Series(colunas[c], copy=False)))
+        colunas['Data_Adicao'] = _valores(como_data(pd.Series(colunas['Data_Adicao'], copy=False)))
+        progresso_total = np.asarray(colunas['Progresso_Total'], dtype=float)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            progresso = np.where(progresso_total > 0, np.asarray(colunas['Progresso_Atual'], dtype=float) / progresso_total, 0.0)
+        colunas['Progresso_Perc'] = progresso
+        colunas['Afinidade_Bruta'] = afinidade_bruta
+        return pd.DataFrame(colunas, index=df.index[posicoes], copy=False)
+
+    def _montar_contadores(self):
+        """Contadores de durações por Tipo e de volumes finalizados por série e os mapas de IDs e de códigos, usados pela atualização item a item."""
+        itens, n = self.itens, self.n
+        self.duracoes_tipo, self.ordens_series = {}, {}
+        abertos = itens['aberto'][:n] & (itens['Tipo'][:n] >= 0)
+        for (tipo, duracao), quantidade in pd.Series(itens['Duracao'][:n][abertos]).groupby(itens['Tipo'][:n][abertos]).value_counts().items():
+            self.duracoes_tipo.setdefault(tipo, Counter())[duracao] = quantidade
+        ordens = itens['Ordem_Serie'][:n]
+        volumes = itens['finalizado'][:n] & (itens['Nome_Serie'][:n] >= 0) & ~np.isnan(ordens)
+        for (serie, ordem), quantidade in pd.Series(ordens[volumes]).groupby(itens['Nome_Serie'][:n][volumes]).value_counts().items():
+            self.ordens_series.setdefault(serie, Counter())[ordem] = quantidade
+        self._posicao_id = dict(zip(itens['ID'][:n].tolist(), range(n)))
+        self._codigos = {coluna: {valor: codigo for codigo, valor in enumerate(valores)} for coluna, valores in self.valores.items()}
+
+    def _codigo(self, coluna, valor):
+        """Código de 'valor' na coluna; valores novos entram no fim de self.valores[coluna]."""
+        if pd.isna(valor) or (coluna == 'Nome_Serie' and valor == ''):
+            return -1
+        codigos = self._codigos[coluna]
+        if valor not in codigos:
+            codigos[valor] = len(self.valores[coluna])
+            self.valores[coluna].append(valor)
+            if coluna == 'Genero':
+                self.generos_texto.append(_generos_do_texto(valor) if isinstance(valor, str) else ())
+        return codigos[valor]
+
+    def _novo_item(self, id_item):
+        """Posição de um item incluído no backlog, depois de todas as atuais."""
+        if self.n == len(self.itens['vivo']):
+            capacidade = max(2 * self.n, 16)
+            self.itens = {nome: _ampliar(valores, capacidade) for nome, valores in self.itens.items()}
+            self.notas_item = {chave: _ampliar(notas, capacidade) for chave, notas in self.notas_item.items()}
+        posicao = self.n
+        self.n += 1
+        self.itens['ID'][posicao] = id_item
+        self._posicao_id[id_item] = posicao
+        return posicao
+
+    def _contar_item(self, posicao, sinal):
+        """Soma (sinal 1) ou retira (sinal -1) dos agregados a contribuição do item em 'posicao'."""
+        itens = self.itens
+        if itens['finalizado'][posicao]:
+            nota = itens['Minha_Nota'][posicao]
+            if nota >= 7 and itens['Genero'][posicao] >= 0:
+                for g in self.generos_texto[itens['Genero'][posicao]]:
+                    self.somas_genero[g] = self.somas_genero.get(g, 0.0) + sinal * nota
+                    self.contagens_genero[g] = self.contagens_genero.get(g, 0) + sinal
+                    if self.contagens_genero[g] <= 0:
+                        del self.somas_genero[g], self.contagens_genero[g]
+            serie, ordem = itens['Nome_Serie'][posicao], itens['Ordem_Serie'][posicao]
+            if serie >= 0 and not np.isnan(ordem):
+                _contar(self.ordens_series, serie, ordem, sinal)
+                self._series_alteradas.add(serie)
+        elif itens['aberto'][posicao] and itens['Tipo'][posicao] >= 0:
+            _contar(self.duracoes_tipo, itens['Tipo'][posicao], itens['Duracao'][posicao], sinal)
+            self._tipos_alterados.add(itens['Tipo'][posicao])
+
+    def _afinidades_textos(self, codigos):
+        """Maior afinidade entre os gêneros de cada texto de 'Genero' (0 para nulos e textos sem afinidade)."""
+        return np.array([max([self.afinidades.get(g, 0) for g in self.generos_texto[c]], default=0) if c >= 0 else 0 for c in codigos], dtype=float)
+
+    def atualizar_itens(self, backlog_df, ids):
+        """Reflete a inclusão, edição, finalização ou exclusão dos itens 'ids', já aplicada em backlog_df."""
+        ids = list(ids)
+        if self.duracoes_tipo is None:
+            self._montar_contadores()
+        # Retira a contribuição do estado anterior dos itens...
+        antigos = [self._posicao_id[i] for i in ids if i in self._posicao_id]
+        for posicao in antigos:
+            self._contar_item(posicao, -1)
+        for nome in ('vivo', 'aberto', 'finalizado'):
+            self.itens[nome][antigos] = False
+
+        # ...e grava e soma a do estado atual. Itens excluídos do backlog perdem a posição.
+        linhas = np.flatnonzero(mascara_valores(backlog_df['ID'], ids))
+        posicoes = np.array([self._posicao_id[i] if i in self._posicao_id else self._novo_item(i) for i in _tomar(backlog_df['ID'], linhas)], dtype=np.intp)
+        self.itens['vivo'][posicoes] = True
+        for nome, valores in self._estado(backlog_df, linhas).items():
+            self.itens[nome][posicoes] = valores
+        for coluna in COLUNAS_CODIFICADAS:
+            self.itens[coluna][posicoes] = [self._codigo(coluna, valor) for valor in _tomar(backlog_df[coluna], linhas)]
+        for posicao in posicoes:
+            self._contar_item(posicao, 1)
+        for posicao in set(antigos).difference(posicoes.tolist()):
+            del self._posicao_id[self.itens['ID'][posicao]]
+
+        afinidades = afinidades_por_genero(self.somas_genero, self.contagens_genero)
+        if afinidades != self.afinidades:
+            # A afinidade de algum gênero mudou: a nota bruta é refeita por texto e repassada a todos os itens
+            self.afinidades = afinidades
+            por_texto = np.append(self._afinidades_textos(range(len(self.generos_texto))), 0.0)
+            self.itens['Afinidade_Bruta'][:self.n] = por_texto[self.itens['Genero'][:self.n]]
+        else:
+            self.itens['Afinidade_Bruta'][posicoes] = self._afinidades_textos(self.itens['Genero'][posicoes])
+
+        self.backlog_df = backlog_df
+        self._ordem = self._df = None
+        abertos = np.flatnonzero(self.itens['aberto'][posicoes])
+        if self.notas_item and len(abertos):
+            lidas = colunas_pontuacao() | {'ID', 'Genero'}
+            df_abertos = self._preparar(backlog_df, linhas[abertos], self.itens['Afinidade_Bruta'][posicoes[abertos]], [c for c in backlog_df.columns if c in lidas])
+            for (nome, variante), notas in self.notas_item.items():
+                notas[posicoes[abertos]] = FATORES[nome]["variantes"][variante]["funcao"](df_abertos, self)
+
+    def notas_guardadas(self, nome, variante=VARIANTE_PADRAO):
+        """Notas da variante por item 'variante' do fator 'nome' para os itens de self.df, calculadas uma única vez por item."""
+        slots = self._ordem_itens()[0]
+        if (nome, variante) not in self.notas_item:
+            notas = np.zeros(len(self.itens['vivo']))
+            notas[slots] = FATORES[nome]["variantes"][variante]["funcao"](self.df, self)
+            self.notas_item[(nome, variante)] = notas
+        return self.notas_item[(nome, variante)][slots]
+
+    def _extremos_por_codigo(self):
+        """(maiores, menores) durações dos itens não concluídos de cada Tipo, alinhadas a self.valores['Tipo']."""
+        n_tipos = len(self.valores['Tipo'])
+        if self._extremos_tipo is None:
+            slots = self._ordem_itens()[0]
+            codigos, duracao = self.itens['Tipo'][slots], self.itens['Duracao'][slots]
+            validos = codigos >= 0
+            maximos, minimos = np.full(n_tipos, np.nan), np.full(n_tipos, np.nan)
+            np.fmax.at(maximos, codigos[validos], duracao[validos])
+            np.fmin.at(minimos, codigos[validos], duracao[validos])
+            self._extremos_tipo = (maximos, minimos)
+        elif self._tipos_alterados or len(self._extremos_tipo[0]) < n_tipos:
+            maximos, minimos = (np.append(extremos, np.full(n_tipos - len(extremos), np.nan)) for extremos in self._extremos_tipo)
+            for tipo in self._tipos_alterados:
+                duracoes = self.duracoes_tipo.get(tipo)
+                maximos[tipo], minimos[tipo] = (max(duracoes), min(duracoes)) if duracoes else (np.nan, np.nan)
+            self._extremos_tipo = (maximos, minimos)
+        self._tipos_alterados.clear()
+        return self._extremos_tipo
+
+    def extremos_por_tipo(self, tipos=None):
+        """Arrays com a maior e a menor duração do Tipo de cada item de 'tipos' (padrão: os do estoque; NaN para Tipo nulo)."""
+        maximos, minimos = self._extremos_por_codigo()
+        if tipos is None:
+            codigos = self.itens['Tipo'][self._ordem_itens()[0]]
+        else:
+            codigos_tipos, valores = pd.factorize(tipos)
+            posicao = {valor: codigo for codigo, valor in enumerate(self.valores['Tipo'])}
+            codigos = np.array([posicao.get(valor, -1) for valor in valores] + [-1], dtype=np.intp)[codigos_tipos]
+        return np.append(maximos, np.nan)[codigos], np.append(minimos, np.nan)[codigos]
+
+    def _maximos_por_serie(self):
+        """Maior Ordem_Serie finalizada de cada série, alinhada a self.valores['Nome_Serie'] (NaN sem volume finalizado)."""
+        n_series = len(self.valores['Nome_Serie'])
+        if self._maximos_serie is None:
+            codigos, ordens = self.itens['Nome_Serie'][:self.n], self.itens['Ordem_Serie'][:self.n]
+            validos = self.itens['finalizado'][:self.n] & (codigos >= 0) & ~np.isnan(ordens)
+            self._maximos_serie = np.full(n_series, np.nan)
+            np.fmax.at(self._maximos_serie, codigos[validos], ordens[validos])
+        elif self._series_alteradas or len(self._maximos_serie) < n_series:
+            self._maximos_serie = np.append(self._maximos_serie, np.full(n_series - len(self._maximos_serie), np.nan))
+            for serie in self._series_alteradas:
+                ordens = self.ordens_series.get(serie)
+                self._maximos_serie[serie] = max(ordens) if ordens else np.nan
+        self._series_alteradas.clear()
+        return self._maximos_serie
+
+    def series_finalizadas(self):
+        """Maior Ordem_Serie finalizada de cada série, como Series indexada pelo nome da série."""
+        maximos = self._maximos_por_serie()
+        validas = np.flatnonzero(~np.isnan(maximos))
+        return pd.Series(maximos[validas], index=pd.Index([self.valores['Nome_Serie'][i] for i in validas], dtype=object), dtype=float)
+
+    def pontuacoes(self, config, fatores_ativos=None):
+        """
+        Arrays de pontuar() alinhados a self.df: (notas por coluna, pontuação final, multiplicador do bônus,
+        custo em PL). None quando nenhum fator ativo tem peso.
+        """
+        df_calculo = self.df
+        slots = self._ordem_itens()[0]
+        if fatores_ativos is None:
+            fatores_ativos = FATORES_PADRAO
+
+        # A lógica de rebalanceamento de pesos não inclui o bônus, pois ele é um multiplicador.
+        pesos_originais = config['pesos']
+        pesos_ativos = {fator: peso for fator, peso in pesos_originais.items() if fatores_ativos.get(fator, False)}
         
-    if fatores_ativos.get("Antiguidade", True):
-        df['Pontuacao_Final'] += df['Score_Antiguidade'] * pesos.get('Antiguidade', 0.10)
+        soma_pesos_ativos = sum(pesos_ativos.values())
         
-    if fatores_ativos.get("Progresso", True):
-        df['Pontuacao_Final'] += df['Score_Progresso'] * pesos.get('Progresso', 0.15)
+        pesos_rebalanceados = pesos_ativos.copy()
+        if soma_pesos_ativos > 0:
+            for fator, peso in pesos_rebalanceados.items():
+                pesos_rebalanceados[fator] = peso / soma_pesos_ativos
+        else:
+            return None
+
+        # --- CÁLCULO DINÂMICO DA PONTUAÇÃO FINAL ---
+        # Só os fatores ativos são calculados; as notas (itens x fatores, na ordem do registro) são combinadas
+        # num único produto pelo vetor de pesos
+        notas = calcular_notas(self, fatores_ativos, config.get('variantes_fatores'))
+        ativos = [fator for fator in FATORES if fatores_ativos.get(fator)]
+        matriz = np.empty((len(df_calculo), len(ativos)), order='F')
+        for j, fator in enumerate(ativos):
+            matriz[:, j] = notas[FATORES[fator]['coluna']]
+        pontuacao = matriz @ np.array([pesos_rebalanceados.get(fator, 0) for fator in ativos], dtype=float)
         
-    if fatores_ativos.get("Duracao", True):
-        df['Pontuacao_Final'] += df['Score_Duracao'] * pesos.get('Duracao', 0.10)
+        # --- ALTERAÇÃO AQUI: Bônus agora é condicional ---
+        # O multiplicador fica numa coluna própria para que avaliar_pesos possa reaplicá-lo. Mesma regra de
+        # multiplicadores_catchup, com a série de cada item localizada pelo seu código.
+        if fatores_ativos.get("Bonus_Catchup") and config.get("bonus_catchup_ativo", False):
+            max_ordem = np.append(self._maximos_por_serie(), np.nan)[self.itens['Nome_Serie'][slots]]
+            ordem_serie = df_calculo['Ordem_Serie'].to_numpy(dtype=float)
+            multiplicador = np.where(ordem_serie < max_ordem, config.get("bonus_catchup_valor", 1.5), 1.0)
+        else:
+            multiplicador = np.ones(len(df_calculo))
+        pontuacao *= multiplicador
+
+        # Custo em PL: só para itens desejados com duração; conversor ausente vale 1 e conversor <= 0 zera o custo
+        duracao = self.itens['Duracao'][slots]
+        desejados = np.flatnonzero(self.itens['desejo'][slots] & (duracao > 0))
+        conversores_unidade = [config['conversores_pl'].get(unidade, 1) for unidade in self.valores['Unidade_Duracao']]
+        conversores = np.array(conversores_unidade + [1], dtype=float)[self.itens['Unidade_Duracao'][slots[desejados]]]
+        custo_pl = np.zeros_like(duracao)
+        cobra_custo = conversores > 0
+        custo_pl[desejados[cobra_custo]] = np.ceil(duracao[desejados[cobra_custo]] / conversores[cobra_custo])
+        return notas, pontuacao, multiplicador, custo_pl
+
+    def pontuar(self, config, fatores_ativos=None):
+        """
+        Equivalente a pontuar_backlog sobre o backlog refletido no estoque. Não altera o estoque; o DataFrame
+        devolvido usa as colunas de self.df sem copiá-las e não deve ser alterado.
+        """
+        df_calculo = self.df
+        if df_calculo.empty:
+            return df_calculo.assign(Pontuacao_Final=pd.Series(dtype='float'), Custo_PL=pd.Series(dtype='float'), Progresso_Perc=pd.Series(dtype='float'))
+        calculo = self.pontuacoes(config, fatores_ativos)
+        if calculo is None:
+            return df_calculo.assign(Pontuacao_Final=0, Custo_PL=0, Progresso_Perc=0)
+        notas, pontuacao, multiplicador, custo_pl = calculo
+        colunas = {c: _valores(df_calculo[c]) for c in df_calculo.columns}
+        colunas.update(notas, Pontuacao_Final=pontuacao, Multiplicador_Bonus=multiplicador, Custo_PL=custo_pl)
+        return pd.DataFrame(colunas, index=df_calculo.index, copy=False)
+
+def pontuar_backlog(df, config, fatores_ativos=None):
+    """Calcula as notas e a pontuação final dos itens ainda não concluídos, sem ordenar."""
+    if df.empty: return df.assign(Pontuacao_Final=0, Custo_PL=0, Progresso_Perc=0)
+    return EstoqueFatores(df).pontuar(config, fatores_ativos)
+
+def indices_top_k(pontuacoes, k):
+    """
+    Posições das k maiores pontuações, da maior para a menor, sem ordenar o array inteiro.
+    Empates mantêm a ordem original e pontuações nulas ficam por último (como no sort estável).
+    """
+    n = len(pontuacoes)
+    k = max(0, min(k, n))
+    if k == 0:
+        return np.empty(0, dtype=np.intp)
+    chave = np.nan_to_num(np.asarray(pontuacoes, dtype=float), nan=-np.inf)
+    if k < n:
+        # Tudo acima da k-ésima maior pontuação mais os empatados com ela, para desempatar pela posição
+        limiar = chave[np.argpartition(chave, n - k)[n - k]]
+        candidatos = np.flatnonzero(chave >= limiar)
+    else:
+        candidatos = np.arange(n)
+    # O quicksort é bem mais rápido que o sort estável; os empates (raros) são desfeitos depois pela posição,
+    # ordenando uma chave inteira única (grupo de pontuação, posição)
+    candidatos = candidatos[np.argsort(-chave[candidatos])]
+    ordenadas = chave[candidatos]
+    empates = ordenadas[1:] == ordenadas[:-1]
+    if empates.any():
+        grupos = np.concatenate(([0], np.cumsum(~empates)))
+        candidatos = candidatos[np.argsort(grupos * n + candidatos)]
+    return candidatos[:k]
+
+def ordenar_ranking(df_pontuado, k=None):
+    """Ordena por Pontuacao_Final (decrescente). Com 'k', devolve só os k primeiros sem ordenar o restante."""
+    if k is None:
+        k = len(df_pontuado)
+    if df_pontuado.empty:
+        return df_pontuado.reset_index(drop=True)
+    return df_pontuado.iloc[indices_top_k(df_pontuado['Pontuacao_Final'].to_numpy(dtype=float), k)].reset_index(drop=True)
+
+def colunas_pontuacao():
+    """Colunas do backlog lidas pelas notas dos fatores registrados, pelo bônus de catch-up e pelo custo em PL."""
+    entradas = {coluna for fator in FATORES.values() for variante in fator["variantes"].values() for coluna in variante["entradas"]}
+    return set(COLUNAS_NUMERICAS_RANKING) | {'Status', 'Tipo', 'Unidade_Duracao', 'Data_Adicao', 'Nome_Serie'} | entradas
+
+def _ranking_ordenado(df, config, fatores_ativos, k=None):
+    """
+    Mesmo resultado de ordenar_ranking(pontuar_backlog(df, ...), k) sem montar o DataFrame pontuado.
+    O estoque, usado uma única vez, recebe só as colunas lidas na pontuação (o índice de gêneros é montado à
+    parte), e o ranking é montado coluna a coluna, já na ordem final: as colunas convertidas e as calculadas
+    vêm do estoque, as demais direto de df. Retorna (ranking, total de itens ranqueados).
+    """
+    lidas = colunas_pontuacao()
+    estoque = EstoqueFatores(df, indice=IndiceGeneros(df['Genero']), colunas=lidas)
+    calculo = estoque.pontuacoes(config, fatores_ativos) if not estoque.df.empty else None
+    if calculo is None:
+        df_pontuado = pontuar_backlog(df, config, fatores_ativos)
+        return ordenar_ranking(df_pontuado, k), len(df_pontuado)
+    notas, pontuacao, multiplicador, custo_pl = calculo
+    total = len(estoque.df)
+    ordem = indices_top_k(pontuacao, total if k is None else k)
+    linhas = estoque.posicoes_origem[ordem]
+
+    colunas = {}
+    for coluna in df.columns.union(estoque.df.columns, sort=False):
+        if coluna in estoque.df.columns and (coluna not in df.columns or coluna in COLUNAS_NUMERICAS_RANKING or coluna == 'Data_Adicao'):
+            colunas[coluna] = _tomar(estoque.df[coluna], ordem)
+        else:
+            colunas[coluna] = _tomar(df[coluna], linhas)
+    for coluna, valores in (*notas.items(), ('Pontuacao_Final', pontuacao), ('Multiplicador_Bonus', multiplicador), ('Custo_PL', custo_pl)):
+        colunas[coluna] = valores[ordem]
+    return pd.DataFrame(colunas, copy=False), total
+
+def calcular_ranking(df, config, fatores_ativos=None):
+    """Ranking completo: todos os itens não concluídos, do maior para o menor."""
+    return _ranking_ordenado(df, config, fatores_ativos)[0]
 
-    # Ordenar pelo Ranking
-    return df.sort_values(by='Pontuacao_Final', ascending=False)
+def calcular_ranking_top_k(df, config, fatores_ativos, k):
+    """Retorna (primeiros k itens do ranking, total de itens ranqueados)."""
+    return _ranking_ordenado(df, config, fatores_ativos, k)
+
+def somar_notas_por_genero(backlog_df, indice=None, finalizados=None):
+    """
+    Soma e contagem das notas pessoais >= 7 dos itens finalizados, por gênero. 'indice' é o IndiceGeneros de
+    backlog_df e 'finalizados', se informada, a máscara de Status == 'Finalizado' já calculada.
+    """
+    if indice is None:
+        indice = IndiceGeneros(backlog_df['Genero'])
+    if finalizados is None:
+        finalizados = (backlog_df['Status'] == 'Finalizado').to_numpy(dtype=bool)
+    # Notas nulas (NaN) nunca passam do filtro
+    notas = backlog_df['Minha_Nota'].to_numpy(dtype=float)
+    filtro = finalizados & (notas >= 7)
+    if not filtro.any():
+        return {}, {}
+    somas = indice.somar(notas[filtro], filtro)
+    contagens = indice.somar(selecao=filtro)
+    presentes = np.flatnonzero(contagens)
+    return (
+        {indice.vocabulario[i]: float(somas[i]) for i in presentes},
+        {indice.vocabulario[i]: int(contagens[i]) for i in presentes},
+    )
+
+def afinidades_por_genero(somas, contagens):
+    """Pontuação de afinidade de cada gênero a partir de somar_notas_por_genero."""
+    if not somas:
+        return {}
+
+    # Calcula a pontuação de afinidade
+    # Fórmula: (Nota Média - Limiar) * Contagem
+    limiar_nota = 7.0
+    generos = sorted(somas)
+    contagem = np.array([contagens[g] for g in generos])
+    media = np.array([somas[g] for g in generos]) / contagem
+    pontuacao = (media - limiar_nota) * contagem
+
+    # Filtra apenas gêneros com afinidade positiva e retorna como dicionário
+    return {genero: valor for genero, valor in zip(generos, pontuacao) if valor > 0}
+
+def calcular_afinidade_genero(backlog_df, indice=None):
+    """
+    Calcula a pontuação de afinidade para cada gênero com base nas notas de itens finalizados.
+    Considera apenas itens com nota pessoal >= 7.
+    """
+    return afinidades_por_genero(*somar_notas_por_genero(backlog_df, indice))
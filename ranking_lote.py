@@ -0,0 +1,109 @@
+# SIB - Ranking em lote (sem Streamlit)
+# Calcula o ranking de todas as contas num pool de processos e grava o Top N de cada uma em
+# rankings_precalculados, para o app mostrar um ranking pronto no primeiro carregamento.
+# A assinatura gravada inclui o dia, então o job deve rodar depois da meia-noite (ex: cron às 03:00).
+# Uso: python ranking_lote.py [--top 100] [--processos 4]
+import argparse
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+
+import pandas as pd
+
+from db_connection import criar_cliente_servico, iterar_tabela_completa_db, salvar_rankings_precalculados_db
+from ranking_logic import FATORES_PADRAO, pontuar_backlog, ordenar_ranking
+from sib_web import (
+    TABELA_BACKLOG, TABELA_CONFIG, COLUNAS_ESPERADAS_BACKLOG,
+    normalizar_tabela, obter_config_padrao, assinatura_ranking,
+)
+
+TOP_N_PADRAO = 100
+
+def carregar_backlogs(supabase):
+    """Lê backlog_items de todas as contas. Retorna {user_id: DataFrame com as linhas cruas do usuário}."""
+    paginas = list(iterar_tabela_completa_db(supabase, TABELA_BACKLOG))
+    if not paginas:
+        return {}
+    df = pd.concat(paginas, ignore_index=True)
+    return {user_id: grupo.reset_index(drop=True) for user_id, grupo in df.groupby('user_id', sort=False)}
+
+def carregar_configs(supabase):
+    """Lê user_configs de todas as contas. Retorna {user_id: config}."""
+    configs = {}
+    for pagina in iterar_tabela_completa_db(supabase, TABELA_CONFIG):
+        for registro in pagina.to_dict(orient='records'):
+            if isinstance(registro.get('config_data'), dict):
+                configs[registro['user_id']] = registro['config_data']
+    return configs
+
+def calcular_top_n_usuario(tarefa):
+    """Executado nos processos do pool: normaliza o backlog como o app, pontua e devolve a linha a gravar."""
+    user_id, df_bruto, config, top_n = tarefa
+    config = {**obter_config_padrao(), **(config or {})}
+    backlog_df = normalizar_tabela(df_bruto, TABELA_BACKLOG, COLUNAS_ESPERADAS_BACKLOG)
+    df_pontuado = pontuar_backlog(backlog_df, config, FATORES_PADRAO)
+    df_top = ordenar_ranking(df_pontuado, top_n)
+    itens = [
+        {"id": item_id, "pontuacao": pontuacao, "progresso": progresso, "custo_pl": custo}
+        for item_id, pontuacao, progresso, custo in zip(
+            df_top['ID'].tolist(),
+            df_top['Pontuacao_Final'].astype(float).tolist(),
+            df_top['Progresso_Perc'].astype(float).tolist(),
+            df_top['Custo_PL'].astype(float).tolist(),
+        )
+    ]
+    return {
+        "user_id": user_id,
+        "assinatura": assinatura_ranking(backlog_df, config, FATORES_PADRAO),
+        "total_itens": len(df_pontuado),
+        "itens": itens,
+        "calculado_em": datetime.now().isoformat(),
+    }
+
+def executar_lote(top_n=TOP_N_PADRAO, processos=None):
+    """Calcula e grava o ranking de todas as contas. Retorna um resumo da execução."""
+    inicio = time.perf_counter()
+    supabase = criar_cliente_servico()
+    backlogs = carregar_backlogs(supabase)
+    configs = carregar_configs(supabase)
+    tempo_leitura = time.perf_counter() - inicio
+
+    tarefas = [(user_id, df, configs.get(user_id), top_n) for user_id, df in backlogs.items()]
+    registros, erros = [], []
+    with ProcessPoolExecutor(max_workers=processos or os.cpu_count()) as executor:
+        # submit individual por usuário para que uma conta com dados inválidos não derrube as demais
+        futuros = {executor.submit(calcular_top_n_usuario, tarefa): tarefa[0] for tarefa in tarefas}
+        for futuro, user_id in futuros.items():
+            try:
+                registros.append(futuro.result())
+            except Exception as e:
+                erros.append({"user_id": user_id, "erro": str(e)})
+    tempo_calculo = time.perf_counter() - inicio - tempo_leitura
+
+    resultado_escrita = salvar_rankings_precalculados_db(supabase, registros) if registros else {"enviados": 0, "falhas": []}
+    return {
+        "usuarios": len(tarefas),
+        "gravados": resultado_escrita["enviados"],
+        "erros_calculo": erros,
+        "falhas_escrita": resultado_escrita["falhas"],
+        "tempo_leitura": tempo_leitura,
+        "tempo_calculo": tempo_calculo,
+        "tempo_total": time.perf_counter() - inicio,
+    }
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Pré-calcula o ranking de todas as contas do SIB.")
+    parser.add_argument("--top", type=int, default=TOP_N_PADRAO, help="Itens gravados por usuário.")
+    parser.add_argument("--processos", type=int, default=None, help="Processos do pool (padrão: número de CPUs).")
+    args = parser.parse_args()
+
+    resumo = executar_lote(top_n=args.top, processos=args.processos)
+    print(
+        f"{resumo['gravados']}/{resumo['usuarios']} rankings gravados em {resumo['tempo_total']:.1f}s "
+        f"(leitura {resumo['tempo_leitura']:.1f}s, cálculo {resumo['tempo_calculo']:.1f}s)"
+    )
+    for erro in resumo['erros_calculo']:
+        print(f"Erro ao calcular {erro['user_id']}: {erro['erro']}")
+    for falha in resumo['falhas_escrita']:
+        print(f"Falha ao gravar {falha['chave']}: {falha['erro']}")
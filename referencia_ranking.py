@@ -0,0 +1,284 @@
+# SIB - Dados de referência para o ranking
+# Backlogs sintéticos, configurações e as implementações de ranking anteriores ao motor de ranking_logic,
+# compartilhados por benchmark_sib.py e pelos testes de paridade. As implementações antigas estão copiadas
+# sem alterações (só o nome das funções de ranking muda) e servem de oráculo.
+import numpy as np
+import pandas as pd
+from datetime import datetime, timedelta
+
+TIPOS = ["Jogo", "Livro", "Série", "Filme", "Anime", "Mangá"]
+STATUS = ["No Backlog", "Em Andamento", "Finalizado", "Desejo", "Arquivado"]
+GENEROS = ["Ação", "RPG", "Aventura", "Drama", "Comédia", "Terror", "Fantasia", "Ficção Científica", "Romance", "Mistério"]
+UNIDADES = {"Jogo": "Horas", "Livro": "Páginas", "Série": "Episódios", "Filme": "Minutos", "Anime": "Episódios", "Mangá": "Edições"}
+
+def gerar_backlog_sintetico(n_itens, seed=42):
+    """Gera um backlog com as colunas de COLUNAS_ESPERADAS_BACKLOG e distribuições plausíveis."""
+    rng = np.random.default_rng(seed)
+    tipos = rng.choice(TIPOS, n_itens)
+    status = rng.choice(STATUS, n_itens, p=[0.35, 0.1, 0.35, 0.15, 0.05])
+    hoje = datetime(2026, 1, 1)
+    data_adicao = [hoje - timedelta(days=int(d)) for d in rng.integers(0, 1500, n_itens)]
+    generos = [", ".join(rng.choice(GENEROS, rng.integers(1, 4), replace=False)) for _ in range(n_itens)]
+    finalizado = status == "Finalizado"
+    progresso_total = rng.integers(0, 100, n_itens)
+    return pd.DataFrame({
+        "ID": np.arange(1, n_itens + 1),
+        "Titulo": [f"Item {i}" for i in range(1, n_itens + 1)],
+        "Tipo": tipos,
+        "Plataforma": rng.choice(["PC", "PS5", "Switch", "Kindle", "Netflix", ""], n_itens),
+        "Autor": rng.choice([f"Autor {i}" for i in range(200)], n_itens),
+        "Genero": generos,
+        "Status": status,
+        "Meu_Hype": rng.integers(0, 11, n_itens),
+        "Nota_Externa": rng.integers(0, 101, n_itens),
+        "Duracao": rng.integers(0, 200, n_itens).astype(float),
+        "Unidade_Duracao": [UNIDADES[t] for t in tipos],
+        "Nome_Serie": "",
+        "Ordem_Serie": 1,
+        "Total_Serie": 1,
+        "Data_Adicao": [d.strftime("%Y-%m-%d") for d in data_adicao],
+        "Progresso_Atual": (rng.random(n_itens) * (progresso_total + 1)).astype(int),
+        "Progresso_Total": progresso_total,
+        "Minha_Nota": np.where(finalizado, rng.integers(1, 11, n_itens), 0),
+        "Cover_URL": [f"https://images.example.com/{i}.jpg" for i in range(n_itens)],
+        "Data_Finalizacao": pd.to_datetime(np.where(finalizado, "2025-06-01", None)),
+        "Tempo_Final": 0,
+        "Origem": rng.choice(["Pago", "Grátis"], n_itens),
+    })
+
+def gerar_backlog_series(n_series, volumes_por_serie=20, seed=42):
+    """Backlog de séries com volumes (como os adicionados pelo modo "Série / Volumes"), parte deles já finalizada fora de ordem."""
+    rng = np.random.default_rng(seed)
+    n_itens = n_series * volumes_por_serie
+    df = gerar_backlog_sintetico(n_itens, seed)
+    ordem = np.tile(np.arange(1, volumes_por_serie + 1), n_series)
+    df["Nome_Serie"] = np.repeat([f"Série {i}" for i in range(n_series)], volumes_por_serie)
+    df["Ordem_Serie"] = ordem
+    df["Total_Serie"] = volumes_por_serie
+    # Cada série tem os volumes até um ponto finalizados, com alguns volumes anteriores pulados
+    lidos = ordem <= np.repeat(rng.integers(0, volumes_por_serie + 1, n_series), volumes_por_serie)
+    pulados = lidos & (rng.random(n_itens) < 0.2)
+    df["Status"] = np.where(lidos & ~pulados, "Finalizado", np.where(rng.random(n_itens) < 0.7, "No Backlog", "Desejo"))
+    df["Minha_Nota"] = np.where(df["Status"] == "Finalizado", rng.integers(1, 11, n_itens), 0)
+    df["Tipo"], df["Unidade_Duracao"] = "Mangá", "Edições"
+    return df
+
+def alterar_item_aleatorio(df, rng):
+    """Aplica em df uma inclusão, edição, finalização ou exclusão, como as abas Adicionar e Gerenciar. Retorna (df, ID alterado)."""
+    operacao = rng.choice(["incluir", "editar", "finalizar", "excluir"])
+    idx = df.index[rng.integers(len(df))]
+    if operacao == "incluir":
+        novo = df.loc[[idx]].copy()
+        novo["ID"] = df["ID"].max() + 1
+        novo["Nome_Serie"] = f"Série {rng.integers(20)}"
+        novo["Ordem_Serie"] = rng.integers(1, 10)
+        novo["Total_Serie"] = 10
+        return pd.concat([df, novo], ignore_index=True), novo["ID"].iloc[0]
+    item_id = df.at[idx, "ID"]
+    if operacao == "editar":
+        df.loc[idx, ["Duracao", "Meu_Hype", "Genero", "Status"]] = [float(rng.integers(0, 400)), int(rng.integers(0, 11)), rng.choice(GENEROS), "Desejo"]
+    elif operacao == "finalizar":
+        df.loc[idx, ["Status", "Minha_Nota", "Nome_Serie", "Ordem_Serie"]] = ["Finalizado", int(rng.integers(1, 11)), f"Série {rng.integers(20)}", int(rng.integers(1, 10))]
+    else:
+        df = df.drop(idx).reset_index(drop=True)
+    return df, item_id
+
+CONFIG_BENCH = {
+    "pesos": {
+        "Meu_Hype": 0.25, "Nota_Externa": 0.15, "Fator_Continuidade": 0.15,
+        "Duracao": 0.10, "Progresso": 0.15, "Antiguidade": 0.10,
+        "Afinidade_Genero": 0.10, "Origem": 0.05
+    },
+    "conversores_pl": {"Horas": 10, "Páginas": 100, "Episódios": 12, "Minutos": 180, "Edições": 1},
+    "bonus_catchup_ativo": True,
+    "bonus_catchup_valor": 1.5,
+}
+FATORES_BENCH = {
+    "Meu_Hype": True, "Nota_Externa": True, "Afinidade_Genero": True, "Fator_Continuidade": True,
+    "Progresso": True, "Antiguidade": True, "Duracao": True, "Origem": True, "Bonus_Catchup": True
+}
+
+# Fatores e variantes do motor que reproduzem o antigo ranking_logic
+FATORES_RANKING_LOGIC = {"Meu_Hype": True, "Nota_Externa": True, "Antiguidade": True, "Progresso": True, "Duracao": True}
+CONFIG_RANKING_LOGIC = {**CONFIG_BENCH, "variantes_fatores": {"Antiguidade": "linear", "Duracao": "linear"}}
+
+# --- sib_web.py ---
+
+def calcular_ranking_sib_web(df, config, fatores_ativos=None):
+    if df.empty: return df.assign(Pontuacao_Final=0, Custo_PL=0, Progresso_Perc=0)
+    
+    df_calculo = df[~df['Status'].isin(['Finalizado', 'Arquivado'])].copy()
+
+    if df_calculo.empty:
+        return df_calculo.assign(Pontuacao_Final=pd.Series(dtype='float'), Custo_PL=pd.Series(dtype='float'), Progresso_Perc=pd.Series(dtype='float'))
+
+    if fatores_ativos is None:
+        fatores_ativos = {
+            "Meu_Hype": True, "Nota_Externa": True, "Afinidade_Genero": True,
+            "Fator_Continuidade": True, "Progresso": True, "Antiguidade": True, "Duracao": True,
+            "Bonus_Catchup": True
+        }
+
+    # A lógica de rebalanceamento de pesos não inclui o bônus, pois ele é um multiplicador.
+    pesos_originais = config['pesos']
+    pesos_ativos = {fator: peso for fator, peso in pesos_originais.items() if fatores_ativos.get(fator, False)}
+    
+    soma_pesos_ativos = sum(pesos_ativos.values())
+    
+    pesos_rebalanceados = pesos_ativos.copy()
+    if soma_pesos_ativos > 0:
+        for fator, peso in pesos_rebalanceados.items():
+            pesos_rebalanceados[fator] = peso / soma_pesos_ativos
+    else:
+        df_calculo['Pontuacao_Final'] = 0
+        df_calculo['Custo_PL'] = 0
+        df_calculo['Progresso_Perc'] = 0
+        return df_calculo
+
+    # --- CÁLCULO DAS NOTAS INDIVIDUAIS ---
+    afinidades = calcular_afinidade_genero(df)
+    numeric_cols = ['Duracao', 'Nota_Externa', 'Meu_Hype', 'Ordem_Serie', 'Total_Serie', 'Minha_Nota', 'Progresso_Atual', 'Progresso_Total']
+    for col in numeric_cols:
+        df_calculo[col] = pd.to_numeric(df_calculo[col], errors='coerce').fillna(0)
+
+    def get_afinidade_score(generos_item):
+        if not isinstance(generos_item, str) or not afinidades: return 0
+        lista_generos = [g.strip() for g in generos_item.split(',')]
+        max_score = 0
+        for genero in lista_generos:
+            if genero in afinidades and afinidades[genero] > max_score: max_score = afinidades[genero]
+        return max_score
+    df_calculo['Nota_Afinidade'] = df_calculo['Genero'].apply(get_afinidade_score)
+    max_afinidade_geral = df_calculo['Nota_Afinidade'].max()
+    if max_afinidade_geral > 0: df_calculo['Nota_Afinidade'] = (df_calculo['Nota_Afinidade'] / max_afinidade_geral) * 10
+    
+    df_calculo['Progresso_Perc'] = (df_calculo['Progresso_Atual'] / df_calculo['Progresso_Total']).where(df_calculo['Progresso_Total'] > 0, 0)
+    df_calculo['Nota_Progresso'] = df_calculo['Progresso_Perc'] * 10
+    df_calculo['Data_Adicao'] = pd.to_datetime(df_calculo['Data_Adicao'], errors='coerce')
+    dias_no_backlog = (datetime.now() - df_calculo['Data_Adicao']).dt.days.fillna(0)
+    df_calculo['Nota_Antiguidade'] = pd.cut(dias_no_backlog, bins=[-1, 180, 365, 730, np.inf], labels=[0, 2.5, 5, 10], right=True).astype(float)
+    df_calculo['Nota_Duracao'] = df_calculo.groupby('Tipo')['Duracao'].transform(lambda x: ((x.max() - x) / (x.max() - x.min()) * 10) if x.max() > x.min() else 5.0).fillna(5.0)
+    df_calculo['Nota_Continuidade'] = ((df_calculo['Ordem_Serie'] - 1) / (df_calculo['Total_Serie'] - 1)).where(df_calculo['Total_Serie'] > 1, 0).fillna(0) * 10
+    df_calculo['Nota_Hype'] = df_calculo['Meu_Hype']
+    df_calculo['Nota_Critica'] = (df_calculo['Nota_Externa'] / 10)
+    # --- NOVO: Fator Origem (Pago vs Grátis) ---
+    if 'Origem' in df_calculo.columns:
+        df_calculo['Nota_Origem'] = (df_calculo['Origem'] == 'Pago').astype(int) * 10
+    else:
+        df_calculo['Nota_Origem'] = 0
+
+
+    # --- CÁLCULO DINÂMICO DA PONTUAÇÃO FINAL ---
+    df_calculo['Pontuacao_Final'] = 0
+    if fatores_ativos.get("Meu_Hype"): df_calculo['Pontuacao_Final'] += df_calculo['Nota_Hype'] * pesos_rebalanceados.get('Meu_Hype', 0)
+    if fatores_ativos.get("Nota_Externa"): df_calculo['Pontuacao_Final'] += df_calculo['Nota_Critica'] * pesos_rebalanceados.get('Nota_Externa', 0)
+    if fatores_ativos.get("Afinidade_Genero"): df_calculo['Pontuacao_Final'] += df_calculo['Nota_Afinidade'] * pesos_rebalanceados.get('Afinidade_Genero', 0)
+    if fatores_ativos.get("Fator_Continuidade"): df_calculo['Pontuacao_Final'] += df_calculo['Nota_Continuidade'] * pesos_rebalanceados.get('Fator_Continuidade', 0)
+    if fatores_ativos.get("Progresso"): df_calculo['Pontuacao_Final'] += df_calculo['Nota_Progresso'] * pesos_rebalanceados.get('Progresso', 0)
+    if fatores_ativos.get("Antiguidade"): df_calculo['Pontuacao_Final'] += df_calculo['Nota_Antiguidade'] * pesos_rebalanceados.get('Antiguidade', 0)
+    if fatores_ativos.get("Duracao"): df_calculo['Pontuacao_Final'] += df_calculo['Nota_Duracao'] * pesos_rebalanceados.get('Duracao', 0)
+    if fatores_ativos.get("Origem"): df_calculo['Pontuacao_Final'] += df_calculo['Nota_Origem'] * pesos_rebalanceados.get('Origem', 0)
+    
+    # --- ALTERAÇÃO AQUI: Bônus agora é condicional ---
+    if fatores_ativos.get("Bonus_Catchup") and config.get("bonus_catchup_ativo", False):
+        series_finalizadas = df[df['Status'] == 'Finalizado'].groupby('Nome_Serie')['Ordem_Serie'].max()
+        for serie, max_ordem in series_finalizadas.items():
+            if serie and max_ordem is not pd.NaT:
+                idx_bonus = df_calculo[(df_calculo['Nome_Serie'] == serie) & (df_calculo['Ordem_Serie'] < max_ordem)].index
+                df_calculo.loc[idx_bonus, 'Pontuacao_Final'] *= config.get("bonus_catchup_valor", 1.5)
+
+    def calcular_custo(row):
+        if row['Status'] == 'Desejo' and row['Duracao'] > 0:
+            conversor = config['conversores_pl'].get(row['Unidade_Duracao'], 1)
+            return np.ceil(row['Duracao'] / conversor) if conversor > 0 else 0
+        return 0
+        
+    df_calculo['Custo_PL'] = df_calculo.apply(calcular_custo, axis=1)
+    
+    return df_calculo.sort_values(by="Pontuacao_Final", ascending=False).reset_index(drop=True)
+
+def calcular_afinidade_genero(backlog_df):
+    """
+    Calcula a pontuação de afinidade para cada gênero com base nas notas de itens finalizados.
+    Considera apenas itens com nota pessoal >= 7.
+    """
+    df_afinidade = backlog_df[(backlog_df['Status'] == 'Finalizado') & (backlog_df['Minha_Nota'] >= 7)].copy()
+
+    if df_afinidade.empty:
+        return {}
+
+    # Garante que a coluna Gênero seja string e remove valores nulos
+    df_afinidade = df_afinidade.dropna(subset=['Genero'])
+    df_afinidade['Genero'] = df_afinidade['Genero'].astype(str)
+
+    # "Explode" os gêneros: 'Ação, RPG' vira duas linhas
+    df_exploded = df_afinidade.assign(Genero=df_afinidade['Genero'].str.split(',')).explode('Genero')
+    df_exploded['Genero'] = df_exploded['Genero'].str.strip()
+    df_exploded = df_exploded[df_exploded['Genero'] != '']
+
+    # Calcula a nota média e a contagem para cada gênero
+    afinidade_stats = df_exploded.groupby('Genero')['Minha_Nota'].agg(['mean', 'count'])
+
+    # Calcula a pontuação de afinidade
+    # Fórmula: (Nota Média - Limiar) * Contagem
+    limiar_nota = 7.0
+    afinidade_stats['Pontuacao_Afinidade'] = (afinidade_stats['mean'] - limiar_nota) * afinidade_stats['count']
+
+    # Filtra apenas gêneros com afinidade positiva e retorna como dicionário
+    afinidades_positivas = afinidade_stats[afinidade_stats['Pontuacao_Afinidade'] > 0]
+    
+    return afinidades_positivas['Pontuacao_Afinidade'].to_dict()
+
+# --- ranking_logic.py ---
+
+def calcular_ranking_ranking_logic(backlog_df, config, fatores_ativos):
+    """
+    Algoritmo principal do SIB. Calcula a pontuação de cada item.
+    """
+    if backlog_df.empty:
+        return backlog_df
+
+    df = backlog_df.copy()
+    pesos = config.get('pesos', {})
+    
+    # Normalização e cálculos de base
+    df['Data_Adicao'] = pd.to_datetime(df['Data_Adicao'], errors='coerce')
+    hoje = datetime.now()
+    
+    # 1. Antiguidade (Normalizada 0-10)
+    df['Dias_Fila'] = (hoje - df['Data_Adicao']).dt.days.fillna(0)
+    max_dias = df['Dias_Fila'].max() if df['Dias_Fila'].max() > 0 else 1
+    df['Score_Antiguidade'] = (df['Dias_Fila'] / max_dias) * 10
+    
+    # 2. Progresso (Normalizado 0-10)
+    df['Progresso_Total'] = pd.to_numeric(df['Progresso_Total'], errors='coerce').fillna(1)
+    df['Progresso_Atual'] = pd.to_numeric(df['Progresso_Atual'], errors='coerce').fillna(0)
+    df['Progresso_Perc'] = (df['Progresso_Atual'] / df['Progresso_Total']).clip(0, 1)
+    df['Score_Progresso'] = df['Progresso_Perc'] * 10
+    
+    # 3. Duração (Inverso: mais curto = maior pontuação, normalizado 0-10)
+    df['Duracao'] = pd.to_numeric(df['Duracao'], errors='coerce').fillna(0)
+    max_duracao = df['Duracao'].max() if df['Duracao'].max() > 0 else 1
+    df['Score_Duracao'] = (1 - (df['Duracao'] / max_duracao)) * 10
+    
+    # Cálculo da Pontuação Final Ponderada
+    df['Pontuacao_Final'] = 0.0
+    
+    if fatores_ativos.get("Meu_Hype", True):
+        df['Pontuacao_Final'] += df['Meu_Hype'].fillna(0) * pesos.get('Meu_Hype', 0.25)
+    
+    if fatores_ativos.get("Nota_Externa", True):
+        # Nota externa costuma ser 0-100, normalizamos para 0-10
+        df['Pontuacao_Final'] += (df['Nota_Externa'].fillna(0) / 10) * pesos.get('Nota_Externa', 0.15)
+        
+    if fatores_ativos.get("Antiguidade", True):
+        df['Pontuacao_Final'] += df['Score_Antiguidade'] * pesos.get('Antiguidade', 0.10)
+        
+    if fatores_ativos.get("Progresso", True):
+        df['Pontuacao_Final'] += df['Score_Progresso'] * pesos.get('Progresso', 0.15)
+        
+    if fatores_ativos.get("Duracao", True):
+        df['Pontuacao_Final'] += df['Score_Duracao'] * pesos.get('Duracao', 0.10)
+
+    # Ordenar pelo Ranking
+    return df.sort_values(by='Pontuacao_Final', ascending=False)
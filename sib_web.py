@@ -2,21 +2,33 @@
 import streamlit as st
 import pandas as pd
 import numpy as np
+import asyncio
+import hashlib
 import json
 import os
 import time
+import threading
 import io
 import zipfile
 import requests
-from datetime import datetime
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime, date
 
 # --- Dependências para Busca Real ---
 from howlongtobeatpy import HowLongToBeat
-from igdb.wrapper import IGDBWrapper
 
 # --- Importações do Supabase ---
 from premium_module import verificar_plano_usuario, bloquear_recurso_premium, mostrar_planos, simular_upgrade_premium
-from db_connection import get_supabase_client, carregar_config_db, salvar_config_db, carregar_dados_db, salvar_dados_db, deletar_item_db
+from cache_metadados import buscar_com_cache, PROVEDOR_POR_TIPO
+from token_twitch import obter_token_twitch, invalidar_token_twitch
+from http_provedores import requisitar
+from fila_escrita import enfileirar_dados, enfileirar_config, escritas_pendentes, descarregar_fila, encerrar_fila
+from db_connection import get_supabase_client, descartar_supabase_client, carregar_config_db, salvar_config_db, carregar_dados_db, carregar_colunas_adicionais_db, salvar_dados_db, deletar_item_db, registrar_estado_persistido, carregar_ranking_precalculado_db
+from ranking_logic import (
+    como_data, como_numerico, FATORES_PADRAO, NOTAS_POR_FATOR, IndiceGeneros, EstoqueFatores,
+    indices_top_k, ordenar_ranking, calcular_afinidade_genero,
+)
 
 # ==============================================================================
 # 1. GESTÃO DE DADOS E CONFIGURAÇÕES (ADAPTADA PARA SUPABASE)
@@ -39,9 +51,39 @@ COLUNAS_ESPERADAS_BACKLOG = [
 
 COLUNAS_ESPERADAS_SESSOES = ["ID_Sessao", "ID_Item", "Data", "Duracao_Sessao", "Progresso_Ganho", "Notas"]
 
-def carregar_config():
-    user_id = st.session_state.user.id
-    config_padrao = {
+# Esquema declarado das tabelas, aplicado uma única vez em carregar_dados.
+# "category" usa as categorias conhecidas abaixo mais os valores encontrados nos dados.
+CATEGORIAS_CONHECIDAS = {
+    "Tipo": ["Jogo", "Livro", "Série", "Filme", "Anime", "Mangá"],
+    "Status": ["No Backlog", "Em Andamento", "Finalizado", "Desejo", "Arquivado"],
+    "Unidade_Duracao": ["Horas", "Páginas", "Episódios", "Minutos", "Edições", "unidades"],
+    "Origem": ["Pago", "Grátis"],
+    "Plataforma": [],
+}
+
+ESQUEMA_BACKLOG = {
+    "Tipo": "category", "Plataforma": "category", "Status": "category",
+    "Unidade_Duracao": "category", "Origem": "category",
+    "Meu_Hype": "Int8", "Minha_Nota": "Int8", "Nota_Externa": "Int16",
+    "Ordem_Serie": "Int32", "Total_Serie": "Int32",
+    "Progresso_Atual": "Int32", "Progresso_Total": "Int32",
+    "Duracao": "float64", "Tempo_Final": "float64",
+    "Data_Adicao": "datetime64", "Data_Finalizacao": "datetime64",
+}
+
+ESQUEMA_SESSOES = {
+    "Data": "datetime64", "Duracao_Sessao": "Int32", "Progresso_Ganho": "Int32",
+}
+
+ESQUEMAS_TABELAS = {TABELA_BACKLOG: ESQUEMA_BACKLOG, TABELA_SESSOES: ESQUEMA_SESSOES}
+
+# Colunas volumosas que ficam fora da carga inicial e só são buscadas quando uma aba precisa delas
+COLUNAS_PESADAS = {TABELA_BACKLOG: ["Cover_URL"]}
+DATAFRAMES_SESSAO = {TABELA_BACKLOG: "backlog_df", TABELA_SESSOES: "sessoes_df"}
+
+def obter_config_padrao():
+    """Configuração de um usuário novo (também usada por jobs em lote para contas sem configuração salva)."""
+    return {
         "pontos_liberacao": 0,
         "pesos": {
             "Meu_Hype": 0.25, "Nota_Externa": 0.15, "Fator_Continuidade": 0.15, 
@@ -49,6 +91,7 @@ def carregar_config():
             "Afinidade_Genero": 0.10, "Origem": 0.05 
         },
         "conversores_pl": {"Horas": 10, "Páginas": 100, "Episódios": 12, "Minutos": 180, "Edições": 1},
+        "variantes_fatores": {},
         "bonus_catchup_ativo": True,
         "bonus_catchup_valor": 1.5,
         "metas": [],
@@ -61,27 +104,136 @@ def carregar_config():
             "ra_api_key": "COLE_SUA_CHAVE_RA_AQUI"
         },
         "ultima_sincronizacao_ra": "2000-01-01 00:00:00",
+        "escrita_em_segundo_plano": False,
         "conquistas": {}
     }
+
+def carregar_config():
+    user_id = st.session_state.user.id
+    config_padrao = obter_config_padrao()
     # (Poderia preencher conquistas_padrao aqui se necessário, mas o DB já deve ter ou o app recria)
     return carregar_config_db(user_id, config_padrao)
 
 def salvar_config(config):
     user_id = st.session_state.user.id
+    if config.get("escrita_em_segundo_plano"):
+        enfileirar_config(user_id, config)
+        return
     salvar_config_db(user_id, config)
     st.toast("Configurações salvas no banco de dados.")
 
-def carregar_dados(tabela_name, colunas_esperadas):
-    user_id = st.session_state.user.id
-    df = carregar_dados_db(user_id, tabela_name)
-    if df.empty:
-        return pd.DataFrame(columns=colunas_esperadas)
+def aplicar_esquema(df, esquema):
+    """
+    Converte as colunas para os tipos declarados (categorias, inteiros compactos e datas).
+    Os inteiros são anuláveis (Int8, Int16, Int32): um NULL do banco continua nulo e volta como NULL na escrita.
+    """
+    for coluna, tipo in esquema.items():
+        if coluna not in df.columns:
+            continue
+        if tipo == "category":
+            conhecidas = CATEGORIAS_CONHECIDAS.get(coluna, [])
+            valores = df[coluna].astype(str).where(df[coluna].notna())
+            extras = sorted(set(valores.dropna().unique()) - set(conhecidas))
+            df[coluna] = valores.astype(pd.CategoricalDtype(conhecidas + extras))
+        elif tipo == "datetime64":
+            df[coluna] = pd.to_datetime(df[coluna], errors='coerce')
+        else:
+            numeros = pd.to_numeric(df[coluna], errors='coerce')
+            if pd.api.types.is_float_dtype(numeros) and tipo.startswith("Int"):
+                # Como o astype(int) anterior: a parte decimal é descartada
+                numeros = np.trunc(numeros)
+            df[coluna] = numeros.astype(tipo)
+    return df
+
+def inteiro_ou_padrao(valor, padrao=0):
+    """int(valor), ou 'padrao' se o valor for nulo (as colunas inteiras do esquema aceitam nulos)."""
+    return int(valor) if pd.notna(valor) else padrao
+
+def atribuir_valores(df, idx, dados):
+    """Atribui valores a linhas do DataFrame, incluindo novas categorias quando a coluna é categórica."""
+    for chave, valor in dados.items():
+        if chave in df.columns and isinstance(df[chave].dtype, pd.CategoricalDtype) and pd.notna(valor) and valor not in df[chave].cat.categories:
+            df[chave] = df[chave].cat.add_categories([valor])
+        df.loc[idx, chave] = valor
+
+def normalizar_tabela(df, tabela_name, colunas_esperadas):
+    """Deixa as linhas lidas do banco no formato do app: sem user_id, nomes esperados e esquema aplicado."""
     if 'user_id' in df.columns:
         df = df.drop(columns=['user_id'])
+    # Tabelas sem mapeamento explícito voltam do banco com as colunas em minúsculo
+    df = df.rename(columns={c.lower(): c for c in colunas_esperadas if c not in df.columns and c.lower() in df.columns})
+    return aplicar_esquema(df, ESQUEMAS_TABELAS.get(tabela_name, {}))
+
+def carregar_dados(tabela_name, colunas_esperadas, colunas=None):
+    """Carrega a tabela do usuário. 'colunas' restringe a carga a um subconjunto das colunas esperadas."""
+    user_id = st.session_state.user.id
+    df = carregar_dados_db(user_id, tabela_name, colunas=colunas)
+    if df.empty:
+        df = pd.DataFrame(columns=colunas if colunas is not None else colunas_esperadas)
+    df = normalizar_tabela(df, tabela_name, colunas_esperadas)
+    # O rastreador de alterações passa a comparar com o DataFrame já tipado
+    registrar_estado_persistido(tabela_name, df)
     return df
 
+def carregar_dados_iniciais(tabela_name, colunas_esperadas):
+    """Carga inicial sem as colunas pesadas da tabela (ver garantir_colunas_pesadas)."""
+    pesadas = COLUNAS_PESADAS.get(tabela_name, [])
+    if not pesadas:
+        return carregar_dados(tabela_name, colunas_esperadas)
+    return carregar_dados(tabela_name, colunas_esperadas, colunas=[c for c in colunas_esperadas if c not in pesadas])
+
+def garantir_colunas_pesadas(tabela_name):
+    """
+    Busca, uma única vez por sessão, as colunas pesadas que ficaram fora da carga inicial.
+    Toda aba que lê ou edita essas colunas chama esta função antes. Retorna True se a carga aconteceu agora.
+    """
+    chave_carregadas = f"colunas_pesadas_{tabela_name}"
+    pesadas = COLUNAS_PESADAS.get(tabela_name, [])
+    if not pesadas or st.session_state.get(chave_carregadas):
+        return False
+    chave_df = DATAFRAMES_SESSAO[tabela_name]
+    user_id = st.session_state.user.id
+    st.session_state[chave_df] = carregar_colunas_adicionais_db(user_id, tabela_name, st.session_state[chave_df], pesadas)
+    st.session_state[chave_carregadas] = True
+    if tabela_name == TABELA_BACKLOG:
+        marcar_backlog_alterado()
+    return True
+
+def marcar_backlog_alterado():
+    """Avança a versão do backlog da sessão, invalidando resultados derivados dele (ex: ranking)."""
+    versao = st.session_state.get('backlog_versao', 0) + 1
+    st.session_state.backlog_versao = versao
+    # O estoque de fatores acompanha a nova versão só se atualizar_estoque_fatores já registrou a alteração;
+    # qualquer outra mudança no backlog faz com que ele seja reconstruído no próximo ranking
+    estoque = st.session_state.get('estoque_fatores')
+    if estoque is not None and st.session_state.pop('estoque_fatores_sincronizado', False):
+        estoque.versao = versao
+
+def atualizar_estoque_fatores(ids):
+    """
+    Aplica ao estoque de fatores da sessão a alteração dos itens 'ids', já feita em backlog_df.
+    Deve ser chamada antes de salvar_dados, que avança a versão do backlog.
+    """
+    estoque = st.session_state.get('estoque_fatores')
+    if estoque is None or estoque.versao != st.session_state.get('backlog_versao', 0):
+        return
+    if not estoque.incremental:
+        del st.session_state['estoque_fatores']
+        return
+    estoque.atualizar_itens(st.session_state.backlog_df, ids)
+    st.session_state.estoque_fatores_sincronizado = True
+
 def salvar_dados(df, tabela_name):
+    if tabela_name == TABELA_BACKLOG:
+        marcar_backlog_alterado()
+    # Uma coluna pesada parcialmente preenchida na sessão apagaria no banco os valores ainda não carregados
+    if any(c in df.columns for c in COLUNAS_PESADAS.get(tabela_name, [])) and not st.session_state.get(f"colunas_pesadas_{tabela_name}"):
+        garantir_colunas_pesadas(tabela_name)
+        df = st.session_state[DATAFRAMES_SESSAO[tabela_name]]
     user_id = st.session_state.user.id
+    if st.session_state.get('config', {}).get("escrita_em_segundo_plano"):
+        enfileirar_dados(user_id, tabela_name, df)
+        return
     salvar_dados_db(user_id, tabela_name, df)
     st.toast(f"Dados sincronizados.")
 
@@ -106,132 +258,186 @@ def buscar_dados_online_real(titulo, tipo):
             st.toast(f"HLTB: Erro ao buscar '{titulo}': {e}")
     return dados
 
-def calcular_ranking(df, config, fatores_ativos=None):
-    if df.empty: return df.assign(Pontuacao_Final=0, Custo_PL=0, Progresso_Perc=0)
-    
-    df_calculo = df[~df['Status'].isin(['Finalizado', 'Arquivado'])].copy()
-
-    if df_calculo.empty:
-        return df_calculo.assign(Pontuacao_Final=pd.Series(dtype='float'), Custo_PL=pd.Series(dtype='float'), Progresso_Perc=pd.Series(dtype='float'))
+# --- Simulação de pesos ("e se...?") ---
+# Conjuntos de pesos comparados com os pesos atuais no simulador da aba Configurações
+PRESETS_PESOS = {
+    "Equilibrado": {fator: 1.0 for fator in NOTAS_POR_FATOR},
+    "Vontade": {"Meu_Hype": 0.6, "Nota_Externa": 0.1, "Afinidade_Genero": 0.1, "Fator_Continuidade": 0.1, "Progresso": 0.1},
+    "Crítica": {"Nota_Externa": 0.6, "Meu_Hype": 0.2, "Afinidade_Genero": 0.2},
+    "Terminar o que comecei": {"Progresso": 0.5, "Fator_Continuidade": 0.3, "Meu_Hype": 0.2},
+    "Itens curtos": {"Duracao": 0.6, "Meu_Hype": 0.2, "Nota_Externa": 0.2},
+    "Limpar os antigos": {"Antiguidade": 0.6, "Meu_Hype": 0.2, "Duracao": 0.2},
+}
+# Valores testados para cada peso na análise de sensibilidade (21 por fator)
+PASSOS_SENSIBILIDADE = np.linspace(0.0, 1.0, 21)
+
+def matriz_notas(df_pontuado):
+    """
+    Notas de pontuar_backlog como matriz (itens x fatores de NOTAS_POR_FATOR) e o multiplicador do bônus.
+    Notas nulas viram 0 e a precisão simples basta para comparar cenários.
+    """
+    n = len(df_pontuado)
+    colunas = [df_pontuado[c].to_numpy(dtype=np.float32) if c in df_pontuado.columns else np.zeros(n, dtype=np.float32) for c in NOTAS_POR_FATOR.values()]
+    notas = np.nan_to_num(np.column_stack(colunas)) if n else np.zeros((0, len(NOTAS_POR_FATOR)), dtype=np.float32)
+    if 'Multiplicador_Bonus' in df_pontuado.columns:
+        multiplicador = df_pontuado['Multiplicador_Bonus'].to_numpy(dtype=np.float32)
+    else:
+        multiplicador = np.ones(n, dtype=np.float32)
+    return notas, multiplicador
 
+def matriz_pesos(lista_pesos, fatores_ativos=None):
+    """Uma coluna por dicionário de pesos, rebalanceada sobre os fatores ativos como em pontuar_backlog."""
     if fatores_ativos is None:
-        fatores_ativos = {
-            "Meu_Hype": True, "Nota_Externa": True, "Afinidade_Genero": True,
-            "Fator_Continuidade": True, "Progresso": True, "Antiguidade": True, "Duracao": True,
-            "Bonus_Catchup": True
-        }
-
-    # A lógica de rebalanceamento de pesos não inclui o bônus, pois ele é um multiplicador.
-    pesos_originais = config['pesos']
-    pesos_ativos = {fator: peso for fator, peso in pesos_originais.items() if fatores_ativos.get(fator, False)}
-    
-    soma_pesos_ativos = sum(pesos_ativos.values())
-    
-    pesos_rebalanceados = pesos_ativos.copy()
-    if soma_pesos_ativos > 0:
-        for fator, peso in pesos_rebalanceados.items():
-            pesos_rebalanceados[fator] = peso / soma_pesos_ativos
-    else:
-        df_calculo['Pontuacao_Final'] = 0
-        df_calculo['Custo_PL'] = 0
-        df_calculo['Progresso_Perc'] = 0
-        return df_calculo
-
-    # --- CÁLCULO DAS NOTAS INDIVIDUAIS ---
-    afinidades = calcular_afinidade_genero(df)
-    numeric_cols = ['Duracao', 'Nota_Externa', 'Meu_Hype', 'Ordem_Serie', 'Total_Serie', 'Minha_Nota', 'Progresso_Atual', 'Progresso_Total']
-    for col in numeric_cols:
-        df_calculo[col] = pd.to_numeric(df_calculo[col], errors='coerce').fillna(0)
-
-    def get_afinidade_score(generos_item):
-        if not isinstance(generos_item, str) or not afinidades: return 0
-        lista_generos = [g.strip() for g in generos_item.split(',')]
-        max_score = 0
-        for genero in lista_generos:
-            if genero in afinidades and afinidades[genero] > max_score: max_score = afinidades[genero]
-        return max_score
-    df_calculo['Nota_Afinidade'] = df_calculo['Genero'].apply(get_afinidade_score)
-    max_afinidade_geral = df_calculo['Nota_Afinidade'].max()
-    if max_afinidade_geral > 0: df_calculo['Nota_Afinidade'] = (df_calculo['Nota_Afinidade'] / max_afinidade_geral) * 10
-    
-    df_calculo['Progresso_Perc'] = (df_calculo['Progresso_Atual'] / df_calculo['Progresso_Total']).where(df_calculo['Progresso_Total'] > 0, 0)
-    df_calculo['Nota_Progresso'] = df_calculo['Progresso_Perc'] * 10
-    df_calculo['Data_Adicao'] = pd.to_datetime(df_calculo['Data_Adicao'], errors='coerce')
-    dias_no_backlog = (datetime.now() - df_calculo['Data_Adicao']).dt.days.fillna(0)
-    df_calculo['Nota_Antiguidade'] = pd.cut(dias_no_backlog, bins=[-1, 180, 365, 730, np.inf], labels=[0, 2.5, 5, 10], right=True).astype(float)
-    df_calculo['Nota_Duracao'] = df_calculo.groupby('Tipo')['Duracao'].transform(lambda x: ((x.max() - x) / (x.max() - x.min()) * 10) if x.max() > x.min() else 5.0).fillna(5.0)
-    df_calculo['Nota_Continuidade'] = ((df_calculo['Ordem_Serie'] - 1) / (df_calculo['Total_Serie'] - 1)).where(df_calculo['Total_Serie'] > 1, 0).fillna(0) * 10
-    df_calculo['Nota_Hype'] = df_calculo['Meu_Hype']
-    df_calculo['Nota_Critica'] = (df_calculo['Nota_Externa'] / 10)
-    # --- NOVO: Fator Origem (Pago vs Grátis) ---
-    if 'Origem' in df_calculo.columns:
-        df_calculo['Nota_Origem'] = (df_calculo['Origem'] == 'Pago').astype(int) * 10
-    else:
-        df_calculo['Nota_Origem'] = 0
-
-
-    # --- CÁLCULO DINÂMICO DA PONTUAÇÃO FINAL ---
-    df_calculo['Pontuacao_Final'] = 0
-    if fatores_ativos.get("Meu_Hype"): df_calculo['Pontuacao_Final'] += df_calculo['Nota_Hype'] * pesos_rebalanceados.get('Meu_Hype', 0)
-    if fatores_ativos.get("Nota_Externa"): df_calculo['Pontuacao_Final'] += df_calculo['Nota_Critica'] * pesos_rebalanceados.get('Nota_Externa', 0)
-    if fatores_ativos.get("Afinidade_Genero"): df_calculo['Pontuacao_Final'] += df_calculo['Nota_Afinidade'] * pesos_rebalanceados.get('Afinidade_Genero', 0)
-    if fatores_ativos.get("Fator_Continuidade"): df_calculo['Pontuacao_Final'] += df_calculo['Nota_Continuidade'] * pesos_rebalanceados.get('Fator_Continuidade', 0)
-    if fatores_ativos.get("Progresso"): df_calculo['Pontuacao_Final'] += df_calculo['Nota_Progresso'] * pesos_rebalanceados.get('Progresso', 0)
-    if fatores_ativos.get("Antiguidade"): df_calculo['Pontuacao_Final'] += df_calculo['Nota_Antiguidade'] * pesos_rebalanceados.get('Antiguidade', 0)
-    if fatores_ativos.get("Duracao"): df_calculo['Pontuacao_Final'] += df_calculo['Nota_Duracao'] * pesos_rebalanceados.get('Duracao', 0)
-    if fatores_ativos.get("Origem"): df_calculo['Pontuacao_Final'] += df_calculo['Nota_Origem'] * pesos_rebalanceados.get('Origem', 0)
-    
-    # --- ALTERAÇÃO AQUI: Bônus agora é condicional ---
-    if fatores_ativos.get("Bonus_Catchup") and config.get("bonus_catchup_ativo", False):
-        series_finalizadas = df[df['Status'] == 'Finalizado'].groupby('Nome_Serie')['Ordem_Serie'].max()
-        for serie, max_ordem in series_finalizadas.items():
-            if serie and max_ordem is not pd.NaT:
-                idx_bonus = df_calculo[(df_calculo['Nome_Serie'] == serie) & (df_calculo['Ordem_Serie'] < max_ordem)].index
-                df_calculo.loc[idx_bonus, 'Pontuacao_Final'] *= config.get("bonus_catchup_valor", 1.5)
-
-    def calcular_custo(row):
-        if row['Status'] == 'Desejo' and row['Duracao'] > 0:
-            conversor = config['conversores_pl'].get(row['Unidade_Duracao'], 1)
-            return np.ceil(row['Duracao'] / conversor) if conversor > 0 else 0
-        return 0
-        
-    df_calculo['Custo_PL'] = df_calculo.apply(calcular_custo, axis=1)
-    
-    return df_calculo.sort_values(by="Pontuacao_Final", ascending=False).reset_index(drop=True)
+        fatores_ativos = FATORES_PADRAO
+    pesos = np.array(
+        [[float(p.get(fator, 0)) if fatores_ativos.get(fator) else 0.0 for p in lista_pesos] for fator in NOTAS_POR_FATOR],
+        dtype=np.float32,
+    ).reshape(len(NOTAS_POR_FATOR), len(lista_pesos))
+    soma = pesos.sum(axis=0)
+    return np.divide(pesos, soma, out=np.zeros_like(pesos), where=soma > 0)
+
+def avaliar_pesos(df_pontuado, lista_pesos, fatores_ativos=None):
+    """Pontuação de cada item (linhas) sob cada conjunto de pesos (colunas), numa única multiplicação de matrizes."""
+    notas, multiplicador = matriz_notas(df_pontuado)
+    return (notas @ matriz_pesos(lista_pesos, fatores_ativos)) * multiplicador[:, None]
+
+def posicoes_por_pesos(pontuacoes, itens):
+    """Posição (1 = topo) de cada item de 'itens' em cada coluna de pontuações. Empatados dividem a posição."""
+    return np.array([(pontuacoes > pontuacoes[i]).sum(axis=0) + 1 for i in itens]).reshape(len(itens), pontuacoes.shape[1])
+
+def sensibilidade_pesos(df_pontuado, pesos_base, fatores_ativos, itens, passos=PASSOS_SENSIBILIDADE):
+    """
+    Quantas posições cada item de 'itens' (posições em df_pontuado) pode ganhar ou perder quando
+    apenas o peso de um fator varia em 'passos' e os demais ficam como em 'pesos_base'.
+    Retorna um DataFrame itens x fatores ativos.
+    """
+    fatores = [fator for fator in NOTAS_POR_FATOR if fatores_ativos.get(fator)]
+    cenarios = [{**pesos_base, fator: float(valor)} for fator in fatores for valor in passos]
+    posicoes = posicoes_por_pesos(avaliar_pesos(df_pontuado, cenarios, fatores_ativos), itens)
+    posicoes = posicoes.reshape(len(itens), len(fatores), len(passos))
+    return pd.DataFrame(posicoes.max(axis=2) - posicoes.min(axis=2), columns=fatores)
+
+
+
+# Quantos resultados de ranking (combinações de pesos/fatores) ficam guardados por sessão
+MAX_RANKINGS_EM_CACHE = 8
+
+def regras_ranking(config, fatores_ativos):
+    """Tudo o que, além do backlog, altera o ranking: pesos, fatores e suas variantes, conversores, bônus e o dia (a antiguidade muda com a data)."""
+    return (
+        json.dumps(config.get('pesos', {}), sort_keys=True),
+        json.dumps(fatores_ativos or {}, sort_keys=True),
+        json.dumps(config.get('conversores_pl', {}), sort_keys=True),
+        json.dumps(config.get('variantes_fatores', {}), sort_keys=True),
+        config.get('bonus_catchup_ativo', False), config.get('bonus_catchup_valor', 1.5),
+        date.today().isoformat(),
+    )
 
+def chave_cache_ranking(config, fatores_ativos):
+    return (st.session_state.get('backlog_versao', 0),) + regras_ranking(config, fatores_ativos)
 
+def ranking_em_cache(config, fatores_ativos):
+    return chave_cache_ranking(config, fatores_ativos) in st.session_state.get('cache_ranking', {})
 
-def calcular_afinidade_genero(backlog_df):
+def indice_generos(df):
+    """
+    IndiceGeneros de df. O do backlog da sessão é construído uma única vez por versão do backlog e
+    compartilhado por ranking, filtros, dashboards e conquistas.
     """
-    Calcula a pontuação de afinidade para cada gênero com base nas notas de itens finalizados.
-    Considera apenas itens com nota pessoal >= 7.
+    if df is not st.session_state.get('backlog_df'):
+        return IndiceGeneros(df['Genero'])
+    versao = st.session_state.get('backlog_versao', 0)
+    guardado = st.session_state.get('indice_generos')
+    # O tamanho protege contra alterações feitas no DataFrame antes de a versão ser avançada
+    if guardado is None or guardado[0] != versao or len(guardado[1]) != len(df):
+        guardado = (versao, IndiceGeneros(df['Genero']))
+        st.session_state.indice_generos = guardado
+    return guardado[1]
+
+def obter_estoque_fatores(df, versao):
+    """Estoque de fatores da sessão para a versão atual do backlog, reconstruído se estiver desatualizado."""
+    estoque = st.session_state.get('estoque_fatores')
+    if estoque is None or estoque.versao != versao:
+        estoque = EstoqueFatores(df, versao, indice_generos(df))
+        st.session_state.estoque_fatores = estoque
+    return estoque
+
+def pontuar_backlog_cacheado(df, config, fatores_ativos):
     """
-    df_afinidade = backlog_df[(backlog_df['Status'] == 'Finalizado') & (backlog_df['Minha_Nota'] >= 7)].copy()
+    Versão memoizada de pontuar_backlog para a sessão; a ordenação fica a cargo de ordenar_ranking.
+    A chave combina a versão do backlog com regras_ranking.
+    O DataFrame devolvido é compartilhado: não deve ser alterado por quem o recebe.
+    """
+    chave = chave_cache_ranking(config, fatores_ativos)
+    versao = chave[0]
+    cache = st.session_state.setdefault('cache_ranking', OrderedDict())
+    # Resultados de versões anteriores do backlog nunca mais serão usados
+    for chave_antiga in [c for c in cache if c[0] != versao]:
+        del cache[chave_antiga]
+    if chave in cache:
+        cache.move_to_end(chave)
+        return cache[chave]
+
+    resultado = obter_estoque_fatores(df, versao).pontuar(config, fatores_ativos)
+    cache[chave] = resultado
+    while len(cache) > MAX_RANKINGS_EM_CACHE:
+        cache.popitem(last=False)
+    return resultado
+
+
+# Colunas do backlog que entram no ranking (e portanto na assinatura de um ranking pré-calculado)
+COLUNAS_ASSINATURA_RANKING = [
+    "ID", "Status", "Tipo", "Genero", "Meu_Hype", "Nota_Externa", "Duracao", "Unidade_Duracao",
+    "Nome_Serie", "Ordem_Serie", "Total_Serie", "Minha_Nota", "Progresso_Atual", "Progresso_Total",
+    "Data_Adicao", "Origem",
+]
 
-    if df_afinidade.empty:
-        return {}
+def assinatura_ranking(df, config, fatores_ativos):
+    """
+    Identifica o ranking de um backlog sob um conjunto de regras, sem calculá-lo.
+    Não depende da ordem das linhas; serve para saber se um ranking pré-calculado ainda vale.
+    """
+    colunas = [c for c in COLUNAS_ASSINATURA_RANKING if c in df.columns]
+    hash_linhas = pd.util.hash_pandas_object(df[colunas], index=False).to_numpy()
+    base = json.dumps([int(hash_linhas.sum(dtype=np.uint64)), len(df), colunas, *regras_ranking(config, fatores_ativos)])
+    return hashlib.sha256(base.encode()).hexdigest()
 
-    # Garante que a coluna Gênero seja string e remove valores nulos
-    df_afinidade = df_afinidade.dropna(subset=['Genero'])
-    df_afinidade['Genero'] = df_afinidade['Genero'].astype(str)
+def ranking_precalculado(backlog_df, config, fatores_ativos):
+    """
+    Top N gravado por ranking_lote.py, se ainda corresponder ao backlog, às regras e ao dia atuais.
+    Retorna (DataFrame como o de ordenar_ranking, total de itens ranqueados) ou None.
+    O banco é consultado uma vez por sessão e a assinatura, conferida uma vez por chave de cache.
+    """
+    user_id = st.session_state.user.id
+    if st.session_state.get('ranking_precalculado', (None, None))[0] != user_id:
+        st.session_state.ranking_precalculado = (user_id, carregar_ranking_precalculado_db(user_id))
+    registro = st.session_state.ranking_precalculado[1]
+    if not registro:
+        return None
 
-    # "Explode" os gêneros: 'Ação, RPG' vira duas linhas
-    df_exploded = df_afinidade.assign(Genero=df_afinidade['Genero'].str.split(',')).explode('Genero')
-    df_exploded['Genero'] = df_exploded['Genero'].str.strip()
-    df_exploded = df_exploded[df_exploded['Genero'] != '']
+    chave = chave_cache_ranking(config, fatores_ativos)
+    validacao = st.session_state.get('ranking_precalculado_validado')
+    if validacao is None or validacao[0] != chave:
+        validacao = (chave, registro.get('assinatura') == assinatura_ranking(backlog_df, config, fatores_ativos))
+        st.session_state.ranking_precalculado_validado = validacao
+    if not validacao[1]:
+        return None
 
-    # Calcula a nota média e a contagem para cada gênero
-    afinidade_stats = df_exploded.groupby('Genero')['Minha_Nota'].agg(['mean', 'count'])
+    itens = registro.get('itens') or []
+    if isinstance(itens, str):
+        itens = json.loads(itens)
+    indice_ids = pd.Index(backlog_df['ID'])
+    posicoes = indice_ids.get_indexer([item['id'] for item in itens]) if indice_ids.is_unique else np.array([-1])
+    if (posicoes < 0).any():
+        return None
+    df_top = backlog_df.iloc[posicoes].reset_index(drop=True).assign(
+        Pontuacao_Final=[item['pontuacao'] for item in itens],
+        Progresso_Perc=[item['progresso'] for item in itens],
+        Custo_PL=[item['custo_pl'] for item in itens],
+    )
+    return df_top, int(registro.get('total_itens', len(df_top)))
 
-    # Calcula a pontuação de afinidade
-    # Fórmula: (Nota Média - Limiar) * Contagem
-    limiar_nota = 7.0
-    afinidade_stats['Pontuacao_Afinidade'] = (afinidade_stats['mean'] - limiar_nota) * afinidade_stats['count']
 
-    # Filtra apenas gêneros com afinidade positiva e retorna como dicionário
-    afinidades_positivas = afinidade_stats[afinidade_stats['Pontuacao_Afinidade'] > 0]
-    
-    return afinidades_positivas['Pontuacao_Afinidade'].to_dict()
 
 def verificar_conquistas(backlog_df, config, item_id=None):
     """Verifica e atualiza o status das conquistas."""
@@ -287,7 +493,7 @@ def verificar_conquistas(backlog_df, config, item_id=None):
             item = item_finalizado_query.iloc[0]
             
             # Hype Train: Finalize um item que tinha Hype 10.
-            if item['Meu_Hype'] == 10 and item['Status'] == 'Finalizado':
+            if inteiro_ou_padrao(item['Meu_Hype']) == 10 and item['Status'] == 'Finalizado':
                 desbloquear_conquista('hype_train')
 
             # Arqueólogo: Finalize um item que está há mais de 1 ano no backlog.
@@ -296,7 +502,7 @@ def verificar_conquistas(backlog_df, config, item_id=None):
                 desbloquear_conquista('arqueologo')
             
             # Crítico Exigente: Dê nota 3 ou inferior para um item.
-            if item['Minha_Nota'] > 0 and item['Minha_Nota'] <= 3:
+            if 0 < inteiro_ou_padrao(item['Minha_Nota']) <= 3:
                 notas_baixas = backlog_df[backlog_df['Minha_Nota'].between(1, 3, inclusive='both')].shape[0]
                 if notas_baixas >= 3:
                     desbloquear_conquista('critico_exigente')
@@ -319,12 +525,7 @@ def gerar_conquistas_dinamicas(backlog_df, config):
     conquistas_atuais = config.get('conquistas', {})
 
     # --- 1. Geração por GÊNERO (com lógica de tags) ---
-    generos_df = backlog_df[['Genero']].copy()
-    generos_df.dropna(subset=['Genero'], inplace=True)
-    generos_df['Genero'] = generos_df['Genero'].astype(str)
-    
-    generos_exploded = generos_df.assign(Genero=generos_df['Genero'].str.split(',')).explode('Genero')
-    generos_comuns = generos_exploded['Genero'].str.strip().value_counts()
+    generos_comuns = indice_generos(backlog_df).contagem()
     
     for genero, contagem in generos_comuns[generos_comuns >= 5].items():
         chave_conquista = f"genero_expert_{genero.lower().replace(' ', '_').replace('-', '_')}"
@@ -375,9 +576,90 @@ def gerar_conquistas_dinamicas(backlog_df, config):
 
 
 
+# --- Avisos das buscas online ---
+def avisar(avisos, nivel, mensagem, **kwargs):
+    """Exibe a mensagem com st.<nivel> ('error', 'warning' ou 'toast') ou, se a busca roda fora da thread do script, a guarda em avisos."""
+    if avisos is None:
+        getattr(st, nivel)(mensagem, **kwargs)
+    else:
+        avisos.append((nivel, mensagem, kwargs))
+
+def exibir_avisos(avisos, niveis=("error", "warning", "toast")):
+    """Exibe na thread do script os avisos guardados pelas buscas; mensagens repetidas aparecem uma vez."""
+    exibidos = set()
+    for nivel, mensagem, kwargs in avisos:
+        if nivel in niveis and (nivel, mensagem) not in exibidos:
+            exibidos.add((nivel, mensagem))
+            getattr(st, nivel)(mensagem, **kwargs)
+
+# --- Durações do HowLongToBeat ---
+# Buscas simultâneas no HLTB, compartilhadas por todas as sessões
+MAX_BUSCAS_HLTB_PARALELAS = 20
+# Buscas simultâneas de uma sessão (os até 5 resultados de uma busca no IGDB): uma sessão no modo
+# "Em Lote" não ocupa o pool inteiro
+MAX_BUSCAS_HLTB_POR_SESSAO = 5
+# Tempo máximo de cada busca, contado de quando ela começa a rodar; a requisição é cancelada ao estourar
+TIMEOUT_BUSCA_HLTB = 15
+# Tempo máximo que uma busca pode esperar por uma vaga da sessão e na fila do pool antes de começar
+ESPERA_MAXIMA_FILA_HLTB = 30
+# Pool do processo, sem 'with': uma busca travada não segura o rerun esperando o shutdown do executor
+_executor_hltb = ThreadPoolExecutor(max_workers=MAX_BUSCAS_HLTB_PARALELAS, thread_name_prefix="hltb")
+
+def limite_hltb_sessao():
+    """Semáforo das buscas no HLTB da sessão atual. Só pode ser chamada na thread do script."""
+    if 'limite_hltb' not in st.session_state:
+        st.session_state.limite_hltb = threading.BoundedSemaphore(MAX_BUSCAS_HLTB_POR_SESSAO)
+    return st.session_state.limite_hltb
+
+def _duracao_hltb(nome_jogo, inicio):
+    """Duração Completionist (horas) do primeiro resultado do HLTB; 0 se não houver."""
+    inicio.momento = time.monotonic()
+    inicio.set()
+    # A busca síncrona da biblioteca espera até 60 s por requisição; a assíncrona pode ser cancelada no timeout
+    hltb_results = asyncio.run(asyncio.wait_for(HowLongToBeat().async_search(nome_jogo), TIMEOUT_BUSCA_HLTB))
+    if hltb_results:
+        duracao_str = str(hltb_results[0].completionist).replace('½', '.5')
+        if duracao_str and duracao_str != "0":
+            return round(float(duracao_str))
+    return 0
+
+def buscar_duracoes_hltb(nomes_jogos, limite_hltb=None):
+    """
+    Busca a duração de vários jogos no HLTB ao mesmo tempo. Retorna as durações na ordem de nomes_jogos,
+    com None para as buscas que falharam, passaram de TIMEOUT_BUSCA_HLTB depois de começar ou não
+    começaram em ESPERA_MAXIMA_FILA_HLTB.
+    limite_hltb é o semáforo da sessão (limite_hltb_sessao()); fora da thread do script, quem chama o repassa.
+    Os toasts ficam com quem chama: st.toast não funciona fora da thread do script.
+    """
+    limite_hltb = limite_hltb if limite_hltb is not None else limite_hltb_sessao()
+    limite_fila = time.monotonic() + ESPERA_MAXIMA_FILA_HLTB
+    inicios, futuros = [], []
+    for nome in nomes_jogos:
+        inicio = threading.Event()
+        if limite_hltb.acquire(timeout=max(0.0, limite_fila - time.monotonic())):
+            futuro = _executor_hltb.submit(_duracao_hltb, nome, inicio)
+            futuro.add_done_callback(lambda _: limite_hltb.release())
+        else:
+            futuro = None
+        inicios.append(inicio)
+        futuros.append(futuro)
+    duracoes = []
+    for futuro, inicio in zip(futuros, inicios):
+        try:
+            if futuro is None or not inicio.wait(timeout=max(0.0, limite_fila - time.monotonic())):
+                raise TimeoutError
+            duracoes.append(futuro.result(timeout=max(0.0, inicio.momento + TIMEOUT_BUSCA_HLTB - time.monotonic())))
+        except Exception:
+            if futuro is not None:
+                futuro.cancel()
+            duracoes.append(None)
+    return duracoes
+
+URL_API_IGDB = "https://api.igdb.com/v4/"
+
 # Substitua a função buscar_dados_online_combinado no seu código por esta:
 
-def buscar_dados_online_combinado(titulo_jogo, config_api):
+def buscar_dados_online_combinado(titulo_jogo, config_api, limite_hltb=None, avisos=None):
     """
     Busca dados de um jogo em múltiplas APIs (IGDB e HowLongToBeat) e combina os resultados.
     Prioriza a nota do Metacritic, usando a nota agregada como fallback.
@@ -386,32 +668,35 @@ def buscar_dados_online_combinado(titulo_jogo, config_api):
     client_secret = config_api.get("igdb_client_secret")
 
     if not client_id or "COLE_SEU" in client_id or not client_secret or "COLE_SEU" in client_secret:
-        st.error("As chaves da API do IGDB não foram configuradas no arquivo config.json.")
+        avisar(avisos, "error", "As chaves da API do IGDB não foram configuradas no arquivo config.json.")
         return None
 
     try:
-        r = requests.post(f"https://id.twitch.tv/oauth2/token?client_id={client_id}&client_secret={client_secret}&grant_type=client_credentials" )
-        r.raise_for_status()
-        access_token = r.json()['access_token']
-        wrapper = IGDBWrapper(client_id, access_token)
+        access_token = obter_token_twitch(client_id, client_secret)
 
         # --- ALTERAÇÃO 1: Adicionamos 'metacritic' ao campo de busca ---
         query_fields = "fields name, cover.url, genres.name, involved_companies.company.name, involved_companies.developer, aggregated_rating, websites.category, websites.url; "
         # O campo 'websites' contém a URL do Metacritic. 13 é a categoria para Metacritic.
-        byte_array = wrapper.api_request(
-            'games',
-            f'search "{titulo_jogo}"; {query_fields} limit 5;'
-        )
+        consulta = f'search "{titulo_jogo}"; {query_fields} limit 5;'
+        r = requisitar("igdb", "POST", URL_API_IGDB + "games", headers={"Client-ID": client_id, "Authorization": f"Bearer {access_token}"}, data=consulta)
+        if r.status_code == 401:
+            # Token revogado antes do prazo: descarta o token em cache e tenta uma vez com um novo
+            invalidar_token_twitch(client_id, access_token)
+            access_token = obter_token_twitch(client_id, client_secret)
+            r = requisitar("igdb", "POST", URL_API_IGDB + "games", headers={"Client-ID": client_id, "Authorization": f"Bearer {access_token}"}, data=consulta)
+        r.raise_for_status()
+        byte_array = r.content
         resultados_igdb = json.loads(byte_array)
 
         if not resultados_igdb:
-            st.warning(f"Nenhum resultado encontrado para '{titulo_jogo}' no IGDB.")
-            return None
+            avisar(avisos, "warning", f"Nenhum resultado encontrado para '{titulo_jogo}' no IGDB.")
+            return []
 
-        st.toast(f"Buscando duração para '{titulo_jogo}' no HowLongToBeat...")
+        avisar(avisos, "toast", f"Buscando duração para '{titulo_jogo}' no HowLongToBeat...")
         
+        duracoes_hltb = buscar_duracoes_hltb([jogo_igdb.get('name', '') for jogo_igdb in resultados_igdb], limite_hltb)
         resultados_combinados = []
-        for jogo_igdb in resultados_igdb:
+        for jogo_igdb, duracao_hltb in zip(resultados_igdb, duracoes_hltb):
             jogo_combinado = jogo_igdb.copy()
             
             # --- ALTERAÇÃO 2: Lógica para extrair a nota do Metacritic ---
@@ -430,40 +715,37 @@ def buscar_dados_online_combinado(titulo_jogo, config_api):
 
             jogo_combinado['nota_final'] = round(jogo_igdb.get('aggregated_rating', 0 ))
 
-            # --- Lógica do HLTB (sem alterações) ---
-            jogo_combinado['duracao_hltb'] = 0
-            try:
-                hltb_results = HowLongToBeat().search(jogo_igdb['name'])
-                if hltb_results:
-                    duracao_str = str(hltb_results[0].completionist).replace('½', '.5')
-                    if duracao_str and duracao_str != "0":
-                        jogo_combinado['duracao_hltb'] = round(float(duracao_str))
-                        st.toast(f"HLTB: Duração para '{jogo_igdb['name']}' encontrada: {jogo_combinado['duracao_hltb']}h")
-            except Exception as e:
-                st.toast(f"HLTB: Não foi possível buscar a duração para '{jogo_igdb['name']}'.", icon="⚠️")
+            # --- Duração do HLTB (buscada em paralelo acima; None = erro ou tempo esgotado) ---
+            jogo_combinado['duracao_hltb'] = duracao_hltb or 0
+            # Duração 0 por falha do HLTB, não por ausência: o cache de metadados guarda por pouco tempo
+            jogo_combinado['incompleto'] = duracao_hltb is None
+            if duracao_hltb is None:
+                avisar(avisos, "toast", f"HLTB: Não foi possível buscar a duração para '{jogo_igdb.get('name')}'.", icon="⚠️")
+            elif duracao_hltb:
+                avisar(avisos, "toast", f"HLTB: Duração para '{jogo_igdb['name']}' encontrada: {duracao_hltb}h")
             
             resultados_combinados.append(jogo_combinado)
 
         return resultados_combinados
 
     except requests.exceptions.RequestException as e:
-        st.error(f"Erro de autenticação com a Twitch/IGDB: {e}")
+        avisar(avisos, "error", f"Erro de autenticação com a Twitch/IGDB: {e}")
         return None
     except Exception as e:
-        st.error(f"Ocorreu um erro inesperado ao buscar dados online: {e}")
+        avisar(avisos, "error", f"Ocorreu um erro inesperado ao buscar dados online: {e}")
         return None
 
 # Substitua também a função buscar_dados_igdb_com_confirmacao por esta versão atualizada
 # para que ela use a nova lógica de nota e passe os dados corretamente para a UI.
 
-def buscar_dados_igdb_com_confirmacao(titulo_jogo, config_api):
+def buscar_dados_igdb_com_confirmacao(titulo_jogo, config_api, limite_hltb=None, avisos=None):
     """
     Função unificada para buscar no IGDB e HLTB, e formatar para a UI.
     """
-    resultados_combinados = buscar_dados_online_combinado(titulo_jogo, config_api)
+    resultados_combinados = buscar_dados_online_combinado(titulo_jogo, config_api, limite_hltb, avisos)
     
     if not resultados_combinados:
-        return None
+        return resultados_combinados # None (erro) ou [] (não encontrado)
 
     # Formata os dados para a UI, usando a nova 'nota_final'
     dados_formatados = []
@@ -482,34 +764,35 @@ def buscar_dados_igdb_com_confirmacao(titulo_jogo, config_api):
             'desenvolvedoras': desenvolvedoras,
             'nota_agregada': jogo.get('nota_final', 0), # <-- Usando a nota final calculada
             'duracao_hltb': jogo.get('duracao_hltb', 0),
+            'incompleto': jogo.get('incompleto', False),
             'plataformas': [] # IGDB não fornece plataformas de forma simples nesta query
         })
     return dados_formatados
 
-def buscar_dados_tmdb(titulo, tipo, api_key):
+def buscar_dados_tmdb(titulo, tipo, api_key, avisos=None):
     """Busca dados de Filmes ou Séries na API do The Movie Database (TMDb)."""
     if not api_key or "COLE_SUA_CHAVE" in api_key:
-        st.error("A chave da API do TMDb não foi configurada no arquivo config.json.")
+        avisar(avisos, "error", "A chave da API do TMDb não foi configurada no arquivo config.json.")
         return None
 
     tipo_busca = 'movie' if tipo == 'Filme' else 'tv'
-    url = f"https://api.themoviedb.org/3/search/{tipo_busca}?api_key={api_key}&query={titulo}&language=pt-BR"
+    url = f"https://api.themoviedb.org/3/search/{tipo_busca}"
     
     try:
-        response = requests.get(url )
+        response = requisitar("tmdb", "GET", url, params={"api_key": api_key, "query": titulo, "language": "pt-BR"})
         response.raise_for_status()
         resultados = response.json().get('results', [])
         
         if not resultados:
-            st.warning(f"Nenhum resultado para '{titulo}' encontrado no TMDb.")
-            return None
+            avisar(avisos, "warning", f"Nenhum resultado para '{titulo}' encontrado no TMDb.")
+            return []
         
         # Pega o primeiro e mais relevante resultado
         item = resultados[0]
         
         # Busca detalhes para obter mais informações (gêneros, duração)
-        details_url = f"https://api.themoviedb.org/3/{tipo_busca}/{item['id']}?api_key={api_key}&language=pt-BR"
-        details_response = requests.get(details_url )
+        details_url = f"https://api.themoviedb.org/3/{tipo_busca}/{item['id']}"
+        details_response = requisitar("tmdb", "GET", details_url, params={"api_key": api_key, "language": "pt-BR"})
         details_response.raise_for_status()
         detalhes = details_response.json()
 
@@ -529,25 +812,25 @@ def buscar_dados_tmdb(titulo, tipo, api_key):
         return [dados_formatados] # Retorna em uma lista para manter o padrão
 
     except requests.exceptions.RequestException as e:
-        st.error(f"Erro ao conectar com a API do TMDb: {e}")
+        avisar(avisos, "error", f"Erro ao conectar com a API do TMDb: {e}")
         return None
 
-def buscar_dados_google_books(titulo, api_key):
+def buscar_dados_google_books(titulo, api_key, avisos=None):
     """Busca dados de Livros na API do Google Books."""
     if not api_key or "COLE_SUA_CHAVE" in api_key:
-        st.error("A chave da API do Google Books não foi configurada no arquivo config.json.")
+        avisar(avisos, "error", "A chave da API do Google Books não foi configurada no arquivo config.json.")
         return None
 
-    url = f"https://www.googleapis.com/books/v1/volumes?q={titulo}&key={api_key}"
+    url = "https://www.googleapis.com/books/v1/volumes"
     
     try:
-        response = requests.get(url )
+        response = requisitar("google_books", "GET", url, params={"q": titulo, "key": api_key})
         response.raise_for_status()
         resultados = response.json().get('items', [])
 
         if not resultados:
-            st.warning(f"Nenhum resultado para '{titulo}' encontrado no Google Books.")
-            return None
+            avisar(avisos, "warning", f"Nenhum resultado para '{titulo}' encontrado no Google Books.")
+            return []
 
         # Pega o primeiro e mais relevante resultado
         item = resultados[0]['volumeInfo']
@@ -564,19 +847,57 @@ def buscar_dados_google_books(titulo, api_key):
         return [dados_formatados] # Retorna em uma lista para manter o padrão
 
     except requests.exceptions.RequestException as e:
-        st.error(f"Erro ao conectar com a API do Google Books: {e}")
+        avisar(avisos, "error", f"Erro ao conectar com a API do Google Books: {e}")
         return None
 
-def buscar_dados_online_geral(titulo, tipo, config_api):
-    """Função orquestradora que chama a API correta com base no tipo de mídia."""
+def buscar_dados_online_geral(titulo, tipo, config_api, limite_hltb=None, avisos=None):
+    """
+    Função orquestradora que chama a API correta com base no tipo de mídia.
+    Passa pelo cache persistente de metadados: títulos já buscados (inclusive por outros usuários) não vão à rede.
+    Retorna a lista de resultados, [] quando nada foi encontrado ou None em caso de erro.
+    """
+    return buscar_com_cache(titulo, tipo, lambda: _buscar_dados_online_provedor(titulo, tipo, config_api, limite_hltb, avisos), avisos)
+
+# Buscas simultâneas por provedor no modo "Em Lote" (o IGDB limita a 4 requisições por segundo)
+LIMITE_BUSCAS_POR_PROVEDOR = {"igdb": 4, "tmdb": 8, "google_books": 4}
+LIMITE_BUSCAS_PADRAO = 4
+
+def _buscar_no_lote(titulo, tipo, config_api, limite_hltb):
+    # Roda fora da thread do script, onde st.error/st.toast não chegam à tela: os avisos voltam como dados
+    avisos = []
+    try:
+        return buscar_dados_online_geral(titulo, tipo, config_api, limite_hltb, avisos), avisos
+    except Exception as e:
+        avisos.append(("error", f"Erro inesperado ao buscar '{titulo}': {e}", {}))
+        return None, avisos
+
+def buscar_dados_online_lote(titulos, tipo, config_api):
+    """
+    Busca vários títulos ao mesmo tempo, respeitando o limite do provedor do tipo.
+    Gera (titulo, resultados, avisos) na ordem em que as buscas terminam; resultados é None se a busca falhou.
+    As buscas rodam fora da thread do script: quem consome o gerador exibe os avisos com exibir_avisos.
+    """
+    limite = LIMITE_BUSCAS_POR_PROVEDOR.get(PROVEDOR_POR_TIPO.get(tipo), LIMITE_BUSCAS_PADRAO)
+    limite_hltb = limite_hltb_sessao()
+    executor = ThreadPoolExecutor(max_workers=limite, thread_name_prefix="busca-lote")
+    try:
+        futuros = {executor.submit(_buscar_no_lote, titulo, tipo, config_api, limite_hltb): titulo for titulo in titulos}
+        for futuro in as_completed(futuros):
+            resultados, avisos = futuro.result()
+            yield futuros[futuro], resultados, avisos
+    finally:
+        # Se o rerun for interrompido, as buscas que ainda não começaram são descartadas
+        executor.shutdown(wait=False, cancel_futures=True)
+
+def _buscar_dados_online_provedor(titulo, tipo, config_api, limite_hltb=None, avisos=None):
     if tipo == "Jogo":
-        return buscar_dados_igdb_com_confirmacao(titulo, config_api)
+        return buscar_dados_igdb_com_confirmacao(titulo, config_api, limite_hltb, avisos)
     elif tipo in ["Filme", "Série", "Anime"]: # Anime é buscado como 'tv' no TMDb
-        return buscar_dados_tmdb(titulo, tipo, config_api.get('tmdb_api_key'))
+        return buscar_dados_tmdb(titulo, tipo, config_api.get('tmdb_api_key'), avisos)
     elif tipo == "Livro":
-        return buscar_dados_google_books(titulo, config_api.get('google_books_api_key'))
+        return buscar_dados_google_books(titulo, config_api.get('google_books_api_key'), avisos)
     else:
-        st.warning(f"A busca online ainda não está implementada para o tipo '{tipo}'.")
+        avisar(avisos, "warning", f"A busca online ainda não está implementada para o tipo '{tipo}'.")
         return None
 
 def analisar_backlog_para_acoes(backlog_df):
@@ -593,9 +914,9 @@ def analisar_backlog_para_acoes(backlog_df):
 
     # Garante que colunas numéricas sejam tratadas como tal
     numeric_cols = ['Nota_Externa', 'Duracao', 'Progresso_Atual', 'Minha_Nota']
-    for col in numeric_cols:
-        df[col] = pd.to_numeric(df[col], errors='coerce').fillna(0)
+    como_numerico(df, numeric_cols)
 
+    tem_capa = 'Cover_URL' in df.columns
     for index, item in df.iterrows():
         motivos = []
         
@@ -605,7 +926,8 @@ def analisar_backlog_para_acoes(backlog_df):
 
         # Ação 1: Dados básicos incompletos (para itens que não são desejos)
         if item['Status'] != 'Desejo':
-            if pd.isnull(item.get('Cover_URL')) or item.get('Cover_URL') == '':
+            # Cover_URL só é verificada quando já foi carregada (ver garantir_colunas_pesadas)
+            if tem_capa and (pd.isnull(item.get('Cover_URL')) or item.get('Cover_URL') == ''):
                 motivos.append("Falta a imagem da capa.")
             if item['Duracao'] == 0:
                 motivos.append("Duração não preenchida.")
@@ -651,7 +973,7 @@ def sincronizar_retroachievements(config, backlog_df):
         # 1. Obter a lista de jogos que o usuário jogou
         url_user_progress = f"{base_url}/API_GetUserProgress.php"
         params = {**auth_params, "u": ra_user}
-        response = requests.get(url_user_progress, params=params )
+        response = requisitar("retroachievements", "GET", url_user_progress, params=params)
         response.raise_for_status()
         user_progress = response.json()
 
@@ -675,7 +997,7 @@ def sincronizar_retroachievements(config, backlog_df):
             # 3. Obter detalhes das conquistas para o jogo
             url_game_progress = f"{base_url}/API_GetGameInfoAndUserProgress.php"
             params_game = {**auth_params, "u": ra_user, "g": game_id}
-            game_response = requests.get(url_game_progress, params=params_game)
+            game_response = requisitar("retroachievements", "GET", url_game_progress, params=params_game)
             game_response.raise_for_status()
             game_details = game_response.json()
 
@@ -752,25 +1074,22 @@ def ui_componente_hall_of_fame(backlog_df):
         df_display.columns = ["Título", "Minha Nota"]
         st.dataframe(df_display, hide_index=True, use_container_width=True)
 
+# Itens exibidos no ranking antes de o usuário pedir a lista completa
+ITENS_RANKING_VISIVEIS = 50
+
 def ui_aba_ranking(backlog_df, config):
     st.header("Seu Próximo Entretenimento Será...")
 
     st.subheader("Fatores do Ranking")
     
     # --- LÓGICA DE INICIALIZAÇÃO CORRIGIDA E ROBUSTA ---
-    # Define o dicionário padrão com todas as chaves esperadas
-    fatores_padrao = {
-        "Meu_Hype": True, "Nota_Externa": True, "Afinidade_Genero": True,
-        "Fator_Continuidade": True, "Progresso": True, "Antiguidade": True, "Duracao": True,
-        "Bonus_Catchup": True
-    }
-
-    # Se o dicionário não existir na sessão, cria-o
+    # O dicionário padrão, com todas as chaves esperadas, é o FATORES_PADRAO do motor de ranking.
+    # Se o dicionário não existir na sessão, cria-o (cópia: os toggles abaixo alteram o da sessão)
     if 'fatores_ranking' not in st.session_state:
-        st.session_state.fatores_ranking = fatores_padrao
+        st.session_state.fatores_ranking = dict(FATORES_PADRAO)
     else:
         # Se o dicionário já existe, verifica se falta alguma chave (como a nova 'Bonus_Catchup')
-        for chave, valor_padrao in fatores_padrao.items():
+        for chave, valor_padrao in FATORES_PADRAO.items():
             if chave not in st.session_state.fatores_ranking:
                 st.session_state.fatores_ranking[chave] = valor_padrao
 
@@ -788,31 +1107,52 @@ def ui_aba_ranking(backlog_df, config):
     
     st.divider()
 
-    df_ranqueado = calcular_ranking(backlog_df, config, st.session_state.fatores_ranking)
-    
-    df_filtrado = df_ranqueado.copy()
-    
-    if 'tipo_filtro' in st.session_state and st.session_state.tipo_filtro != "Todos": 
-        df_filtrado = df_filtrado[df_filtrado['Tipo'] == st.session_state.tipo_filtro]
-    if 'status_filtro' in st.session_state and st.session_state.status_filtro != "Todos": 
-        df_filtrado = df_filtrado[df_filtrado['Status'] == st.session_state.status_filtro]
-    
-    if 'genero_filtro' in st.session_state and st.session_state.genero_filtro != "Todos":
-        genero_selecionado = st.session_state.genero_filtro
-        mascara_genero = df_filtrado['Genero'].str.split(',').apply(
-            lambda lista_generos: genero_selecionado in [g.strip() for g in lista_generos] if isinstance(lista_generos, list) else False
-        )
-        df_filtrado = df_filtrado[mascara_genero]
+    termo_busca = st.text_input("🔍 Pesquisar por Título", key="search_ranking")
+    ver_lista_completa = st.toggle("Mostrar lista completa", key="ranking_lista_completa")
+    filtros_ativos = bool(termo_busca) or any(
+        st.session_state.get(chave, "Todos") != "Todos" for chave in ("tipo_filtro", "status_filtro", "genero_filtro", "autor_filtro")
+    )
 
-    if 'autor_filtro' in st.session_state and st.session_state.autor_filtro != "Todos": 
-        df_filtrado = df_filtrado[df_filtrado['Autor'] == st.session_state.autor_filtro]
+    # Primeiro carregamento: usa o Top N gravado pelo job em lote (se ainda valer) em vez de pontuar o backlog inteiro
+    precalculado = None
+    if not filtros_ativos and not ver_lista_completa and not ranking_em_cache(config, fatores):
+        precalculado = ranking_precalculado(backlog_df, config, fatores)
 
-    termo_busca = st.text_input("🔍 Pesquisar por Título", key="search_ranking")
-    if termo_busca:
-        df_filtrado = df_filtrado[df_filtrado['Titulo'].str.contains(termo_busca, case=False, na=False)]
+    if precalculado is not None:
+        df_ranqueado, total_filtrado = precalculado
+        df_ranqueado = df_ranqueado.head(ITENS_RANKING_VISIVEIS)
+        top_10 = df_ranqueado.head(10)
+    else:
+        df_pontuado = pontuar_backlog_cacheado(backlog_df, config, fatores)
+
+        # Os filtros criam novos DataFrames; o resultado em cache não é alterado
+        df_filtrado = df_pontuado
+
+        if 'tipo_filtro' in st.session_state and st.session_state.tipo_filtro != "Todos": 
+            df_filtrado = df_filtrado[df_filtrado['Tipo'] == st.session_state.tipo_filtro]
+        if 'status_filtro' in st.session_state and st.session_state.status_filtro != "Todos": 
+            df_filtrado = df_filtrado[df_filtrado['Status'] == st.session_state.status_filtro]
+
+        if 'genero_filtro' in st.session_state and st.session_state.genero_filtro != "Todos":
+            genero_selecionado = st.session_state.genero_filtro
+            # df_pontuado mantém os rótulos de backlog_df, então o índice de gêneros do backlog serve aqui
+            df_filtrado = df_filtrado[indice_generos(backlog_df).contem(genero_selecionado, df_filtrado.index)]
+
+        if 'autor_filtro' in st.session_state and st.session_state.autor_filtro != "Todos": 
+            df_filtrado = df_filtrado[df_filtrado['Autor'] == st.session_state.autor_filtro]
 
-    if not df_filtrado.empty:
-        df_display = df_filtrado.copy()
+        if termo_busca:
+            df_filtrado = df_filtrado[df_filtrado['Titulo'].str.contains(termo_busca, case=False, na=False)]
+
+        # Só os primeiros itens são ordenados; a lista completa é ordenada apenas quando pedida
+        total_filtrado = len(df_filtrado)
+        df_ranqueado = ordenar_ranking(df_filtrado, None if ver_lista_completa else ITENS_RANKING_VISIVEIS)
+        top_10 = ordenar_ranking(df_pontuado, 10)
+
+    if not df_ranqueado.empty:
+        if len(df_ranqueado) < total_filtrado:
+            st.caption(f"Mostrando os {len(df_ranqueado)} primeiros de {total_filtrado} itens.")
+        df_display = df_ranqueado.copy()
         df_display.insert(0, 'Posição', range(1, len(df_display) + 1))
 
         nomes_colunas = {
@@ -841,7 +1181,7 @@ def ui_aba_ranking(backlog_df, config):
 
     st.divider()
     st.header("Ações Rápidas")
-    top_10_desejo = df_ranqueado[(df_ranqueado['Status'] == 'Desejo') & (df_ranqueado.index < 10)]
+    top_10_desejo = top_10[top_10['Status'] == 'Desejo']
     if not top_10_desejo.empty:
         st.subheader("Liberar Compra de Item Desejado (Top 10)")
         item_para_liberar = st.selectbox("Selecione o item", top_10_desejo['Titulo'])
@@ -854,6 +1194,7 @@ def ui_aba_ranking(backlog_df, config):
                 st.session_state.config['pontos_liberacao'] -= custo
                 idx = st.session_state.backlog_df[st.session_state.backlog_df['ID'] == item_selecionado['ID']].index
                 st.session_state.backlog_df.loc[idx, 'Status'] = 'No Backlog'
+                atualizar_estoque_fatores([item_selecionado['ID']])
                 salvar_dados(st.session_state.backlog_df, ARQUIVO_BACKLOG)
                 salvar_config(st.session_state.config)
                 st.success(f"'{item_selecionado['Titulo']}' liberado!")
@@ -872,6 +1213,8 @@ def ui_aba_ranking(backlog_df, config):
 
 
 def ui_aba_estante(backlog_df):
+    if garantir_colunas_pesadas(TABELA_BACKLOG):
+        backlog_df = st.session_state.backlog_df
     st.header("📚 Minha Estante Virtual")
     st.info("Aqui estão todos os itens que você já finalizou. Parabéns!")
     
@@ -887,7 +1230,7 @@ def ui_aba_estante(backlog_df):
         tipo_filtro = st.selectbox("Filtrar por Tipo", tipos, key="estante_tipo")
     with c2:
         # Garante que a coluna de data de finalização seja do tipo datetime
-        df_finalizados['Data_Finalizacao_dt'] = pd.to_datetime(df_finalizados['Data_Finalizacao'], errors='coerce')
+        df_finalizados['Data_Finalizacao_dt'] = como_data(df_finalizados['Data_Finalizacao'])
         anos = ["Todos"] + sorted(df_finalizados['Data_Finalizacao_dt'].dt.year.dropna().unique().astype(int).tolist(), reverse=True)
         ano_filtro = st.selectbox("Filtrar por Ano de Finalização", anos, key="estante_ano")
     with c3:
@@ -963,9 +1306,10 @@ def ui_aba_dashboard(backlog_df):
         st.warning("Seu backlog está vazio. Adicione itens para ver as estatísticas.")
         return
 
+    indice = indice_generos(backlog_df)
     df_finalizados = backlog_df[backlog_df['Status'] == 'Finalizado'].copy()
-    df_finalizados['Data_Adicao'] = pd.to_datetime(df_finalizados['Data_Adicao'], errors='coerce')
-    df_finalizados['Data_Finalizacao'] = pd.to_datetime(df_finalizados['Data_Finalizacao'], errors='coerce')
+    df_finalizados['Data_Adicao'] = como_data(df_finalizados['Data_Adicao'])
+    df_finalizados['Data_Finalizacao'] = como_data(df_finalizados['Data_Finalizacao'])
     
     tempo_para_finalizar = (df_finalizados['Data_Finalizacao'] - df_finalizados['Data_Adicao']).dt.days
     tempo_medio_finalizar = tempo_para_finalizar.mean()
@@ -991,7 +1335,7 @@ def ui_aba_dashboard(backlog_df):
         
         # --- NOVA SEÇÃO DE AFINIDADE DE GÊNERO ---
         st.write("**Seus Gêneros Favoritos (por Afinidade)**", help="Calculado com base nos gêneros que você finaliza e avalia bem (nota >= 7). Mostra o que você realmente mais gosta!")
-        afinidades = calcular_afinidade_genero(backlog_df)
+        afinidades = calcular_afinidade_genero(backlog_df, indice)
         if afinidades:
             # Converte o dicionário para um DataFrame para facilitar a plotagem
             df_afinidade_plot = pd.DataFrame(list(afinidades.items()), columns=['Gênero', 'Pontuação de Afinidade'])
@@ -1005,10 +1349,10 @@ def ui_aba_dashboard(backlog_df):
         c1, c2 = st.columns(2)
         with c1:
             st.write("**Itens por Status**")
-            st.bar_chart(backlog_df['Status'].value_counts())
+            st.bar_chart(backlog_df['Status'].value_counts().loc[lambda contagem: contagem > 0])
         with c2:
             st.write("**Itens por Tipo de Mídia**")
-            st.bar_chart(backlog_df['Tipo'].value_counts())
+            st.bar_chart(backlog_df['Tipo'].value_counts().loc[lambda contagem: contagem > 0])
 
         st.write("**Distribuição das suas Notas (Itens Finalizados)**")
         notas_validas = df_finalizados[df_finalizados['Minha_Nota'] > 0]['Minha_Nota']
@@ -1028,10 +1372,10 @@ def ui_aba_dashboard(backlog_df):
                 st.bar_chart(df_jogos['Autor'].value_counts().head(5))
             with c2:
                 st.write("**Top 5 Plataformas**")
-                st.bar_chart(df_jogos['Plataforma'].value_counts().head(5))
+                st.bar_chart(df_jogos['Plataforma'].value_counts().loc[lambda contagem: contagem > 0].head(5))
             st.write("**Gêneros de Jogos Mais Comuns (por quantidade)**")
-            generos_jogos = df_jogos['Genero'].dropna().str.split(',').explode().str.strip()
-            st.bar_chart(generos_jogos.value_counts().head(10))
+            generos_jogos = indice.contagem(df_jogos.index)
+            st.bar_chart(generos_jogos.head(10))
         else:
             st.info("Nenhum jogo no seu backlog para análise.")
 
@@ -1045,8 +1389,8 @@ def ui_aba_dashboard(backlog_df):
                 st.bar_chart(df_livros['Autor'].value_counts().head(5))
             with c2:
                 st.write("**Top 5 Gêneros Literários**")
-                generos_livros = df_livros['Genero'].dropna().str.split(',').explode().str.strip()
-                st.bar_chart(generos_livros.value_counts().head(5))
+                generos_livros = indice.contagem(df_livros.index)
+                st.bar_chart(generos_livros.head(5))
         else:
             st.info("Nenhum livro no seu backlog para análise.")
 
@@ -1055,8 +1399,8 @@ def ui_aba_dashboard(backlog_df):
         df_series = backlog_df[backlog_df['Tipo'] == 'Série'].copy()
         if not df_series.empty:
             st.write("**Gêneros Mais Comuns**")
-            generos_series = df_series['Genero'].dropna().str.split(',').explode().str.strip()
-            st.bar_chart(generos_series.value_counts().head(10))
+            generos_series = indice.contagem(df_series.index)
+            st.bar_chart(generos_series.head(10))
         else:
             st.info("Nenhuma série no seu backlog para análise.")
 
@@ -1065,8 +1409,8 @@ def ui_aba_dashboard(backlog_df):
         df_animes = backlog_df[backlog_df['Tipo'] == 'Anime'].copy()
         if not df_animes.empty:
             st.write("**Gêneros Mais Comuns**")
-            generos_animes = df_animes['Genero'].dropna().str.split(',').explode().str.strip()
-            st.bar_chart(generos_animes.value_counts().head(10))
+            generos_animes = indice.contagem(df_animes.index)
+            st.bar_chart(generos_animes.head(10))
         else:
             st.info("Nenhum anime no seu backlog para análise.")
 
@@ -1075,8 +1419,8 @@ def ui_aba_dashboard(backlog_df):
         df_filmes = backlog_df[backlog_df['Tipo'] == 'Filme'].copy()
         if not df_filmes.empty:
             st.write("**Gêneros Mais Comuns**")
-            generos_filmes = df_filmes['Genero'].dropna().str.split(',').explode().str.strip()
-            st.bar_chart(generos_filmes.value_counts().head(10))
+            generos_filmes = indice.contagem(df_filmes.index)
+            st.bar_chart(generos_filmes.head(10))
         else:
             st.info("Nenhum filme no seu backlog para análise.")
 
@@ -1090,8 +1434,8 @@ def ui_aba_dashboard(backlog_df):
                 st.bar_chart(df_mangas['Autor'].value_counts().head(5))
             with c2:
                 st.write("**Top 5 Gêneros/Demografias**")
-                generos_mangas = df_mangas['Genero'].dropna().str.split(',').explode().str.strip()
-                st.bar_chart(generos_mangas.value_counts().head(5))
+                generos_mangas = indice.contagem(df_mangas.index)
+                st.bar_chart(generos_mangas.head(5))
         else:
             st.info("Nenhum mangá no seu backlog para análise.")
 
@@ -1103,7 +1447,7 @@ def ui_aba_dashboard(backlog_df):
 def ui_aba_review_anual(backlog_df):
     st.header("🗓️ Meu Ano em Review")
     df_finalizados = backlog_df[backlog_df['Status'] == 'Finalizado'].copy()
-    df_finalizados['Data_Finalizacao'] = pd.to_datetime(df_finalizados['Data_Finalizacao'], errors='coerce')
+    df_finalizados['Data_Finalizacao'] = como_data(df_finalizados['Data_Finalizacao'])
     
     anos_disponiveis = sorted(df_finalizados['Data_Finalizacao'].dt.year.dropna().unique().astype(int), reverse=True)
     if not anos_disponiveis:
@@ -1163,12 +1507,12 @@ def ui_aba_review_anual(backlog_df):
     c1, c2 = st.columns(2)
     with c1:
         st.subheader("Finalizações por Tipo")
-        st.bar_chart(df_ano['Tipo'].value_counts())
+        st.bar_chart(df_ano['Tipo'].value_counts().loc[lambda contagem: contagem > 0])
     with c2:
         st.subheader("Gêneros Favoritos do Ano")
-        generos_ano = df_ano['Genero'].dropna().str.split(',').explode().str.strip()
+        generos_ano = indice_generos(backlog_df).contagem(df_ano.index)
         if not generos_ano.empty:
-            st.bar_chart(generos_ano.value_counts().head(10))
+            st.bar_chart(generos_ano.head(10))
         else:
             st.info("Nenhum gênero registrado.")
         
@@ -1254,7 +1598,7 @@ def ui_aba_sessoes(sessoes_df, backlog_df):
                     max_id_sessao = st.session_state.sessoes_df['ID_Sessao'].max() if not st.session_state.sessoes_df.empty else 0
 
                     nova_sessao = {
-                        "ID_Sessao": max_id_sessao + 1, "ID_Item": item_id, "Data": datetime.now().strftime("%Y-%m-%d"),
+                        "ID_Sessao": max_id_sessao + 1, "ID_Item": item_id, "Data": pd.Timestamp.now().normalize(),
                         "Duracao_Sessao": duracao_sessao, "Progresso_Ganho": progresso_ganho, "Notas": notas_sessao
                     }
                     
@@ -1270,6 +1614,7 @@ def ui_aba_sessoes(sessoes_df, backlog_df):
                         st.session_state.backlog_df.loc[idx_backlog, 'Status'] = 'Em Andamento'
                         st.toast("Status do item atualizado para 'Em Andamento'!")
 
+                    atualizar_estoque_fatores([item_id])
                     salvar_dados(st.session_state.backlog_df, ARQUIVO_BACKLOG)
                     
                     st.success("Sessão registrada e progresso atualizado!")
@@ -1315,7 +1660,7 @@ def ui_aba_metas(backlog_df, config):
         return
 
     df_finalizados = backlog_df[backlog_df['Status'] == 'Finalizado'].copy()
-    df_finalizados['Data_Finalizacao'] = pd.to_datetime(df_finalizados['Data_Finalizacao'])
+    df_finalizados['Data_Finalizacao'] = como_data(df_finalizados['Data_Finalizacao'])
 
     for i, meta in enumerate(config['metas']):
         df_meta = df_finalizados[df_finalizados['Data_Finalizacao'].dt.year == meta['ano']]
@@ -1370,7 +1715,87 @@ def ui_aba_conquistas(config):
             i += 1
 
 
+# Itens do modo "Em Lote" gravados a cada bloco, para não perder o que já foi buscado se o lote parar
+TAMANHO_BLOCO_LOTE = 20
+UNIDADES_POR_TIPO = {"Jogo": "Horas", "Livro": "Páginas", "Série": "Episódios", "Filme": "Minutos", "Anime": "Episódios"}
+
+def item_de_busca_online(dados, titulo, tipo, item_id):
+    """Novo item do backlog a partir do primeiro resultado de buscar_dados_online_geral."""
+    return {
+        "ID": item_id,
+        "Titulo": dados.get('titulo', titulo),
+        "Tipo": tipo,
+        "Plataforma": dados.get('plataforma', ''),
+        "Autor": dados.get('autor', ''),
+        "Genero": ", ".join(dados.get('generos', [])),
+        "Status": "No Backlog",
+        "Meu_Hype": 0,
+        "Nota_Externa": int(dados.get('nota_externa', 0)),
+        "Duracao": float(dados.get('duracao', 0)),
+        "Unidade_Duracao": UNIDADES_POR_TIPO.get(tipo, 'unidades'),
+        "Nome_Serie": "", "Ordem_Serie": 1, "Total_Serie": 1,
+        "Data_Adicao": pd.Timestamp.now().normalize(),
+        "Progresso_Atual": 0, "Progresso_Total": 1, "Minha_Nota": 0,
+        "Cover_URL": dados.get('cover_url', ''),
+        "Data_Finalizacao": pd.NaT, "Tempo_Final": 0, "Origem": "Grátis"
+    }
+
+def processar_lote_busca():
+    """
+    Busca os títulos pendentes de st.session_state.lote_em_andamento em paralelo e grava os encontrados
+    em blocos de TAMANHO_BLOCO_LOTE. Um título só sai da lista de pendentes depois de gravado (ou de não
+    ser encontrado), então um lote interrompido pode ser retomado sem repetir nem perder itens.
+    """
+    lote = st.session_state.lote_em_andamento
+    tipo, total = lote['tipo'], len(lote['pendentes'])
+    bloco, titulos_bloco, erros = [], [], []
+
+    def gravar_bloco():
+        if bloco:
+            max_id = st.session_state.backlog_df['ID'].max() if not st.session_state.backlog_df.empty else 0
+            df_bloco = pd.DataFrame([item_de_busca_online(dados, titulo, tipo, max_id + i + 1) for i, (titulo, dados) in enumerate(bloco)])
+            st.session_state.backlog_df = pd.concat([st.session_state.backlog_df, df_bloco], ignore_index=True)
+            atualizar_estoque_fatores(df_bloco['ID'])
+            salvar_dados(st.session_state.backlog_df, ARQUIVO_BACKLOG)
+            lote['adicionados'] += len(bloco)
+        concluidos = set(titulos_bloco)
+        lote['pendentes'] = [t for t in lote['pendentes'] if t not in concluidos]
+        bloco.clear()
+        titulos_bloco.clear()
+
+    progress_bar = st.progress(0, text="Buscando dados...")
+    avisos_lote = []
+    for i, (titulo, resultados, avisos) in enumerate(buscar_dados_online_lote(list(lote['pendentes']), tipo, st.session_state.config.get('api_keys', {}))):
+        progress_bar.progress((i + 1) / total, text=f"Buscados {i + 1} de {total}: {titulo}")
+        avisos_lote += avisos
+        if resultados is None:
+            erros.append(titulo) # continua pendente para "Retomar Lote"
+            continue
+        if resultados:
+            bloco.append((titulo, resultados[0]))
+        else:
+            lote['nao_encontrados'].append(titulo)
+        titulos_bloco.append(titulo)
+        if len(bloco) >= TAMANHO_BLOCO_LOTE:
+            gravar_bloco()
+    gravar_bloco()
+    progress_bar.empty()
+    # Só os erros: o progresso já aparece na barra e os não encontrados no resumo abaixo
+    exibir_avisos(avisos_lote, niveis=("error",))
+
+    st.success(f"Operação Concluída! {lote['adicionados']} item(ns) do tipo '{tipo}' adicionado(s).")
+    if lote['nao_encontrados']:
+        st.warning(f"Títulos não encontrados: {', '.join(lote['nao_encontrados'])}")
+    if erros:
+        st.error(f"Erro ao buscar {len(erros)} título(s): {', '.join(erros)}. Use 'Retomar Lote' para tentar novamente.")
+        return
+    del st.session_state['lote_em_andamento']
+    st.balloons()
+    time.sleep(2)
+    st.rerun()
+
 def ui_aba_adicionar_itens():
+    garantir_colunas_pesadas(TABELA_BACKLOG)
     st.header("Adicionar Itens")
     
     if 'add_mode' not in st.session_state:
@@ -1472,12 +1897,13 @@ def ui_aba_adicionar_itens():
                         "Nome_Serie": nome_serie if eh_serie else "", 
                         "Ordem_Serie": ordem_serie if eh_serie else 1, 
                         "Total_Serie": total_serie if eh_serie else 1,
-                        "Data_Adicao": datetime.now().strftime("%Y-%m-%d"), 
+                        "Data_Adicao": pd.Timestamp.now().normalize(), 
                         "Progresso_Atual": prog_atual, "Progresso_Total": prog_total, "Minha_Nota": 0,
                         "Cover_URL": cover_url, "Data_Finalizacao": pd.NaT, "Tempo_Final": 0, "Origem": origem_selecionada
                     }
                     novo_df = pd.DataFrame([novo_item])
                     st.session_state.backlog_df = pd.concat([st.session_state.backlog_df, novo_df], ignore_index=True)
+                    atualizar_estoque_fatores([novo_item['ID']])
                     salvar_dados(st.session_state.backlog_df, ARQUIVO_BACKLOG)
                     st.success(f"'{titulo}' foi adicionado!")
                     st.session_state.config = verificar_conquistas(st.session_state.backlog_df, st.session_state.config, item_id=novo_item['ID'])
@@ -1514,7 +1940,7 @@ def ui_aba_adicionar_itens():
                                 "Nome_Serie": nome_base, "Ordem_Serie": i, "Total_Serie": total_edicoes,
                                 "Duracao": 1 if tipo_serie == "Mangá" else 0, 
                                 "Unidade_Duracao": unidade_map.get(tipo_serie, 'unidades'),
-                                "Data_Adicao": datetime.now().strftime("%Y-%m-%d"), "Meu_Hype": 0,
+                                "Data_Adicao": pd.Timestamp.now().normalize(), "Meu_Hype": 0,
                                 "Plataforma": "", "Autor": "", "Genero": "", "Nota_Externa": 0,
                                 "Progresso_Atual": 0, "Progresso_Total": 0, "Minha_Nota": 0,
                                 "Cover_URL": "", "Data_Finalizacao": pd.NaT, "Tempo_Final": 0, "Origem": "Grátis"
@@ -1523,6 +1949,7 @@ def ui_aba_adicionar_itens():
                         
                         df_lote = pd.DataFrame(itens_para_adicionar)
                         st.session_state.backlog_df = pd.concat([st.session_state.backlog_df, df_lote], ignore_index=True)
+                        atualizar_estoque_fatores(df_lote['ID'])
                         salvar_dados(st.session_state.backlog_df, ARQUIVO_BACKLOG)
                         st.success(f"{total_edicoes} itens de '{nome_base}' adicionados!")
                         st.rerun()
@@ -1552,59 +1979,17 @@ def ui_aba_adicionar_itens():
                     st.error("Nenhum título novo para adicionar.")
                     return
 
-                itens_para_adicionar = []
-                falha = []
-                max_id = st.session_state.backlog_df['ID'].max() if not st.session_state.backlog_df.empty else 0
-                
-                progress_bar = st.progress(0, text="Buscando dados...")
-                
-                for i, titulo in enumerate(titulos_novos):
-                    progress_bar.progress((i + 1) / len(titulos_novos), text=f"Buscando: {titulo}")
-                    
-                    # 2. Usa a função de busca geral
-                    resultados = buscar_dados_online_geral(titulo, tipo_lote, st.session_state.config.get('api_keys', {}))
-                    
-                    if resultados:
-                        dados = resultados[0]
-                        max_id += 1
-                        unidade_map = {"Jogo": "Horas", "Livro": "Páginas", "Série": "Episódios", "Filme": "Minutos", "Anime": "Episódios"}
-                        
-                        # 3. Lógica de criação de item generalizada
-                        item = {
-                            "ID": max_id,
-                            "Titulo": dados.get('titulo', titulo),
-                            "Tipo": tipo_lote,
-                            "Plataforma": dados.get('plataforma', ''),
-                            "Autor": dados.get('autor', ''),
-                            "Genero": ", ".join(dados.get('generos', [])),
-                            "Status": "No Backlog",
-                            "Meu_Hype": 0,
-                            "Nota_Externa": int(dados.get('nota_externa', 0)),
-                            "Duracao": float(dados.get('duracao', 0)),
-                            "Unidade_Duracao": unidade_map.get(tipo_lote, 'unidades'),
-                            "Nome_Serie": "", "Ordem_Serie": 1, "Total_Serie": 1,
-                            "Data_Adicao": datetime.now().strftime("%Y-%m-%d"),
-                            "Progresso_Atual": 0, "Progresso_Total": 1, "Minha_Nota": 0,
-                            "Cover_URL": dados.get('cover_url', ''),
-                            "Data_Finalizacao": pd.NaT, "Tempo_Final": 0, "Origem": "Grátis"
-                        }
-                        itens_para_adicionar.append(item)
-                    else:
-                        falha.append(titulo)
-                
-                progress_bar.empty()
-                
-                if itens_para_adicionar:
-                    df_lote = pd.DataFrame(itens_para_adicionar)
-                    st.session_state.backlog_df = pd.concat([st.session_state.backlog_df, df_lote], ignore_index=True)
-                    salvar_dados(st.session_state.backlog_df, ARQUIVO_BACKLOG)
-                
-                sucesso = len(itens_para_adicionar)
-                st.success(f"Operação Concluída! {sucesso} item(ns) do tipo '{tipo_lote}' adicionado(s).")
-                if falha:
-                    st.warning(f"Títulos não encontrados: {', '.join(falha)}")
-                st.balloons()
-                time.sleep(2)
+                st.session_state.lote_em_andamento = {"tipo": tipo_lote, "pendentes": titulos_novos, "adicionados": 0, "nao_encontrados": []}
+                processar_lote_busca()
+
+        lote = st.session_state.get('lote_em_andamento')
+        if lote and lote['pendentes']:
+            st.warning(f"Há um lote de '{lote['tipo']}' interrompido: {len(lote['pendentes'])} título(s) ainda não adicionado(s) ({lote['adicionados']} já foram).")
+            col_retomar, col_descartar = st.columns(2)
+            if col_retomar.button("Retomar Lote", use_container_width=True):
+                processar_lote_busca()
+            if col_descartar.button("Descartar Lote", use_container_width=True):
+                del st.session_state['lote_em_andamento']
                 st.rerun()
 
 
@@ -1613,6 +1998,9 @@ def ui_aba_adicionar_itens():
 
 
 def ui_aba_gerenciar(backlog_df):
+    # Sem Cover_URL carregada, o formulário mostraria a capa vazia e a gravaria por cima da do banco
+    if garantir_colunas_pesadas(TABELA_BACKLOG):
+        backlog_df = st.session_state.backlog_df
     st.header("Gerenciar Item do Backlog")
     if backlog_df.empty:
         st.info("Seu backlog está vazio.")
@@ -1634,7 +2022,7 @@ def ui_aba_gerenciar(backlog_df):
             status_opts = ["No Backlog", "Em Andamento", "Finalizado", "Desejo", "Arquivado"]
             novo_status = st.selectbox("Status", status_opts, index=status_opts.index(item_original['Status']))
             
-            novo_hype = st.slider("Meu Hype", 0, 10, int(item_original.get('Meu_Hype', 0)))
+            novo_hype = st.slider("Meu Hype", 0, 10, inteiro_ou_padrao(item_original.get('Meu_Hype')))
             
             nova_minha_nota = item_original.get('Minha_Nota', 0)
             novo_tempo_final = item_original.get('Tempo_Final', 0)
@@ -1644,7 +2032,7 @@ def ui_aba_gerenciar(backlog_df):
                 st.write("⭐ **Informações de Finalização**")
                 c1, c2 = st.columns(2)
                 with c1:
-                    nova_minha_nota = st.slider("Minha Nota Pessoal", 1, 10, max(1, int(item_original.get('Minha_Nota', 5))))
+                    nova_minha_nota = st.slider("Minha Nota Pessoal", 1, 10, max(1, inteiro_ou_padrao(item_original.get('Minha_Nota'), 5)))
                 with c2:
                     tempo_final_val = item_original.get('Tempo_Final') or 0
                     duracao_val = item_original.get('Duracao') or 0
@@ -1664,8 +2052,8 @@ def ui_aba_gerenciar(backlog_df):
             eh_serie = st.checkbox("Faz parte de uma série?", value=eh_serie_default, key="edit_eh_serie")
             
             novo_nome_serie = item_original.get('Nome_Serie', '')
-            nova_ordem_serie = int(item_original.get('Ordem_Serie', 1))
-            novo_total_serie = int(item_original.get('Total_Serie', 1))
+            nova_ordem_serie = inteiro_ou_padrao(item_original.get('Ordem_Serie'), 1)
+            novo_total_serie = inteiro_ou_padrao(item_original.get('Total_Serie'), 1)
             
             if eh_serie:
                 c1, c2, c3 = st.columns(3)
@@ -1677,20 +2065,20 @@ def ui_aba_gerenciar(backlog_df):
             st.write("Progresso")
             if item_original['Tipo'] == 'Jogo':
                 c1, c2 = st.columns(2)
-                novo_prog_atual = c1.number_input("Conquistas Atuais", min_value=0, value=int(item_original.get('Progresso_Atual', 0)))
-                novo_prog_total = c2.number_input("Total de Conquistas", min_value=0, value=int(item_original.get('Progresso_Total', 0)))
+                novo_prog_atual = c1.number_input("Conquistas Atuais", min_value=0, value=inteiro_ou_padrao(item_original.get('Progresso_Atual')))
+                novo_prog_total = c2.number_input("Total de Conquistas", min_value=0, value=inteiro_ou_padrao(item_original.get('Progresso_Total')))
             elif item_original['Tipo'] in ['Série', 'Anime']:
                 c1, c2 = st.columns(2)
-                novo_prog_atual = c1.number_input("Episódio Atual", min_value=0, value=int(item_original.get('Progresso_Atual', 0)))
-                novo_prog_total = c2.number_input("Total de Episódios", min_value=0, value=int(item_original.get('Progresso_Total', 0)))
+                novo_prog_atual = c1.number_input("Episódio Atual", min_value=0, value=inteiro_ou_padrao(item_original.get('Progresso_Atual')))
+                novo_prog_total = c2.number_input("Total de Episódios", min_value=0, value=inteiro_ou_padrao(item_original.get('Progresso_Total')))
             elif item_original['Tipo'] == 'Livro':
                 c1, c2 = st.columns(2)
-                novo_prog_atual = c1.number_input("Página Atual", min_value=0, value=int(item_original.get('Progresso_Atual', 0)))
-                novo_prog_total = c2.number_input("Total de Páginas", min_value=0, value=int(item_original.get('Progresso_Total', 0)))
+                novo_prog_atual = c1.number_input("Página Atual", min_value=0, value=inteiro_ou_padrao(item_original.get('Progresso_Atual')))
+                novo_prog_total = c2.number_input("Total de Páginas", min_value=0, value=inteiro_ou_padrao(item_original.get('Progresso_Total')))
             elif item_original['Tipo'] == 'Mangá':
                 c1, c2 = st.columns(2)
-                novo_prog_atual = c1.number_input("Edição/Capítulo Atual", min_value=0, value=int(item_original.get('Progresso_Atual', 0)))
-                novo_prog_total = c2.number_input("Total de Edições/Capítulos", min_value=0, value=int(item_original.get('Progresso_Total', 0)))
+                novo_prog_atual = c1.number_input("Edição/Capítulo Atual", min_value=0, value=inteiro_ou_padrao(item_original.get('Progresso_Atual')))
+                novo_prog_total = c2.number_input("Total de Edições/Capítulos", min_value=0, value=inteiro_ou_padrao(item_original.get('Progresso_Total')))
             else:
                 novo_prog_atual = item_original.get('Progresso_Atual', 0)
                 novo_prog_total = item_original.get('Progresso_Total', 0)
@@ -1715,12 +2103,12 @@ def ui_aba_gerenciar(backlog_df):
                     pls_ganhos = tempo_usado_para_calculo / conversor if conversor > 0 else 0
                     st.session_state.config['pontos_liberacao'] += pls_ganhos
                     st.toast(f"Item finalizado! Você ganhou {pls_ganhos:.1f} PLs!")
-                    dados_atualizados['Data_Finalizacao'] = datetime.now().strftime("%Y-%m-%d")
+                    dados_atualizados['Data_Finalizacao'] = pd.Timestamp.now().normalize()
                     
                     st.session_state.config = verificar_conquistas(st.session_state.backlog_df, st.session_state.config, item_id=item_original['ID'])
                 
-                for chave, valor in dados_atualizados.items():
-                    st.session_state.backlog_df.loc[idx, chave] = valor
+                atribuir_valores(st.session_state.backlog_df, idx, dados_atualizados)
+                atualizar_estoque_fatores([item_original['ID']])
 
                 salvar_dados(st.session_state.backlog_df, ARQUIVO_BACKLOG)
                 salvar_config(st.session_state.config)
@@ -1729,6 +2117,7 @@ def ui_aba_gerenciar(backlog_df):
 
             if ce.form_submit_button("EXCLUIR PERMANENTEMENTE", use_container_width=True):
                 st.session_state.backlog_df = st.session_state.backlog_df.drop(idx).reset_index(drop=True)
+                atualizar_estoque_fatores([item_original['ID']])
                 salvar_dados(st.session_state.backlog_df, ARQUIVO_BACKLOG)
                 st.warning(f"'{item_selecionado_titulo}' foi excluído.")
                 st.rerun()
@@ -1741,6 +2130,46 @@ def ui_aba_gerenciar(backlog_df):
 
 
 
+def ui_componente_simulador_pesos(backlog_df, config):
+    st.subheader("🔬 Simulador de Pesos (E se...?)")
+    st.caption("Compara o seu Top 10 com outros conjuntos de pesos sem salvar nada. Usa os pesos salvos acima e os fatores ativos na aba Ranking.")
+
+    fatores = st.session_state.get('fatores_ranking', FATORES_PADRAO)
+    df_pontuado = pontuar_backlog_cacheado(backlog_df, config, fatores)
+    if df_pontuado.empty or 'Multiplicador_Bonus' not in df_pontuado.columns:
+        st.info("Adicione itens ao backlog (e ative ao menos um fator com peso) para usar o simulador.")
+        return
+
+    rotulos_fatores = {
+        "Meu_Hype": "Hype", "Nota_Externa": "Crítica", "Afinidade_Genero": "Afinidade", "Fator_Continuidade": "Séries",
+        "Progresso": "Progresso", "Antiguidade": "Antiguidade", "Duracao": "Duração", "Origem": "Origem",
+    }
+    cenarios = {"Atual": config['pesos'], **PRESETS_PESOS}
+    pontuacoes = avaliar_pesos(df_pontuado, list(cenarios.values()), fatores)
+    titulos = df_pontuado['Titulo'].astype(str).to_numpy()
+    top_atual = indices_top_k(pontuacoes[:, 0], 10)
+
+    tab_presets, tab_sensibilidade = st.tabs(["Top 10 por Preset", "Sensibilidade"])
+    with tab_presets:
+        no_top_atual = set(top_atual)
+        tabela = {
+            nome: [titulos[i] if i in no_top_atual else f"🆕 {titulos[i]}" for i in indices_top_k(pontuacoes[:, j], 10)]
+            for j, nome in enumerate(cenarios)
+        }
+        st.dataframe(pd.DataFrame(tabela, index=range(1, len(top_atual) + 1)), use_container_width=True)
+        st.caption("🆕 = item que não está no seu Top 10 atual.")
+
+    with tab_sensibilidade:
+        amplitude = sensibilidade_pesos(df_pontuado, config['pesos'], fatores, top_atual)
+        amplitude.index = [f"{posicao}. {titulos[i]}" for posicao, i in enumerate(top_atual, start=1)]
+        amplitude = amplitude.rename(columns=rotulos_fatores)
+        amplitude.insert(0, "Fator que mais move", amplitude.idxmax(axis=1).where(amplitude.max(axis=1) > 0, "—"))
+        st.dataframe(
+            amplitude.style.background_gradient(cmap='Oranges', subset=list(amplitude.columns[1:])),
+            use_container_width=True
+        )
+        st.caption("Quantas posições cada item do Top 10 atual pode subir ou descer quando apenas aquele peso varia de 0 a 1 (os demais ficam como estão).")
+
 def ui_aba_configuracoes():
     st.header("Configurações do Sistema")
     
@@ -1776,6 +2205,7 @@ def ui_aba_configuracoes():
         st.subheader("Outras Configurações")
         config['bonus_catchup_ativo'] = st.toggle("Ativar Bônus de Série 'Catch-up'", value=config.get('bonus_catchup_ativo', True), help="Aplica um bônus na pontuação de itens de uma série se você já finalizou um item posterior a eles (ex: jogar o volume 1 depois de já ter finalizado o 2).")
         config['bonus_catchup_valor'] = st.slider("Valor do Bônus 'Catch-up'", 1.1, 2.0, config.get('bonus_catchup_valor', 1.5), 0.1, help="Multiplicador aplicado à pontuação final do item elegível ao bônus. Ex: 1.5 = 50% de bônus.")
+        config['escrita_em_segundo_plano'] = st.toggle("Salvar em segundo plano", value=config.get('escrita_em_segundo_plano', False), help="As alterações são enviadas ao banco por uma fila em segundo plano, sem travar a interface. O número de alterações pendentes aparece na barra lateral.")
 
         if st.form_submit_button("Salvar Configurações", type="primary"):
             st.session_state.config.update(config)
@@ -1783,6 +2213,9 @@ def ui_aba_configuracoes():
             st.success("Configurações salvas!")
             st.rerun()
 
+    st.divider()
+    ui_componente_simulador_pesos(st.session_state.backlog_df, st.session_state.config)
+
     st.divider()
     st.subheader("🛠️ Ferramentas Administrativas")
     st.warning("Use com cuidado. Estas ações modificam seus dados permanentemente.")
@@ -1817,6 +2250,7 @@ def ui_aba_configuracoes():
 
 
 def ui_aba_backup():
+    garantir_colunas_pesadas(TABELA_BACKLOG)
     st.header("Backup e Restauro de Dados")
     st.subheader("Exportar Backup")
     st.info("Clique para descarregar um ficheiro .zip com todos os seus dados.")
@@ -1856,6 +2290,9 @@ def ui_aba_backup():
                 st.error(f"Ocorreu um erro ao restaurar: {e}")
 
 def ui_aba_centro_de_acoes(acoes_pendentes_df, config):
+    # A análise feita em main() ainda não verificava capas se Cover_URL não estava carregada
+    if garantir_colunas_pesadas(TABELA_BACKLOG):
+        acoes_pendentes_df = analisar_backlog_para_acoes(st.session_state.backlog_df)
     st.header("🎯 Centro de Ações 2.0")
     st.info("Aqui estão os itens do seu backlog que precisam de atenção, como dados faltantes ou inconsistentes.")
 
@@ -1918,6 +2355,7 @@ def ui_aba_centro_de_acoes(acoes_pendentes_df, config):
                         if pd.to_numeric(item.get('Nota_Externa'), errors='coerce') == 0:
                              st.session_state.backlog_df.loc[idx_original, 'Nota_Externa'] = int(dados.get('nota_externa', 0))
                         
+                        atualizar_estoque_fatores([item['ID']])
                         salvar_dados(st.session_state.backlog_df, ARQUIVO_BACKLOG)
                         st.toast("Item atualizado com sucesso!")
                         del st.session_state[f"buscando_item_{item['ID']}"]
@@ -1972,6 +2410,16 @@ def login_page():
                 except Exception as e:
                     st.error(f"Erro ao cadastrar: {e}")
 
+def sair_da_conta():
+    """Encerra a fila de escrita do usuário, faz o logout e recarrega a página."""
+    encerrar_fila(st.session_state.user.id)
+    supabase = get_supabase_client()
+    supabase.auth.sign_out()
+    descartar_supabase_client()
+    st.session_state.pop('saida_pendente', None)
+    del st.session_state.user
+    st.rerun()
+
 def main():
     st.set_page_config(page_title="SIB - Sistema Inteligente de Backlog", layout="wide")
     
@@ -1983,18 +2431,32 @@ def main():
     if 'config' not in st.session_state:
         st.session_state.config = carregar_config()
     if 'backlog_df' not in st.session_state:
-        st.session_state.backlog_df = carregar_dados(TABELA_BACKLOG, COLUNAS_ESPERADAS_BACKLOG)
-    if 'sessoes_df' not in st.session_state:
-        st.session_state.sessoes_df = carregar_dados(TABELA_SESSOES, COLUNAS_ESPERADAS_SESSOES)
+        st.session_state.backlog_df = carregar_dados_iniciais(TABELA_BACKLOG, COLUNAS_ESPERADAS_BACKLOG)
+        marcar_backlog_alterado()
 
     # Sidebar com Logout
     with st.sidebar:
         st.write(f"Logado como: {st.session_state.user.email}")
+        pendentes, erro_envio = escritas_pendentes(st.session_state.user.id)
+        if pendentes:
+            st.caption(f"⏳ {pendentes} alteração(ões) aguardando envio ao banco")
+        if erro_envio:
+            st.warning(f"Falha ao enviar alterações (nova tentativa em breve): {erro_envio}")
         if st.button("Sair"):
-            supabase = get_supabase_client()
-            supabase.auth.sign_out()
-            del st.session_state.user
-            st.rerun()
+            # Só sai depois que a fila for enviada; se falhar, o usuário decide entre tentar de novo e descartar
+            if descarregar_fila(st.session_state.user.id):
+                sair_da_conta()
+            st.session_state.saida_pendente = True
+        if st.session_state.get('saida_pendente'):
+            pendentes, erro_envio = escritas_pendentes(st.session_state.user.id)
+            st.error(f"{pendentes} alteração(ões) ainda não foram salvas no banco. Sair agora vai descartá-las.")
+            col_tentar, col_sair = st.columns(2)
+            if col_tentar.button("Tentar de novo"):
+                if descarregar_fila(st.session_state.user.id):
+                    sair_da_conta()
+                st.rerun()
+            if col_sair.button("Sair sem salvar"):
+                sair_da_conta()
         st.divider()
 
     # --- O resto do código original (abas, etc) ---
@@ -2021,7 +2483,7 @@ def main():
         if aba_selecionada == "Ranking":
             st.header("Filtros do Ranking")
             tipos_disponiveis = ["Todos"] + sorted(st.session_state.backlog_df['Tipo'].unique().tolist())
-            generos_disponiveis = ["Todos"] + sorted(list(set(g for generos in st.session_state.backlog_df['Genero'].dropna() for g in generos.split(', '))))
+            generos_disponiveis = ["Todos"] + indice_generos(st.session_state.backlog_df).vocabulario
             autores_disponiveis = ["Todos"] + sorted(st.session_state.backlog_df['Autor'].dropna().unique().tolist())
             st.selectbox("Filtrar por Tipo", tipos_disponiveis, key="tipo_filtro")
             st.selectbox("Filtrar por Gênero", generos_disponiveis, key="genero_filtro")
@@ -2032,7 +2494,11 @@ def main():
     elif aba_selecionada == "Dashboard 📊": ui_aba_dashboard(st.session_state.backlog_df)
     elif aba_selecionada == "Meu Ano em Review 🗓️": ui_aba_review_anual(st.session_state.backlog_df)
     elif aba_selecionada == "Centro de Ações 🎯": ui_aba_centro_de_acoes(df_acoes, st.session_state.config)
-    elif aba_selecionada == "Sessões 🎯": ui_aba_sessoes(st.session_state.sessoes_df, st.session_state.backlog_df)
+    elif aba_selecionada == "Sessões 🎯":
+        # As sessões só são carregadas quando a aba é aberta
+        if 'sessoes_df' not in st.session_state:
+            st.session_state.sessoes_df = carregar_dados(TABELA_SESSOES, COLUNAS_ESPERADAS_SESSOES)
+        ui_aba_sessoes(st.session_state.sessoes_df, st.session_state.backlog_df)
     elif aba_selecionada == "Metas 🏁": ui_aba_metas(st.session_state.backlog_df, st.session_state.config)
     elif aba_selecionada == "Conquistas 🏆": ui_aba_conquistas(st.session_state.config)
     elif aba_selecionada == "Adicionar Itens": ui_aba_adicionar_itens()
@@ -0,0 +1,207 @@
+# SIB - Backend local em SQLite
+# Implementa o subconjunto da API do cliente Supabase usado pelo app (table/select/eq/in_/order/
+# range/upsert/delete/execute e auth), para desenvolvimento offline, testes de desempenho
+# reproduzíveis e instalações de um único servidor.
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+import uuid
+from types import SimpleNamespace
+
+# Coluna usada para identificar a linha no upsert quando 'on_conflict' não é informado
+CHAVES_CONFLITO = {
+    "user_configs": "user_id",
+    "user_profiles": "user_id",
+    "backlog_items": "id",
+    "sessoes": "id_sessao",
+    "rankings_precalculados": "user_id",
+}
+
+_NOME_VALIDO = re.compile(r"^[A-Za-z_][A-Za-z0-9_]*$")
+
+def _validar_nome(nome):
+    if not _NOME_VALIDO.match(nome):
+        raise ValueError(f"Nome inválido: {nome!r}")
+    return nome
+
+class RespostaSQLite:
+    def __init__(self, data, count=None):
+        self.data = data
+        self.count = count
+
+class ConsultaSQLite:
+    """Equivalente local do request builder do PostgREST para uma tabela."""
+
+    def __init__(self, cliente, tabela):
+        self.cliente = cliente
+        self.tabela = _validar_nome(tabela)
+        self.operacao = "select"
+        self.colunas = None
+        self.contar = False
+        self.filtros = []
+        self.ordem = None
+        self.intervalo = None
+        self.dados = None
+        self.on_conflict = None
+
+    def select(self, colunas="*", count=None):
+        self.operacao = "select"
+        self.colunas = None if colunas.strip() == "*" else [c.strip() for c in colunas.split(",")]
+        self.contar = count is not None
+        return self
+
+    def eq(self, coluna, valor):
+        self.filtros.append((_validar_nome(coluna), [valor]))
+        return self
+
+    def in_(self, coluna, valores):
+        self.filtros.append((_validar_nome(coluna), list(valores)))
+        return self
+
+    def order(self, coluna, desc=False):
+        self.ordem = (_validar_nome(coluna), desc)
+        return self
+
+    def range(self, inicio, fim):
+        self.intervalo = (inicio, fim)
+        return self
+
+    def upsert(self, dados, on_conflict=None):
+        self.operacao = "upsert"
+        self.dados = [dados] if isinstance(dados, dict) else list(dados)
+        self.on_conflict = on_conflict
+        return self
+
+    def delete(self):
+        self.operacao = "delete"
+        return self
+
+    def _where(self):
+        clausulas, parametros = [], []
+        for coluna, valores in self.filtros:
+            expressao = "user_id" if coluna == "user_id" else f"json_extract(dados, '$.{coluna}')"
+            if not valores:
+                clausulas.append("0")
+                continue
+            clausulas.append(f"{expressao} IN ({','.join('?' * len(valores))})")
+            parametros += [str(v) if coluna == "user_id" else v for v in valores]
+        return (" WHERE " + " AND ".join(clausulas)) if clausulas else "", parametros
+
+    def execute(self):
+        conexao = self.cliente.conexao(self.tabela)
+        if self.operacao == "upsert":
+            return self._executar_upsert(conexao)
+
+        where, parametros = self._where()
+        if self.operacao == "delete":
+            with conexao:
+                conexao.execute(f"DELETE FROM {self.tabela}{where}", parametros)
+            return RespostaSQLite([])
+
+        count = None
+        if self.contar:
+            count = conexao.execute(f"SELECT COUNT(*) FROM {self.tabela}{where}", parametros).fetchone()[0]
+        sql = f"SELECT dados FROM {self.tabela}{where}"
+        if self.ordem:
+            coluna, desc = self.ordem
+            sql += f" ORDER BY json_extract(dados, '$.{coluna}'){' DESC' if desc else ''}"
+        if self.intervalo:
+            inicio, fim = self.intervalo
+            sql += f" LIMIT {int(fim) - int(inicio) + 1} OFFSET {int(inicio)}"
+        linhas = [json.loads(dados) for (dados,) in conexao.execute(sql, parametros)]
+        if self.colunas is not None:
+            linhas = [{c: linha.get(c) for c in self.colunas} for linha in linhas]
+        return RespostaSQLite(linhas, count)
+
+    def _executar_upsert(self, conexao):
+        coluna_conflito = self.on_conflict or CHAVES_CONFLITO.get(self.tabela, "id")
+        with conexao:
+            for registro in self.dados:
+                user_id = str(registro.get("user_id"))
+                chave = str(registro.get(coluna_conflito) if registro.get(coluna_conflito) is not None else uuid.uuid4())
+                existente = conexao.execute(
+                    f"SELECT dados FROM {self.tabela} WHERE user_id = ? AND chave = ?", (user_id, chave)
+                ).fetchone()
+                # Como no PostgREST, colunas ausentes do registro mantêm o valor já gravado
+                novo = {**json.loads(existente[0]), **registro} if existente else dict(registro)
+                conexao.execute(
+                    f"INSERT OR REPLACE INTO {self.tabela} (user_id, chave, dados) VALUES (?, ?, ?)",
+                    (user_id, chave, json.dumps(novo, default=str)),
+                )
+        return RespostaSQLite(self.dados)
+
+class AuthLocal:
+    """Autenticação mínima por email e senha (PBKDF2), no lugar do Supabase Auth."""
+
+    ITERACOES = 200_000
+
+    def __init__(self, cliente):
+        self.cliente = cliente
+
+    def _hash(self, senha, sal):
+        return hashlib.pbkdf2_hmac("sha256", senha.encode(), bytes.fromhex(sal), self.ITERACOES).hex()
+
+    def sign_up(self, credenciais):
+        email, senha = credenciais["email"].strip().lower(), credenciais["password"]
+        sal = os.urandom(16).hex()
+        usuario_id = str(uuid.uuid4())
+        conexao = self.cliente.conexao()
+        try:
+            with conexao:
+                conexao.execute(
+                    "INSERT INTO auth_users (email, id, sal, hash) VALUES (?, ?, ?, ?)",
+                    (email, usuario_id, sal, self._hash(senha, sal)),
+                )
+        except sqlite3.IntegrityError:
+            raise Exception("Já existe uma conta com este email.")
+        return SimpleNamespace(user=SimpleNamespace(id=usuario_id, email=email))
+
+    def sign_in_with_password(self, credenciais):
+        email, senha = credenciais["email"].strip().lower(), credenciais["password"]
+        linha = self.cliente.conexao().execute("SELECT id, sal, hash FROM auth_users WHERE email = ?", (email,)).fetchone()
+        if linha is None or self._hash(senha, linha[1]) != linha[2]:
+            raise Exception("Email ou senha inválidos.")
+        return SimpleNamespace(user=SimpleNamespace(id=linha[0], email=email))
+
+    def sign_out(self):
+        pass
+
+class ClienteSQLite:
+    """Cliente compartilhado pelo processo; cada thread usa a própria conexão (modo WAL)."""
+
+    def __init__(self, caminho):
+        self.caminho = caminho
+        self.local = threading.local()
+        self.lock = threading.Lock()
+        self.tabelas_criadas = set()
+        self.auth = AuthLocal(self)
+        with self.conexao() as conexao:
+            conexao.execute("CREATE TABLE IF NOT EXISTS auth_users (email TEXT PRIMARY KEY, id TEXT NOT NULL, sal TEXT NOT NULL, hash TEXT NOT NULL)")
+
+    def conexao(self, tabela=None):
+        conexao = getattr(self.local, "conexao", None)
+        if conexao is None:
+            conexao = sqlite3.connect(self.caminho, timeout=30)
+            conexao.execute("PRAGMA journal_mode=WAL")
+            conexao.execute("PRAGMA synchronous=NORMAL")
+            self.local.conexao = conexao
+        if tabela is not None and tabela not in self.tabelas_criadas:
+            self._criar_tabela(conexao, tabela)
+        return conexao
+
+    def _criar_tabela(self, conexao, tabela):
+        with self.lock:
+            with conexao:
+                conexao.execute(
+                    f"CREATE TABLE IF NOT EXISTS {tabela} ("
+                    "user_id TEXT NOT NULL, chave TEXT NOT NULL, dados TEXT NOT NULL, "
+                    "PRIMARY KEY (user_id, chave))"
+                )
+                conexao.execute(f"CREATE INDEX IF NOT EXISTS idx_{tabela}_user_id ON {tabela} (user_id)")
+            self.tabelas_criadas.add(tabela)
+
+    def table(self, tabela):
+        return ConsultaSQLite(self, tabela)
@@ -0,0 +1,31 @@
+import threading
+from types import SimpleNamespace
+
+import sib_web
+from sib_web import buscar_dados_online_lote, exibir_avisos
+
+def test_avisos_das_buscas_em_lote_voltam_como_dados(monkeypatch):
+    # Sem st.warning/st.error: qualquer chamada à tela de dentro das threads do lote falharia
+    monkeypatch.setattr(sib_web, "st", SimpleNamespace())
+    monkeypatch.setattr(sib_web, "limite_hltb_sessao", lambda: threading.BoundedSemaphore(1))
+
+    def provedor(titulo, tipo, config_api, limite_hltb=None, avisos=None):
+        if titulo == "Quebra":
+            raise RuntimeError("resposta inválida")
+        sib_web.avisar(avisos, "error", "A chave da API do TMDb não foi configurada no arquivo config.json.")
+        return None
+
+    monkeypatch.setattr(sib_web, "_buscar_dados_online_provedor", provedor)
+    resultados = {titulo: (dados, avisos) for titulo, dados, avisos in buscar_dados_online_lote(["A", "B", "Quebra"], "Mangá", {})}
+
+    assert resultados["A"] == (None, [("error", "A chave da API do TMDb não foi configurada no arquivo config.json.", {})])
+    assert resultados["Quebra"][0] is None
+    assert "resposta inválida" in resultados["Quebra"][1][0][1]
+
+def test_exibir_avisos_filtra_niveis_e_repeticoes(monkeypatch):
+    exibidos = []
+    monkeypatch.setattr(sib_web, "st", SimpleNamespace(
+        error=lambda m: exibidos.append(("error", m)), toast=lambda m, **kw: exibidos.append(("toast", m))))
+    avisos = [("error", "sem chave", {}), ("toast", "buscando", {"icon": "⚠️"}), ("error", "sem chave", {}), ("warning", "nada", {})]
+    exibir_avisos(avisos, niveis=("error", "toast"))
+    assert exibidos == [("error", "sem chave"), ("toast", "buscando")]
@@ -0,0 +1,71 @@
+import threading
+from types import SimpleNamespace
+
+import cache_metadados
+from cache_metadados import CacheMetadados, TTL_NEGATIVO, TTL_INCOMPLETO, TTL_POR_PROVEDOR
+
+def relogio(monkeypatch, inicio=1_000_000.0):
+    """Substitui o time.time do cache por um relógio controlado pelo teste."""
+    agora = [inicio]
+    monkeypatch.setattr(cache_metadados, "time", SimpleNamespace(time=lambda: agora[0]))
+    return agora
+
+def entradas(cache):
+    return cache.conexao().execute("SELECT COUNT(*) FROM metadados").fetchone()[0]
+
+def test_resultados_expiram_conforme_o_ttl(tmp_path, monkeypatch):
+    agora = relogio(monkeypatch)
+    cache = CacheMetadados(str(tmp_path / "cache.db"))
+    cache.gravar("Hades", "Jogo", "igdb", [{"titulo": "Hades"}])
+    cache.gravar("Inexistente", "Jogo", "igdb", [])
+    cache.gravar("Celeste", "Jogo", "igdb", [{"titulo": "Celeste", "incompleto": True}])
+
+    # Título normalizado: caixa e espaços não mudam a chave
+    assert cache.obter("  HADES ", "Jogo", "igdb") == (True, [{"titulo": "Hades"}])
+    assert cache.obter("Inexistente", "Jogo", "igdb") == (True, [])
+    assert cache.obter("Hades", "Jogo", "tmdb") == (False, None)
+
+    agora[0] += TTL_INCOMPLETO
+    assert cache.obter("Celeste", "Jogo", "igdb") == (False, None)
+    assert cache.obter("Inexistente", "Jogo", "igdb")[0]
+    agora[0] += TTL_NEGATIVO
+    assert cache.obter("Inexistente", "Jogo", "igdb") == (False, None)
+    assert cache.obter("Hades", "Jogo", "igdb")[0]
+    agora[0] += TTL_POR_PROVEDOR["igdb"]
+    assert cache.obter("Hades", "Jogo", "igdb") == (False, None)
+
+def test_limpeza_remove_expirados_e_depois_os_menos_acessados(tmp_path, monkeypatch):
+    agora = relogio(monkeypatch)
+    cache = CacheMetadados(str(tmp_path / "cache.db"), max_entradas=3)
+    cache.gravar("Expira logo", "Jogo", "igdb", [])
+    for i in range(3):
+        agora[0] += 1
+        cache.gravar(f"Jogo {i}", "Jogo", "igdb", [{"titulo": f"Jogo {i}"}])
+    agora[0] += TTL_NEGATIVO
+    cache.obter("Jogo 0", "Jogo", "igdb")
+    cache.gravar("Jogo 3", "Jogo", "igdb", [{"titulo": "Jogo 3"}])
+
+    # O expirado sai primeiro; para caber no limite sai o Jogo 1, o menos acessado (o Jogo 0 acabou de ser lido)
+    assert entradas(cache) == 3
+    assert not cache.obter("Jogo 1", "Jogo", "igdb")[0]
+    assert all(cache.obter(f"Jogo {i}", "Jogo", "igdb")[0] for i in (0, 2, 3))
+
+def test_limpeza_nao_roda_a_cada_gravacao(tmp_path, monkeypatch):
+    relogio(monkeypatch)
+    cache = CacheMetadados(str(tmp_path / "cache.db"), max_entradas=100)
+    for i in range(110):
+        cache.gravar(f"Jogo {i}", "Jogo", "igdb", [{"titulo": f"Jogo {i}"}])
+    # A primeira limpeza roda só após 10% de max_entradas em gravações; o excesso fica limitado a isso
+    assert entradas(cache) == 100
+    cache.gravar("Jogo extra", "Jogo", "igdb", [{"titulo": "Jogo extra"}])
+    assert entradas(cache) == 101
+
+def test_cache_persiste_entre_conexoes_e_threads(tmp_path):
+    caminho = str(tmp_path / "cache.db")
+    CacheMetadados(caminho).gravar("Duna", "Livro", "google_books", [{"titulo": "Duna"}])
+    outro = CacheMetadados(caminho)
+    lidos = []
+    thread = threading.Thread(target=lambda: lidos.append(outro.obter("duna", "Livro", "google_books")))
+    thread.start()
+    thread.join()
+    assert lidos == [(True, [{"titulo": "Duna"}])]
@@ -0,0 +1,45 @@
+import asyncio
+import threading
+from types import SimpleNamespace
+
+import sib_web
+from sib_web import buscar_duracoes_hltb
+
+class HLTBFalso:
+    """Imita HowLongToBeat().async_search: 'lento' demora mais que o timeout; registra o pico de buscas simultâneas."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.em_andamento = 0
+        self.pico = 0
+
+    def __call__(self):
+        return self
+
+    async def async_search(self, nome):
+        with self.lock:
+            self.em_andamento += 1
+            self.pico = max(self.pico, self.em_andamento)
+        try:
+            await asyncio.sleep(5 if nome == "lento" else 0.05)
+            return [SimpleNamespace(completionist="12½")]
+        finally:
+            with self.lock:
+                self.em_andamento -= 1
+
+def test_busca_lenta_e_cancelada_no_timeout_e_libera_a_vaga(monkeypatch):
+    hltb = HLTBFalso()
+    monkeypatch.setattr(sib_web, "HowLongToBeat", hltb)
+    monkeypatch.setattr(sib_web, "TIMEOUT_BUSCA_HLTB", 0.3)
+    limite = threading.BoundedSemaphore(1)
+
+    assert buscar_duracoes_hltb(["lento", "Hades"], limite) == [None, 12]
+    # A requisição foi cancelada de fato: nada ficou rodando no pool e a vaga da sessão voltou
+    assert hltb.em_andamento == 0 and limite.acquire(timeout=1)
+
+def test_buscas_de_uma_sessao_respeitam_o_limite(monkeypatch):
+    hltb = HLTBFalso()
+    monkeypatch.setattr(sib_web, "HowLongToBeat", hltb)
+    limite = threading.BoundedSemaphore(2)
+    assert buscar_duracoes_hltb([f"Jogo {i}" for i in range(6)], limite) == [12] * 6
+    assert hltb.pico == 2
@@ -0,0 +1,90 @@
+import httpx
+from postgrest.exceptions import APIError
+
+import db_connection
+from db_connection import upsert_em_lotes, deletar_em_lotes, MAX_TENTATIVAS_LOTE
+
+class ClienteFalso:
+    """Imita table().upsert()/delete().eq().in_().execute(), registrando cada lote e falhando conforme 'falhar(lote)'."""
+
+    def __init__(self, falhar=None):
+        self.lotes = []
+        self.falhar = falhar or (lambda lote: None)
+
+    def table(self, tabela):
+        return self
+
+    def upsert(self, lote):
+        self.lote = lote
+        return self
+
+    def delete(self):
+        return self
+
+    def eq(self, coluna, valor):
+        return self
+
+    def in_(self, coluna, chaves):
+        self.lote = chaves
+        return self
+
+    def execute(self):
+        self.lotes.append(self.lote)
+        erro = self.falhar(self.lote)
+        if erro is not None:
+            raise erro
+
+def registros(n):
+    return [{"id": i, "titulo": f"Item {i}"} for i in range(n)]
+
+def sem_espera(monkeypatch):
+    esperas = []
+    monkeypatch.setattr(db_connection.time, "sleep", esperas.append)
+    return esperas
+
+def test_upsert_divide_por_linhas_e_por_bytes():
+    cliente = ClienteFalso()
+    resultado = upsert_em_lotes(cliente, "backlog_items", registros(1200), coluna_chave="id", tamanho_lote=500, max_paralelos=1)
+    assert [len(lote) for lote in cliente.lotes] == [500, 500, 200]
+    assert resultado == {"enviados": 1200, "falhas": []}
+
+    cliente = ClienteFalso()
+    upsert_em_lotes(cliente, "backlog_items", registros(10), tamanho_lote=500, limite_bytes=100, max_paralelos=1)
+    assert all(len(lote) <= 3 for lote in cliente.lotes) and sum(len(lote) for lote in cliente.lotes) == 10
+
+def test_falha_parcial_informa_as_chaves_do_lote_sem_repetir_erro_do_cliente(monkeypatch):
+    esperas = sem_espera(monkeypatch)
+    violacao = APIError({"message": "duplicate key value", "code": "23505"})
+    cliente = ClienteFalso(lambda lote: violacao if lote[0]["id"] == 2 else None)
+    resultado = upsert_em_lotes(cliente, "backlog_items", registros(5), coluna_chave="id", tamanho_lote=2, max_paralelos=1)
+
+    assert resultado["enviados"] == 3
+    assert [f["chave"] for f in resultado["falhas"]] == [2, 3]
+    # Erro permanente: o lote é tentado uma única vez, sem espera
+    assert len(cliente.lotes) == 3 and esperas == []
+
+def test_erro_transitorio_e_repetido_ate_o_limite(monkeypatch):
+    esperas = sem_espera(monkeypatch)
+    cliente = ClienteFalso(lambda lote: httpx.ConnectError("sem rede"))
+    resultado = deletar_em_lotes(cliente, "backlog_items", "u", "id", [1, 2, 3], max_paralelos=1)
+
+    assert len(cliente.lotes) == MAX_TENTATIVAS_LOTE
+    assert len(esperas) == MAX_TENTATIVAS_LOTE - 1 and esperas == sorted(esperas)
+    assert resultado["removidos"] == 0 and [f["chave"] for f in resultado["falhas"]] == [1, 2, 3]
+
+def test_erro_transitorio_que_passa_nao_gera_falha(monkeypatch):
+    sem_espera(monkeypatch)
+    erros = [APIError({"message": "Service Unavailable", "code": 503})]
+    cliente = ClienteFalso(lambda lote: erros.pop() if erros else None)
+    resultado = upsert_em_lotes(cliente, "backlog_items", registros(3), coluna_chave="id", max_paralelos=1)
+    assert len(cliente.lotes) == 2 and resultado == {"enviados": 3, "falhas": []}
+
+def test_classificacao_de_erros_transitorios():
+    transitorio = db_connection._erro_transitorio
+    assert transitorio(httpx.ReadTimeout("lento"))
+    assert transitorio(APIError({"message": "rate limit", "code": 429}))
+    assert transitorio(APIError({"message": "timeout", "code": "57014"}))
+    assert transitorio(APIError({"message": "sem conexão", "code": "PGRST001"}))
+    assert not transitorio(APIError({"message": "not found", "code": 404}))
+    assert not transitorio(APIError({"message": "coluna inexistente", "code": "42703"}))
+    assert not transitorio(ValueError("dado inválido"))
@@ -0,0 +1,18 @@
+import pandas as pd
+
+import sib_web
+from db_connection import _serializar_registros
+
+def test_inteiros_nulos_continuam_nulos_ate_a_escrita():
+    df = pd.DataFrame({'ID': [1, 2], 'Minha_Nota': [8, None], 'Nota_Externa': [None, 75], 'Ordem_Serie': [1.0, None]})
+    df = sib_web.aplicar_esquema(df, sib_web.ESQUEMA_BACKLOG)
+
+    assert str(df['Minha_Nota'].dtype) == 'Int8'
+    assert df['Minha_Nota'].isna().tolist() == [False, True]
+    registros = _serializar_registros('usuario', df)
+    assert registros[0]['nota_externa'] is None and registros[1]['minha_nota'] is None
+    assert registros[0]['minha_nota'] == 8 and registros[1]['nota_externa'] == 75
+
+def test_inteiros_descartam_a_parte_decimal():
+    df = sib_web.aplicar_esquema(pd.DataFrame({'Meu_Hype': ['7.9', 'abc']}), sib_web.ESQUEMA_BACKLOG)
+    assert df['Meu_Hype'].tolist()[0] == 7 and pd.isna(df['Meu_Hype'].tolist()[1])
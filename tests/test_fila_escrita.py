@@ -0,0 +1,91 @@
+import threading
+from types import SimpleNamespace
+
+import pandas as pd
+from postgrest.exceptions import APIError
+
+import db_connection
+import fila_escrita
+from db_connection import preparar_escrita_db
+from fila_escrita import enfileirar_dados, escritas_pendentes, descarregar_fila, encerrar_fila
+
+class ClienteFalso:
+    """Imita table().upsert().execute(), registrando cada lote; falha enquanto 'falhando' estiver ligado e espera 'liberado'."""
+
+    def __init__(self):
+        self.lotes = []
+        self.falhando = False
+        self.liberado = threading.Event()
+        self.liberado.set()
+
+    def table(self, tabela):
+        return self
+
+    def upsert(self, lote, on_conflict=None):
+        self.lote = lote
+        return self
+
+    def execute(self):
+        self.liberado.wait()
+        self.lotes.append(self.lote)
+        if self.falhando:
+            raise APIError({"message": "duplicate key value", "code": "23505"})
+
+def preparar(monkeypatch, user_id):
+    """Fila sem esperas longas, sessão vazia e um cliente falso no lugar do banco."""
+    cliente = ClienteFalso()
+    monkeypatch.setattr(fila_escrita, "INTERVALO_AGRUPAMENTO", 0.05)
+    monkeypatch.setattr(fila_escrita, "ESPERA_APOS_FALHA", 0.05)
+    monkeypatch.setattr(fila_escrita, "get_supabase_client", lambda: cliente)
+    monkeypatch.setattr(db_connection, "st", SimpleNamespace(session_state={}))
+    encerrar_fila(user_id)
+    return cliente
+
+def backlog(*titulos):
+    return pd.DataFrame({"ID": list(range(1, len(titulos) + 1)), "Titulo": list(titulos)})
+
+def test_escritas_repetidas_sao_agrupadas_e_confirmadas_apos_o_envio(monkeypatch):
+    cliente = preparar(monkeypatch, "fila-agrupa")
+    monkeypatch.setattr(fila_escrita, "INTERVALO_AGRUPAMENTO", 0.3)
+    enfileirar_dados("fila-agrupa", "backlog_items", backlog("A", "B"))
+    enfileirar_dados("fila-agrupa", "backlog_items", backlog("A editado", "B"))
+
+    assert descarregar_fila("fila-agrupa", timeout=5)
+    assert len(cliente.lotes) == 1
+    assert {r["id"]: r["titulo"] for r in cliente.lotes[0]} == {1: "A editado", 2: "B"}
+    # Depois de gravado, o mesmo estado não gera novo delta
+    assert preparar_escrita_db("fila-agrupa", "backlog_items", backlog("A editado", "B"))[2] == []
+    encerrar_fila("fila-agrupa")
+
+def test_upsert_que_falha_e_repetido_e_so_confirmado_quando_grava(monkeypatch):
+    cliente = preparar(monkeypatch, "fila-falha")
+    cliente.falhando = True
+    enfileirar_dados("fila-falha", "backlog_items", backlog("A"))
+
+    assert not descarregar_fila("fila-falha", timeout=0.3)
+    pendentes, erro = escritas_pendentes("fila-falha")
+    assert pendentes == 1 and "duplicate key" in erro
+    # A linha não foi marcada como persistida: o próximo save ainda a inclui
+    assert len(preparar_escrita_db("fila-falha", "backlog_items", backlog("A"))[2]) == 1
+
+    cliente.falhando = False
+    assert descarregar_fila("fila-falha", timeout=5)
+    assert len(cliente.lotes) >= 2 and escritas_pendentes("fila-falha") == (0, None)
+    assert preparar_escrita_db("fila-falha", "backlog_items", backlog("A"))[2] == []
+    encerrar_fila("fila-falha")
+
+def test_descarga_com_timeout_e_encerramento_da_fila(monkeypatch):
+    cliente = preparar(monkeypatch, "fila-lenta")
+    cliente.liberado.clear()
+    enfileirar_dados("fila-lenta", "backlog_items", backlog("A"))
+
+    # O envio está preso na rede: a descarga desiste no timeout e a escrita continua contada como pendente
+    assert not descarregar_fila("fila-lenta", timeout=0.3)
+    assert escritas_pendentes("fila-lenta")[0] == 1
+
+    fila = fila_escrita.obter_fila("fila-lenta")
+    encerrar_fila("fila-lenta")
+    cliente.liberado.set()
+    fila.thread.join(timeout=5)
+    assert not fila.thread.is_alive()
+    assert "fila-lenta" not in fila_escrita._registro_filas()[0]
@@ -0,0 +1,65 @@
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from types import SimpleNamespace
+
+import urllib3.util.retry
+
+from http_provedores import requisitar, RetryLimitado, ESPERA_MAXIMA_RETRY_AFTER
+
+class ServidorFalso:
+    """Servidor HTTP local que responde a cada requisição com o próximo (status, cabeçalhos) de 'respostas'."""
+
+    def __init__(self, respostas):
+        self.respostas = list(respostas)
+        self.metodos = []
+        servidor = self
+
+        class Manipulador(BaseHTTPRequestHandler):
+            def responder(self):
+                self.rfile.read(int(self.headers.get("Content-Length") or 0))
+                servidor.metodos.append(self.command)
+                status, cabecalhos = servidor.respostas.pop(0) if servidor.respostas else (200, {})
+                self.send_response(status)
+                for nome, valor in {**cabecalhos, "Content-Length": "0"}.items():
+                    self.send_header(nome, valor)
+                self.end_headers()
+
+            do_GET = do_POST = responder
+
+            def log_message(self, *args):
+                pass
+
+        self.http = ThreadingHTTPServer(("127.0.0.1", 0), Manipulador)
+        self.url = f"http://127.0.0.1:{self.http.server_address[1]}/"
+        threading.Thread(target=self.http.serve_forever, daemon=True).start()
+
+def sem_espera(monkeypatch):
+    esperas = []
+    monkeypatch.setattr(urllib3.util.retry.time, "sleep", esperas.append)
+    return esperas
+
+def test_retry_after_e_respeitado_ate_o_teto():
+    retry = RetryLimitado()
+    assert retry.get_retry_after(SimpleNamespace(headers={"Retry-After": "2"})) == 2
+    assert retry.get_retry_after(SimpleNamespace(headers={"Retry-After": "3600"})) == ESPERA_MAXIMA_RETRY_AFTER
+    assert retry.get_retry_after(SimpleNamespace(headers={})) is None
+
+def test_429_espera_o_retry_after_limitado_e_tenta_de_novo(monkeypatch):
+    esperas = sem_espera(monkeypatch)
+    servidor = ServidorFalso([(429, {"Retry-After": "3600"}), (200, {})])
+    resposta = requisitar("tmdb", "GET", servidor.url)
+    assert resposta.status_code == 200 and servidor.metodos == ["GET", "GET"]
+    assert esperas == [ESPERA_MAXIMA_RETRY_AFTER]
+    servidor.http.shutdown()
+
+def test_post_so_e_repetido_nas_buscas_do_igdb(monkeypatch):
+    sem_espera(monkeypatch)
+    servidor = ServidorFalso([(503, {}), (200, {})])
+    assert requisitar("igdb", "POST", servidor.url, data="search").status_code == 200
+    assert servidor.metodos == ["POST", "POST"]
+
+    # Repetir o POST do token da Twitch emitiria outro token: o 503 volta para quem chamou
+    servidor.respostas = [(503, {}), (200, {})]
+    assert requisitar("twitch", "POST", servidor.url).status_code == 503
+    assert servidor.metodos == ["POST", "POST", "POST"]
+    servidor.http.shutdown()
@@ -0,0 +1,79 @@
+from types import SimpleNamespace
+
+import pandas as pd
+
+import db_connection
+from db_connection import _iterar_paginas, iterar_dados_db, carregar_dados_db
+from sqlite_backend import ClienteSQLite
+
+class TabelaFalsa:
+    """Responde select().eq().order().range().execute() com as linhas pedidas, limitadas a 'maximo_linhas' por resposta."""
+
+    def __init__(self, linhas, com_contagem=True, maximo_linhas=None):
+        self.linhas = linhas
+        self.com_contagem = com_contagem
+        self.maximo_linhas = maximo_linhas
+        self.intervalos = []
+
+    def table(self, tabela):
+        return self
+
+    def select(self, selecao, count=None):
+        self.contar = count is not None
+        return self
+
+    def eq(self, coluna, valor):
+        return self
+
+    def order(self, coluna):
+        return self
+
+    def range(self, inicio, fim):
+        self.intervalo = (inicio, fim)
+        return self
+
+    def execute(self):
+        self.intervalos.append(self.intervalo)
+        inicio, fim = self.intervalo
+        fim = fim if self.maximo_linhas is None else min(fim, inicio + self.maximo_linhas - 1)
+        contagem = len(self.linhas) if self.contar and self.com_contagem else None
+        return SimpleNamespace(data=self.linhas[inicio:fim + 1], count=contagem)
+
+def linhas(n):
+    return [{"id": i, "original_id": i, "titulo": f"Item {i}"} for i in range(n)]
+
+def test_paginas_chegam_em_ordem_e_param_na_pagina_curta():
+    cliente = TabelaFalsa(linhas(2500))
+    paginas = list(_iterar_paginas(cliente, "backlog_items", "*", user_id="u", ordem="original_id", tamanho_pagina=1000))
+    assert [linha["id"] for pagina in paginas for linha in pagina] == list(range(2500))
+    # A última página veio curta e completou a contagem: nenhuma requisição a mais
+    assert cliente.intervalos == [(0, 999), (1000, 1999), (2000, 2999)]
+
+def test_sem_contagem_para_na_pagina_vazia():
+    cliente = TabelaFalsa(linhas(1000), com_contagem=False)
+    paginas = list(_iterar_paginas(cliente, "backlog_items", "*", tamanho_pagina=500))
+    assert [len(pagina) for pagina in paginas] == [500, 500]
+    assert cliente.intervalos == [(0, 499), (500, 999), (1000, 1499)]
+
+def test_resposta_limitada_pelo_servidor_avanca_pelo_que_veio():
+    cliente = TabelaFalsa(linhas(1200), maximo_linhas=400)
+    paginas = list(_iterar_paginas(cliente, "backlog_items", "*", tamanho_pagina=1000))
+    assert [linha["id"] for pagina in paginas for linha in pagina] == list(range(1200))
+    assert [inicio for inicio, _ in cliente.intervalos] == [0, 400, 800]
+
+def test_tabela_vazia_nao_entrega_paginas():
+    assert list(_iterar_paginas(TabelaFalsa([]), "backlog_items", "*")) == []
+
+def test_iterar_dados_db_le_so_o_usuario_em_paginas_no_padrao_do_app(tmp_path, monkeypatch):
+    cliente = ClienteSQLite(str(tmp_path / "sib.db"))
+    cliente.table("backlog_items").upsert([{"user_id": "u", **linha} for linha in linhas(25)]).execute()
+    cliente.table("backlog_items").upsert([{"user_id": "outro", "id": 99, "original_id": 99, "titulo": "Outro"}]).execute()
+    monkeypatch.setattr(db_connection, "get_supabase_client", lambda: cliente)
+
+    paginas = list(iterar_dados_db("u", "backlog_items", tamanho_pagina=10))
+    assert [len(pagina) for pagina in paginas] == [10, 10, 5]
+    df = pd.concat(paginas, ignore_index=True)
+    assert df["ID"].tolist() == list(range(25)) and {"ID_BANCO", "Titulo"} <= set(df.columns)
+
+    monkeypatch.setattr(db_connection, "st", SimpleNamespace(session_state={}))
+    assert carregar_dados_db("u", "backlog_items")["ID"].tolist() == list(range(25))
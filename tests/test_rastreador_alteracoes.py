@@ -0,0 +1,52 @@
+import numpy as np
+import pandas as pd
+
+import sib_web
+from db_connection import RastreadorAlteracoes
+
+def backlog_do_banco(n=20):
+    """Linhas como vêm do banco (já renomeadas), normalizadas como em carregar_dados."""
+    linhas = pd.DataFrame({
+        'ID_BANCO': np.arange(1, n + 1), 'ID': np.arange(1, n + 1), 'Titulo': [f"Item {i}" for i in range(n)],
+        'Tipo': 'Jogo', 'Plataforma': 'PC', 'Autor': '', 'Genero': 'Ação, RPG', 'Status': 'No Backlog',
+        'Meu_Hype': 5, 'Nota_Externa': [None] * 5 + [80] * (n - 5), 'Duracao': 10.0, 'Unidade_Duracao': 'Horas',
+        'Nome_Serie': '', 'Ordem_Serie': 1, 'Total_Serie': 1, 'Data_Adicao': '2024-01-01',
+        'Progresso_Atual': 0, 'Progresso_Total': 1, 'Minha_Nota': None, 'Data_Finalizacao': None,
+        'Tempo_Final': 0, 'Origem': 'Pago',
+    })
+    return sib_web.normalizar_tabela(linhas, sib_web.TABELA_BACKLOG, sib_web.COLUNAS_ESPERADAS_BACKLOG)
+
+def item_novo(item_id):
+    """Item montado como em ui_aba_adicionar_itens (sem ID_BANCO e com tipos Python)."""
+    return {
+        "ID": item_id, "Titulo": "Novo", "Tipo": "Livro", "Plataforma": "Kindle", "Autor": "", "Genero": "Fantasia",
+        "Status": "No Backlog", "Meu_Hype": 3, "Nota_Externa": 0, "Duracao": 300.0, "Unidade_Duracao": "Páginas",
+        "Nome_Serie": "", "Ordem_Serie": 1, "Total_Serie": 1, "Data_Adicao": pd.Timestamp.now().normalize(),
+        "Progresso_Atual": 0, "Progresso_Total": 1, "Minha_Nota": 0, "Data_Finalizacao": pd.NaT,
+        "Tempo_Final": 0, "Origem": "Grátis",
+    }
+
+def test_adicionar_um_item_gera_delta_de_uma_linha():
+    df = backlog_do_banco()
+    rastreador = RastreadorAlteracoes('ID')
+    rastreador.registrar(df)
+
+    df = pd.concat([df, pd.DataFrame([item_novo(21)])], ignore_index=True)
+    inseridos, atualizados, removidos = rastreador.calcular_delta(df)
+
+    assert list(inseridos['ID']) == [21]
+    assert atualizados.empty
+    assert removidos == []
+
+def test_edicao_e_exclusao_entram_no_delta():
+    df = backlog_do_banco()
+    rastreador = RastreadorAlteracoes('ID')
+    rastreador.registrar(df)
+
+    df.loc[df['ID'] == 3, 'Meu_Hype'] = 9
+    df = df[df['ID'] != 7]
+    inseridos, atualizados, removidos = rastreador.calcular_delta(df)
+
+    assert inseridos.empty
+    assert list(atualizados['ID']) == [3]
+    assert removidos == [7]
@@ -0,0 +1,56 @@
+import threading
+
+from sqlite_backend import ClienteSQLite
+
+def cliente_com_itens(tmp_path, n=5):
+    cliente = ClienteSQLite(str(tmp_path / "sib.db"))
+    itens = [{"user_id": "u", "id": i, "titulo": f"Item {i}", "horas": 10 - i} for i in range(n)]
+    cliente.table("backlog_items").upsert(itens).execute()
+    cliente.table("backlog_items").upsert({"user_id": "outro", "id": 0, "titulo": "De outro usuário"}).execute()
+    return cliente
+
+def test_select_filtra_ordena_pagina_e_conta(tmp_path):
+    cliente = cliente_com_itens(tmp_path)
+    tabela = lambda: cliente.table("backlog_items")
+
+    resposta = tabela().select("*", count="exact").eq("user_id", "u").order("horas").range(0, 2).execute()
+    assert [linha["id"] for linha in resposta.data] == [4, 3, 2]
+    assert resposta.count == 5
+
+    resposta = tabela().select("id, titulo").eq("user_id", "u").in_("id", [1, 3]).order("id", desc=True).execute()
+    assert resposta.data == [{"id": 3, "titulo": "Item 3"}, {"id": 1, "titulo": "Item 1"}]
+    assert tabela().select("*").eq("user_id", "u").in_("id", []).execute().data == []
+
+def test_upsert_atualiza_pela_chave_e_mantem_colunas_ausentes(tmp_path):
+    cliente = cliente_com_itens(tmp_path)
+    cliente.table("backlog_items").upsert([{"user_id": "u", "id": 2, "titulo": "Renomeado"}]).execute()
+
+    linhas = cliente.table("backlog_items").select("*").eq("user_id", "u").eq("id", 2).execute().data
+    assert linhas == [{"user_id": "u", "id": 2, "titulo": "Renomeado", "horas": 8}]
+    assert cliente.table("backlog_items").select("*", count="exact").eq("user_id", "u").execute().count == 5
+    # A mesma chave de outro usuário é outra linha
+    assert cliente.table("backlog_items").select("titulo").eq("user_id", "outro").execute().data == [{"titulo": "De outro usuário"}]
+
+def test_upsert_com_on_conflict_usa_a_coluna_informada(tmp_path):
+    cliente = ClienteSQLite(str(tmp_path / "sib.db"))
+    cliente.table("user_configs").upsert({"user_id": "u", "config": {"tema": "claro"}}).execute()
+    cliente.table("user_configs").upsert({"user_id": "u", "config": {"tema": "escuro"}}, on_conflict="user_id").execute()
+    assert cliente.table("user_configs").select("config").eq("user_id", "u").execute().data == [{"config": {"tema": "escuro"}}]
+
+def test_delete_remove_so_as_chaves_do_usuario(tmp_path):
+    cliente = cliente_com_itens(tmp_path)
+    cliente.table("backlog_items").delete().eq("user_id", "u").in_("id", [0, 1]).execute()
+
+    restantes = cliente.table("backlog_items").select("id").eq("user_id", "u").order("id").execute().data
+    assert [linha["id"] for linha in restantes] == [2, 3, 4]
+    assert len(cliente.table("backlog_items").select("id").eq("user_id", "outro").execute().data) == 1
+
+def test_dados_persistem_entre_clientes_e_threads(tmp_path):
+    cliente_com_itens(tmp_path)
+    outro_cliente = ClienteSQLite(str(tmp_path / "sib.db"))
+    contagens = []
+    thread = threading.Thread(target=lambda: contagens.append(
+        outro_cliente.table("backlog_items").select("*", count="exact").eq("user_id", "u").execute().count))
+    thread.start()
+    thread.join()
+    assert contagens == [5]
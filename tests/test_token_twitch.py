@@ -0,0 +1,59 @@
+import threading
+import time
+from types import SimpleNamespace
+
+import token_twitch
+from token_twitch import GerenciadorTokenTwitch, MARGEM_RENOVACAO
+
+class TwitchFalsa:
+    """Responde ao POST de token com access_token sequencial; 'espera' simula a latência da rede."""
+
+    def __init__(self, expires_in=3600, espera=0.0):
+        self.expires_in = expires_in
+        self.espera = espera
+        self.pedidos = 0
+
+    def __call__(self, provedor, metodo, url, **kwargs):
+        time.sleep(self.espera)
+        self.pedidos += 1
+        dados = {"access_token": f"token-{self.pedidos}", "expires_in": self.expires_in}
+        return SimpleNamespace(raise_for_status=lambda: None, json=lambda: dados)
+
+def test_token_e_reutilizado_ate_a_margem_de_renovacao(monkeypatch):
+    agora = [1_000.0]
+    twitch = TwitchFalsa(expires_in=3600)
+    monkeypatch.setattr(token_twitch, "requisitar", twitch)
+    monkeypatch.setattr(token_twitch, "time", SimpleNamespace(time=lambda: agora[0]))
+    gerenciador = GerenciadorTokenTwitch()
+
+    assert gerenciador.obter("id", "segredo") == "token-1"
+    agora[0] += 3600 - MARGEM_RENOVACAO - 1
+    assert gerenciador.obter("id", "segredo") == "token-1"
+    # Renovado antes da expiração real, ao entrar na margem
+    agora[0] += 1
+    assert gerenciador.obter("id", "segredo") == "token-2"
+    assert gerenciador.obter("outro-id", "segredo") == "token-3" and twitch.pedidos == 3
+
+def test_token_invalidado_e_renovado_sem_apagar_um_mais_novo(monkeypatch):
+    twitch = TwitchFalsa()
+    monkeypatch.setattr(token_twitch, "requisitar", twitch)
+    gerenciador = GerenciadorTokenTwitch()
+
+    antigo = gerenciador.obter("id", "segredo")
+    gerenciador.invalidar("id", antigo)
+    novo = gerenciador.obter("id", "segredo")
+    # Uma thread atrasada invalidando o token antigo não descarta o novo
+    gerenciador.invalidar("id", antigo)
+    assert gerenciador.obter("id", "segredo") == novo != antigo
+
+def test_threads_simultaneas_pedem_um_unico_token(monkeypatch):
+    twitch = TwitchFalsa(espera=0.05)
+    monkeypatch.setattr(token_twitch, "requisitar", twitch)
+    gerenciador = GerenciadorTokenTwitch()
+    tokens = []
+    threads = [threading.Thread(target=lambda: tokens.append(gerenciador.obter("id", "segredo"))) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert tokens == ["token-1"] * 8 and twitch.pedidos == 1
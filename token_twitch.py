@@ -0,0 +1,64 @@
+# SIB - Token OAuth da Twitch (usado pela API do IGDB)
+# Um único token por client_id para todo o processo, renovado pouco antes de expirar.
+# Antes cada busca no IGDB pedia um token novo à Twitch.
+import threading
+import time
+import streamlit as st
+
+from http_provedores import requisitar
+
+URL_TOKEN_TWITCH = "https://id.twitch.tv/oauth2/token"
+# Renova com esta antecedência (segundos) para que um token não expire no meio de uma busca
+MARGEM_RENOVACAO = 300
+
+class GerenciadorTokenTwitch:
+    """Tokens por client_id com a data de expiração; a renovação acontece uma única vez, sob lock."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.tokens = {}  # client_id -> (access_token, expira_em)
+        self.emitidos = 0
+
+    def obter(self, client_id, client_secret):
+        token = self._valido(client_id)
+        if token is not None:
+            return token
+        with self.lock:
+            # Outra thread pode ter renovado enquanto esta esperava o lock
+            token = self._valido(client_id)
+            if token is None:
+                token = self._emitir(client_id, client_secret)
+            return token
+
+    def _valido(self, client_id):
+        token, expira_em = self.tokens.get(client_id, (None, 0.0))
+        return token if time.time() < expira_em else None
+
+    def _emitir(self, client_id, client_secret):
+        r = requisitar(
+            "twitch", "POST", URL_TOKEN_TWITCH,
+            params={"client_id": client_id, "client_secret": client_secret, "grant_type": "client_credentials"},
+        )
+        r.raise_for_status()
+        dados = r.json()
+        expira_em = time.time() + max(0, dados.get("expires_in", 0) - MARGEM_RENOVACAO)
+        self.tokens[client_id] = (dados["access_token"], expira_em)
+        self.emitidos += 1
+        return dados["access_token"]
+
+    def invalidar(self, client_id, token):
+        """Descarta o token recusado pela API (ex: revogado), sem apagar um que outra thread já renovou."""
+        with self.lock:
+            if self.tokens.get(client_id, (None,))[0] == token:
+                del self.tokens[client_id]
+
+@st.cache_resource(show_spinner=False)
+def get_gerenciador_token_twitch():
+    return GerenciadorTokenTwitch()
+
+def obter_token_twitch(client_id, client_secret):
+    """Retorna um access_token válido para o client_id, pedindo um novo à Twitch só quando necessário."""
+    return get_gerenciador_token_twitch().obter(client_id, client_secret)
+
+def invalidar_token_twitch(client_id, token):
+    get_gerenciador_token_twitch().invalidar(client_id, token)